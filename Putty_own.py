@@ -6,6 +6,8 @@ import time
 from datetime import datetime
 import re
 
+from pager import PagerMatcher
+
 class EnhancedSSHClientGUI:
     def __init__(self, root):
         self.root = root
@@ -303,14 +305,20 @@ class EnhancedSSHClientGUI:
             # Update UI in main thread
             self.root.after(0, self._on_connect_success)
             
-            # Buffer to handle partial lines and pagination
+            # Buffer to handle partial lines; pager prompts are matched on raw
+            # bytes so a prompt split across reads is still answered once
             buffer = ""
             last_buffer = ""
+            pager = PagerMatcher()
             
             # Start reading output
             while self.connected and self.shell:
                 if self.shell.recv_ready():
-                    data = self.shell.recv(1024).decode('utf-8', errors='ignore')
+                    raw = self.shell.recv(1024)
+                    prompts = pager.feed(raw)
+                    if prompts and self.pagination_var.get():
+                        self.shell.send(' ' * prompts)
+                    data = raw.decode('utf-8', errors='ignore')
                     buffer += data
                     
                     # Process complete lines
@@ -321,20 +329,12 @@ class EnhancedSSHClientGUI:
                     for line in lines[:-1]:
                         processed_line = line.rstrip('\r')
                         
-                        # Check for --More-- pattern (common in Cisco devices)
-                        if self.pagination_var.get() and '--More--' in processed_line:
-                            # Auto-send space to continue
-                            self.shell.send(' ')
-                            # Remove the --More-- from display
-                            # processed_line = processed_line.replace('--More--', '[More...]')
-                        
                         # Send to UI
                         self.root.after(0, self._update_output, processed_line + '\n')
                     
                     # Handle the case where we have a complete line with --More--
                     if buffer and '--More--' in buffer:
                         if self.pagination_var.get():
-                            self.shell.send(' ')
                             buffer = buffer.replace('--More--', '[More...]')
                     
                     # Small delay to prevent CPU spinning
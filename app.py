@@ -4,14 +4,34 @@
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.websockets import WebSocketState
 import paramiko
 import asyncio
 import json
+import time
 import uuid
-from typing import Dict
+from typing import Callable, Dict, List, Optional
 import logging
+import websockets
+
+from connector import SSHConnector
+from shell_pump import OVERFLOW_POLICIES, ShellPump, output_decoder
+from scrollback import ScrollbackBuffer
+from broadcast import ROLES, VIEWS, SessionHub
+from screen import MAX_COLUMNS, MAX_LINES, SessionScreen, screen_available
+from pager import PAGER_RULES, PagerEngine, disable_paging_command
+from batch import BatchExecutor, PromptTracker
+from fanout import FanoutJob
+from session_registry import create_registry
+from session_reaper import SessionReaper
+from audit import AuditLog, database_path
+from transcript import TranscriptReader, TranscriptWriter, asciicast, replay, stream_range
+from completion import SessionCompleter
+from device_detect import PlatformDetector, is_known_prompt
+from parsers import find_template, list_templates
+import metrics
 
 # Import settings
 try:
@@ -22,6 +42,38 @@ except ImportError:
         SSH_TIMEOUT = 10
         SSH_MAX_SESSIONS = 100
         SSH_SESSION_TIMEOUT = 3600
+        SSH_ORPHAN_TIMEOUT = 300
+        SSH_MAX_SESSIONS_PER_USER = 5
+        SESSION_REAP_INTERVAL = 15
+        SESSION_IDLE_AFTER = 60
+        SSH_CONNECT_WORKERS = 32
+        SSH_MAX_CONNECTS_PER_HOST = 4
+        SSH_POOL_SIZE = 256
+        SSH_POOL_IDLE_TTL = 300
+        OUTPUT_COALESCE_MS = 5
+        OUTPUT_COALESCE_BYTES = 65536
+        OUTPUT_QUEUE_MAX_BYTES = 1048576
+        OUTPUT_QUEUE_POLICY = "pause"
+        SCROLLBACK_BYTES = 262144
+        SCREEN_MODEL_ENABLED = True
+        PAGER_MODE = "auto"
+        BATCH_COMMAND_TIMEOUT = 30
+        BATCH_MAX_COMMAND_TIMEOUT = 600
+        BATCH_MAX_COMMANDS = 1000
+        FANOUT_CONCURRENCY = 20
+        FANOUT_MAX_DEVICES = 1000
+        SESSION_REGISTRY_URL = "memory"
+        WORKER_ID = ""
+        WORKER_URL = ""
+        DATABASE_URL = "sqlite:///./audit.db"
+        AUDIT_LOGS_ENABLED = True
+        AUDIT_QUEUE_SIZE = 10000
+        AUDIT_BATCH_SIZE = 500
+        TRANSCRIPTS_ENABLED = True
+        TRANSCRIPT_DIR = "./transcripts"
+        TRANSCRIPT_BLOCK_BYTES = 65536
+        TRANSCRIPT_FLUSH_SECONDS = 2
+        COMPLETION_CACHE_TTL = 5
     settings = Settings()
 
 # Create FastAPI app (will be overridden by main.py)
@@ -40,12 +92,171 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Store active SSH connections
-active_connections: Dict[str, paramiko.SSHClient] = {}
+active_connections: Dict[str, paramiko.Transport] = {}
 active_shells: Dict[str, paramiko.Channel] = {}
+active_pumps: Dict[str, ShellPump] = {}
+active_pagers: Dict[str, PagerEngine] = {}
+active_prompts: Dict[str, PromptTracker] = {}
+batch_locks: Dict[str, asyncio.Lock] = {}
+active_transcripts: Dict[str, TranscriptWriter] = {}
+active_completers: Dict[str, SessionCompleter] = {}
+active_detectors: Dict[str, PlatformDetector] = {}
+active_scrollback: Dict[str, ScrollbackBuffer] = {}
+active_hubs: Dict[str, SessionHub] = {}
+
+# Called as hook(session_id, reason) after a session is torn down
+session_close_hooks: List[Callable] = []
+
+# Slots held by connects still handshaking and by fan-out devices (which are
+# never registered), counted against the limits
+pending_connects: Dict[Optional[str], int] = {}
+limit_stats = {"rejected_global": 0, "rejected_per_user": 0}
+
+# Handshakes run off the event loop, bounded per device
+connector = SSHConnector(
+    max_workers=settings.SSH_CONNECT_WORKERS,
+    per_host_limit=settings.SSH_MAX_CONNECTS_PER_HOST,
+    timeout=settings.SSH_TIMEOUT,
+    pool_size=settings.SSH_POOL_SIZE,
+    pool_idle_ttl=settings.SSH_POOL_IDLE_TTL
+)
+
+# Which worker owns each session, shared between workers when configured
+registry = create_registry(settings.SESSION_REGISTRY_URL, settings.WORKER_ID or None, settings.WORKER_URL)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Connections, commands and disconnects, written in batches off the keystroke path
+audit_path = database_path(settings.DATABASE_URL)
+audit = AuditLog(
+    audit_path,
+    max_queue=settings.AUDIT_QUEUE_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    enabled=settings.AUDIT_LOGS_ENABLED and audit_path is not None
+)
+
+def session_context(session_id: str) -> dict:
+    """Who and what a local session is connected to, for audit events"""
+    record = registry.sessions.get(session_id) or {}
+    return {
+        "session_id": session_id,
+        "user_id": record.get("user_id"),
+        "device_id": record.get("device_id"),
+        "device_ip": record.get("host")
+    }
+
+def session_alive(session_id: str) -> bool:
+    shell = active_shells.get(session_id)
+    pump = active_pumps.get(session_id)
+    return shell is not None and not shell.closed and not (pump is not None and pump.closed)
+
+async def close_session(session_id: str, reason: str = "disconnect") -> bool:
+    """Tear down a local session and run the close hooks; False if it was not open"""
+    context = session_context(session_id)
+    active_connections.pop(session_id, None)
+    shell = active_shells.pop(session_id, None)
+    pump = active_pumps.pop(session_id, None)
+    active_pagers.pop(session_id, None)
+    active_prompts.pop(session_id, None)
+    batch_locks.pop(session_id, None)
+    transcript = active_transcripts.pop(session_id, None)
+    active_detectors.pop(session_id, None)
+    active_scrollback.pop(session_id, None)
+    hub = active_hubs.pop(session_id, None)
+    if hub is not None:
+        hub.close()
+    completer = active_completers.pop(session_id, None)
+    if completer is not None:
+        completer.close()
+    reaper.forget(session_id)
+    await registry.unregister(session_id)
+    if shell is None:
+        return False
+    
+    # The transport stays pooled for the next session to the same device
+    await close_device_shell(shell, pump)
+    if transcript is not None:
+        await transcript.close()
+    metrics.SESSION_OUTPUT_BYTES.observe(pump.bytes_read)
+    metrics.SESSION_OUTPUT_HIGH_WATER.observe(pump.stats["high_water"])
+    metrics.SESSIONS_CLOSED.inc(reason=reason)
+    audit.record("ssh_disconnect", reason=reason, output_bytes=pump.bytes_read, **context)
+    for hook in session_close_hooks:
+        try:
+            result = hook(session_id, reason)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            logger.error(f"Session close hook failed for {session_id}: {str(e)}")
+    logger.info(f"SSH connection closed ({reason}): {session_id}")
+    return True
+
+# Closes sessions idle past SSH_SESSION_TIMEOUT or left without a browser
+reaper = SessionReaper(
+    close_session,
+    session_alive,
+    idle_timeout=settings.SSH_SESSION_TIMEOUT,
+    orphan_timeout=settings.SSH_ORPHAN_TIMEOUT,
+    interval=settings.SESSION_REAP_INTERVAL,
+    idle_after=settings.SESSION_IDLE_AFTER
+)
+
+# Gauges read at scrape time, so the hot paths pay nothing for them
+metrics.REGISTRY.add(metrics.Gauge(
+    "ncm_sessions", "Local sessions by whether a browser is attached and whether they are in use",
+    labelnames=("state", "activity"),
+    callback=reaper.count_by_activity
+))
+metrics.REGISTRY.add(metrics.Gauge(
+    "ncm_ssh_connect_queue", "SSH handshakes waiting for and holding a connect slot", labelnames=("state",),
+    callback=lambda: {
+        ("queued",): connector.stats["queued"],
+        ("connecting",): connector.stats["connecting"]
+    }
+))
+metrics.REGISTRY.add(metrics.Gauge(
+    "ncm_ssh_pool_transports", "Pooled SSH transports by whether they carry a session", labelnames=("state",),
+    callback=lambda: {
+        ("idle",): sum(1 for entry in connector.pool.lru.values() if entry.channels == 0),
+        ("busy",): sum(1 for entry in connector.pool.lru.values() if entry.channels)
+    }
+))
+metrics.REGISTRY.add(metrics.Gauge(
+    "ncm_ws_output_queued_chunks", "Shell output chunks waiting to be sent, across all sessions",
+    callback=lambda: sum(pump.queue.qsize() for pump in active_pumps.values())
+))
+# One series however many sessions there are; the slowest sessions by name are in /api/sessions/stats
+metrics.REGISTRY.add(metrics.Gauge(
+    "ncm_ws_output_high_water_bytes", "Most shell output any live session has had waiting for its WebSocket",
+    callback=lambda: max((pump.stats["high_water"] for pump in active_pumps.values()), default=0)
+))
+metrics.REGISTRY.add(metrics.Gauge(
+    "ncm_ws_subscribers", "WebSockets attached to local sessions, by role", labelnames=("role",),
+    callback=lambda: {
+        (role,): sum(1 for hub in active_hubs.values() for subscriber in hub.subscribers if subscriber.role == role)
+        for role in ROLES
+    }
+))
+metrics.REGISTRY.add(metrics.Gauge(
+    "ncm_ws_output_paused_sessions", "Sessions whose device reads are paused for a slow WebSocket",
+    callback=lambda: sum(pump.paused for pump in active_pumps.values())
+))
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """Start connection pool maintenance, session reaping and join the session registry"""
+    if settings.OUTPUT_QUEUE_POLICY not in OVERFLOW_POLICIES:
+        raise ValueError(
+            f"OUTPUT_QUEUE_POLICY must be one of {', '.join(OVERFLOW_POLICIES)}, not {settings.OUTPUT_QUEUE_POLICY!r}"
+        )
+    connector.start()
+    reaper.start()
+    await registry.start()
+    await audit.start()
+    if settings.SCREEN_MODEL_ENABLED and not screen_available():
+        logger.warning("pyte is not installed, so sessions have no screen model and ?view=screen is refused")
+
 @app.get("/")
 async def root():
     """Serve the main emulator page"""
@@ -57,31 +268,171 @@ async def health_check():
     """Health check endpoint for NMS integration"""
     return {"status": "healthy", "service": "ncm-ssh-emulator"}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+async def open_device_shell(connection_data: dict):
+    """Connect to a device and start its output pump and pager
+
+    Shared by interactive sessions and fan-out jobs; returns
+    ``(transport, shell, pump, pager, detector)``; the transport may be shared
+    with other sessions, so release shells with ``close_device_shell``.
+    """
+    hostname = connection_data.get("host")
+    port = connection_data.get("port", 22)
+    username = connection_data.get("username")
+    password = connection_data.get("password")
+    
+    if not all([hostname, username, password]):
+        raise HTTPException(status_code=400, detail="Host, username, and password required")
+    
+    # Open the shell on a pooled transport, or handshake on the connect pool
+    transport, shell = await connector.open_shell(hostname, port, username, password)
+    
+    # Start delivering shell output to the event loop; it is queued only while a browser reads it
+    pump = ShellPump(shell, queueing=False)
+    
+    # Answer pager prompts from the pump, or switch paging off at login
+    vendor = (connection_data.get("vendor") or connection_data.get("device_type") or "").lower() or None
+    pager_mode = connection_data.get("pager_mode", settings.PAGER_MODE)
+    if pager_mode == "disable":
+        disable_command = disable_paging_command(vendor)
+        if disable_command:
+            shell.send(disable_command)
+        else:
+            logger.warning(f"No paging command known for vendor {vendor!r}, using server pager")
+            pager_mode = "auto"
+    pager = PagerEngine(shell, vendor, mode=pager_mode)
+    pump.listeners.append(pager.feed)
+    pump.listeners.append(lambda data: metrics.OUTPUT_BYTES.inc(len(data)))
+    
+    # Recognise the platform from the banner and first prompt, once
+    detector = PlatformDetector()
+    pump.listeners.append(detector.feed)
+    if vendor is None:
+        def use_detected_vendor(result):
+            platform = result.result()["platform"]
+            if platform in PAGER_RULES:
+                pager.matcher.set_vendor(platform)
+        detector.result.add_done_callback(use_detected_vendor)
+    
+    pump.start()
+    return transport, shell, pump, pager, detector
+
+async def close_device_shell(shell: paramiko.Channel, pump: ShellPump):
+    """Stop a shell's pump and hand its transport back to the pool"""
+    pump.stop()
+    connector.release(shell)
+
+async def record_platform(session_id: str, detector: PlatformDetector):
+    """Store the detected platform in the session record and seed the batch prompt from it"""
+    detected = await detector.wait()
+    if session_id not in active_shells:
+        return
+    if detected["prompt"] and is_known_prompt(detected["prompt"]):
+        prompt = active_prompts.setdefault(session_id, PromptTracker())
+        if prompt.pattern is None:
+            prompt.learn(detected["prompt"])
+    await registry.update(session_id, platform=detected["platform"], prompt=detected["prompt"])
+    logger.info(f"Session {session_id} platform: {detected['platform']} (by {detected['detected_by']})")
+
+async def admit_session(user_id: Optional[str]):
+    """Hold a slot for a new session, or reject it up front when the worker fleet or the user is at the limit
+
+    The slot is taken before the registry is asked, so a burst of connects
+    can't all pass the check at once; give it back with ``release_session_slot``.
+    """
+    pending_connects[user_id] = pending_connects.get(user_id, 0) + 1
+    try:
+        total = await registry.count_sessions() + sum(pending_connects.values())
+        if total > settings.SSH_MAX_SESSIONS:
+            limit_stats["rejected_global"] += 1
+            raise HTTPException(status_code=503, detail=f"Session limit reached ({settings.SSH_MAX_SESSIONS})")
+        if user_id is not None:
+            user_total = await registry.count_sessions(user_id) + pending_connects[user_id]
+            if user_total > settings.SSH_MAX_SESSIONS_PER_USER:
+                limit_stats["rejected_per_user"] += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"At most {settings.SSH_MAX_SESSIONS_PER_USER} sessions per user"
+                )
+    except BaseException:
+        release_session_slot(user_id)
+        raise
+
+def release_session_slot(user_id: Optional[str]):
+    pending_connects[user_id] -= 1
+    if not pending_connects[user_id]:
+        del pending_connects[user_id]
+
 @app.post("/api/connect")
 async def connect_ssh(connection_data: dict):
     """Connect to SSH server"""
+    user_id = connection_data.get("user_id")
+    await admit_session(user_id)
+    session_id = str(uuid.uuid4())
+    shell = pump = None
     try:
-        session_id = str(uuid.uuid4())
-        hostname = connection_data.get("host")
-        port = connection_data.get("port", 22)
-        username = connection_data.get("username")
-        password = connection_data.get("password")
-        
-        if not all([hostname, username, password]):
-            raise HTTPException(status_code=400, detail="Host, username, and password required")
+        transport, shell, pump, pager, detector = await open_device_shell(connection_data)
         
-        # Create SSH client
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        client.connect(hostname, port, username, password, timeout=settings.SSH_TIMEOUT)
+        # Keep the tail of the output for browsers that reconnect after a dropped WebSocket
+        scrollback = None
+        if settings.SCROLLBACK_BYTES:
+            scrollback = ScrollbackBuffer(settings.SCROLLBACK_BYTES, offset=pump.bytes_read)
+            pump.listeners.append(scrollback.write)
+            active_scrollback[session_id] = scrollback
+        # What a terminal would show, emulated from scrollback only while someone looks at it
+        screen = None
+        if settings.SCREEN_MODEL_ENABLED and scrollback is not None and screen_available():
+            screen = SessionScreen(scrollback)
+        # Every browser attached to the session shares one output reader
+        active_hubs[session_id] = SessionHub(
+            pump,
+            scrollback,
+            max_bytes=settings.OUTPUT_QUEUE_MAX_BYTES or None,
+            policy=settings.OUTPUT_QUEUE_POLICY,
+            chunk_bytes=settings.OUTPUT_COALESCE_BYTES,
+            window=settings.OUTPUT_COALESCE_MS / 1000,
+            screen=screen,
+            pager=pager
+        )
         
-        # Create shell
-        shell = client.invoke_shell()
-        shell.settimeout(0.1)
+        # Record everything the device sends, whether or not a browser is attached
+        if settings.TRANSCRIPTS_ENABLED:
+            transcript = TranscriptWriter(
+                settings.TRANSCRIPT_DIR,
+                session_id,
+                metadata={
+                    "host": connection_data.get("host"),
+                    "ssh_user": connection_data.get("username"),
+                    "user_id": user_id,
+                    "device_id": connection_data.get("device_id")
+                },
+                block_bytes=settings.TRANSCRIPT_BLOCK_BYTES,
+                flush_interval=settings.TRANSCRIPT_FLUSH_SECONDS
+            )
+            pump.listeners.append(transcript.write)
+            active_transcripts[session_id] = transcript
         
         # Store connection
-        active_connections[session_id] = client
+        active_connections[session_id] = transport
         active_shells[session_id] = shell
+        active_pumps[session_id] = pump
+        active_pagers[session_id] = pager
+        active_detectors[session_id] = detector
+        await registry.register(
+            session_id,
+            host=connection_data.get("host"),
+            port=connection_data.get("port", 22),
+            username=connection_data.get("username"),
+            user_id=user_id,
+            device_id=connection_data.get("device_id")
+        )
+        reaper.track(session_id)
+        audit.record("ssh_connect", ssh_user=connection_data.get("username"), **session_context(session_id))
+        asyncio.create_task(record_platform(session_id, detector))
         
         logger.info(f"SSH connection established: {session_id}")
         
@@ -91,109 +442,244 @@ async def connect_ssh(connection_data: dict):
             "message": "SSH connection successful"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"SSH connection failed: {str(e)}")
+        if shell is not None:
+            await abandon_session(session_id, shell, pump)
+        audit.record(
+            "ssh_connect_failed",
+            user_id=user_id,
+            device_id=connection_data.get("device_id"),
+            device_ip=connection_data.get("host"),
+            ssh_user=connection_data.get("username"),
+            error=str(e)
+        )
         raise HTTPException(status_code=500, detail=f"Connection failed: {str(e)}")
+    finally:
+        release_session_slot(user_id)
+
+async def abandon_session(session_id: str, shell: paramiko.Channel, pump: ShellPump):
+    """Undo a connect that failed after its shell was opened, releasing whatever it had set up"""
+    for entries in (active_connections, active_shells, active_pumps, active_pagers, active_detectors):
+        entries.pop(session_id, None)
+    active_scrollback.pop(session_id, None)
+    hub = active_hubs.pop(session_id, None)
+    if hub is not None:
+        hub.close()
+    transcript = active_transcripts.pop(session_id, None)
+    reaper.forget(session_id)
+    await close_device_shell(shell, pump)
+    try:
+        if transcript is not None:
+            await transcript.close()
+        await registry.unregister(session_id)
+    except Exception as e:
+        logger.error(f"Cleanup after failed connect {session_id}: {str(e)}")
+
+@app.get("/api/connect/stats")
+async def connect_stats():
+    """SSH connect queue depth, throughput and pool hit rate (for admin monitoring)"""
+    return connector.get_stats()
+
+async def reject_foreign_session(session_id: str):
+    """421 Misdirected Request when another worker owns the session"""
+    if session_id in active_shells:
+        return
+    record = await registry.get(session_id)
+    if record is not None and not registry.is_local(record):
+        raise HTTPException(status_code=421, detail=f"Session is served by worker {record['worker_id']}")
+
+async def require_local_session(session_id: str):
+    """404 for unknown sessions, 421 for sessions another worker owns"""
+    await reject_foreign_session(session_id)
+    if session_id not in active_shells:
+        raise HTTPException(status_code=404, detail="Invalid session ID")
 
 @app.post("/api/disconnect/{session_id}")
 async def disconnect_ssh(session_id: str):
     """Disconnect SSH session"""
+    await reject_foreign_session(session_id)
     try:
-        if session_id in active_connections:
-            active_connections[session_id].close()
-            del active_connections[session_id]
-        
-        if session_id in active_shells:
-            del active_shells[session_id]
-        
-        logger.info(f"SSH connection closed: {session_id}")
+        await close_session(session_id)
         return {"status": "disconnected", "message": "Session closed"}
         
     except Exception as e:
         logger.error(f"Error disconnecting: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Disconnection failed: {str(e)}")
 
+async def close_websocket(websocket: WebSocket):
+    """Close a WebSocket unless the client has already gone"""
+    if websocket.client_state == WebSocketState.DISCONNECTED or websocket.application_state == WebSocketState.DISCONNECTED:
+        return
+    try:
+        await websocket.close()
+    except RuntimeError as e:
+        # The client closed first and the server hasn't read its close frame yet
+        logger.debug(f"WebSocket already closed: {str(e)}")
+
 @app.websocket("/ws/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str):
-    """WebSocket for real-time terminal communication"""
+async def websocket_endpoint(websocket: WebSocket, session_id: str, framing: str = "json", pager: str = "client",
+                             resume: Optional[int] = None, role: str = "read-write", view: str = "stream"):
+    """WebSocket for real-time terminal communication
+
+    Clients that connect with ``?framing=binary`` receive shell output as raw
+    binary frames; everyone else gets the original JSON "output" messages.
+    Control messages (errors, file lists) are always JSON text frames.
+    Clients that connect with ``?pager=server`` leave --More-- prompts to the
+    server pager instead of answering them themselves, as long as
+    ``server_pager`` in the ``attached`` (or a later ``pager``) message says
+    the server will; under ``PAGER_MODE=off`` or ``disable`` it won't. On a
+    shared session the server answers while any read-write client asks.
+
+    The first message is ``attached`` with the stream offset output starts
+    at; JSON output messages carry the offset just past them, and binary
+    clients count bytes (an ``offset`` message corrects them after a
+    truncation marker). A client that reconnects with ``?resume=<offset>``
+    gets the output it missed from scrollback before live output.
+
+    Any number of clients can attach to one session. ``?role=read-only``
+    viewers see the output but cannot type, page or complete.
+
+    ``?view=screen`` clients get a ``screen`` snapshot of what a terminal
+    would show instead of the byte history, then ``screen-diff`` messages
+    with the lines that changed. Read-write clients may send ``resize`` with
+    ``cols`` and ``rows`` to resize the device's PTY.
+    """
     await websocket.accept()
+    attached = False
+    subscriber = None
+    pump = None
+    measure_echo = None
+    # Completion answers and the platform notice, sent alongside shell output
+    side_tasks = set()
     
     try:
         if session_id not in active_shells:
+            record = await registry.get(session_id)
+            if record is not None and not registry.is_local(record) and record.get("worker_url"):
+                await proxy_websocket(websocket, record, f"/ws/{session_id}?{websocket.url.query}")
+                return
             await websocket.send_text(json.dumps({
                 "type": "error",
                 "message": "Invalid session ID"
             }))
             return
         
+        if role not in ROLES:
+            await websocket.send_text(json.dumps({
+                "type": "error",
+                "message": f"Unknown role {role!r}; use one of {', '.join(ROLES)}"
+            }))
+            return
+        read_only = role == "read-only"
+        hub = active_hubs[session_id]
+        if view not in VIEWS or (view == "screen" and hub.screen is None):
+            await websocket.send_text(json.dumps({
+                "type": "error",
+                "message": f"View {view!r} is not available; use stream" if view in VIEWS
+                else f"Unknown view {view!r}; use one of {', '.join(VIEWS)}"
+            }))
+            return
+        
         shell = active_shells[session_id]
+        pump = active_pumps[session_id]
+        reaper.attach(session_id)
+        attached = True
         
-        # Start background task to read shell output
-        async def read_shell_output():
-            while True:
-                try:
-                    if shell.recv_ready():
-                        data = shell.recv(4096).decode('utf-8', errors='ignore')
-                        if data:
-                            await websocket.send_text(json.dumps({
-                                "type": "output",
-                                "data": data
-                            }))
-                    await asyncio.sleep(0.1)
-                except Exception as e:
-                    await websocket.send_text(json.dumps({
-                        "type": "error",
-                        "message": f"Shell read error: {str(e)}"
-                    }))
-                    break
+        # Output comes from the session's hub, shared with everyone else watching
+        subscriber = hub.subscribe(websocket, role=role, binary=framing == "binary", resume=resume, view=view,
+                                   server_pager=pager == "server")
+        attach = subscriber.attach
+        metrics.WS_ATTACHES.inc(resume=("partial" if attach["lost"] else "resumed") if attach["resumed"] else "new")
+        
+        # Keystroke-to-echo latency: first output after input that was waiting for it
+        echo_started = []
+        def measure_echo(data: bytes):
+            if echo_started:
+                metrics.ECHO_LATENCY_SECONDS.observe(time.perf_counter() - echo_started.pop())
+        pump.listeners.append(measure_echo)
+        
+        completer = active_completers.get(session_id)
+        if completer is None:
+            completer = active_completers[session_id] = SessionCompleter(
+                active_connections[session_id],
+                ttl=settings.COMPLETION_CACHE_TTL,
+                pool=connector.pool,
+                entry=connector.lease(shell),
+                detector=active_detectors.get(session_id)
+            )
+        async def send_platform(detector: PlatformDetector):
+            detected = await detector.wait()
+            try:
+                await websocket.send_json({"type": "platform", **detected})
+            except (WebSocketDisconnect, RuntimeError) as e:
+                # The browser left before detection finished
+                logger.debug(f"Could not send platform to {session_id}: {str(e)}")
         
-        # Start reading task
-        read_task = asyncio.create_task(read_shell_output())
+        if session_id in active_detectors:
+            side_tasks.add(asyncio.create_task(send_platform(active_detectors[session_id])))
+        
+        async def answer_completion(request: dict):
+            try:
+                if request.get("type") == "commands":
+                    reply = {"type": "commands", "commands": await completer.commands()}
+                else:
+                    path = request.get("path", "")
+                    reply = {"type": "filelist", "path": path, "files": await completer.list_dir(path)}
+                if "id" in request:
+                    reply["id"] = request["id"]
+                await websocket.send_json(reply)
+            except Exception as e:
+                logger.error(f"Completion error on {session_id}: {str(e)}")
         
         # Handle incoming messages
         while True:
             try:
                 message = await websocket.receive_text()
                 data = json.loads(message)
+                reaper.touch(session_id)
                 
-                if data.get("type") == "command":
+                if read_only and data.get("type") in ("command", "pager", "resize", "filelist", "commands"):
+                    await websocket.send_text(json.dumps({
+                        "type": "error",
+                        "message": "This view of the session is read-only"
+                    }))
+                
+                elif data.get("type") == "command":
                     command = data.get("command", "")
                     if shell and shell.send_ready():
+                        if not echo_started:
+                            echo_started.append(time.perf_counter())
                         shell.send(command)
-                        logger.info(f"Command sent: {command[:50]}...")
+                        metrics.INPUT_BYTES.inc(len(command.encode()))
+                        if command.strip():
+                            audit.record("command", command=command.rstrip("\r\n"), **session_context(session_id))
+                
+                elif data.get("type") == "pager":
+                    # Client toggled auto-pagination; it answers prompts itself unless told we will
+                    server_pager = hub.set_pager(subscriber, bool(data.get("enabled")))
+                    await websocket.send_json({"type": "pager", "server_pager": server_pager})
                 
                 elif data.get("type") == "resize":
-                    # Handle terminal resize if needed
-                    pass
+                    try:
+                        columns = min(max(int(data.get("cols")), 1), MAX_COLUMNS)
+                        lines = min(max(int(data.get("rows")), 1), MAX_LINES)
+                    except (TypeError, ValueError):
+                        await websocket.send_text(json.dumps({
+                            "type": "error",
+                            "message": "resize needs numeric cols and rows"
+                        }))
+                        continue
+                    # The device reflows to the new size and full-screen programs redraw
+                    shell.resize_pty(width=columns, height=lines)
+                    hub.resize_screen(columns, lines)
                     
-                elif data.get("type") == "filelist":
-                    # Handle file listing for tab completion
-                    path = data.get("path", "")
-                    if shell and shell.send_ready():
-                        # Send ls command to get file listing
-                        ls_command = f"ls -F {path} 2>/dev/null || echo 'No such directory'\n"
-                        shell.send(ls_command)
-                        
-                        # Read the output
-                        await asyncio.sleep(0.1)  # Give time for command to execute
-                        output = ""
-                        while shell.recv_ready():
-                            output += shell.recv(1024).decode('utf-8', errors='ignore')
-                        
-                        # Parse the output to get file/directory names
-                        files = []
-                        if output and "No such directory" not in output:
-                            # ls -F adds / to directories, * to executables, @ to symlinks
-                            for item in output.strip().split('\n'):
-                                if item.strip():
-                                    # Keep the trailing slash for directories
-                                    files.append(item.strip())
-                        
-                        await websocket.send_json({
-                            "type": "filelist",
-                            "path": path,
-                            "files": files
-                        })
+                elif data.get("type") in ("filelist", "commands"):
+                    # Tab completion runs on a side channel; answer without holding up keystrokes
+                    side_tasks.add(asyncio.create_task(answer_completion(data)))
+                    side_tasks.difference_update([task for task in side_tasks if task.done()])
                     
             except WebSocketDisconnect:
                 break
@@ -201,24 +687,492 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                 logger.error(f"WebSocket error: {str(e)}")
                 break
         
-        # Cleanup
-        read_task.cancel()
-        
     except Exception as e:
         logger.error(f"WebSocket connection error: {str(e)}")
     finally:
-        await websocket.close()
+        # Also on the error path, or the listener would stay on the pump until the orphan timeout
+        for task in side_tasks:
+            task.cancel()
+        if measure_echo is not None and measure_echo in pump.listeners:
+            pump.listeners.remove(measure_echo)
+        if subscriber is not None:
+            await hub.unsubscribe(subscriber)
+        if attached:
+            reaper.detach(session_id)
+        await close_websocket(websocket)
+
+async def proxy_websocket(websocket: WebSocket, record: dict, path: str):
+    """Relay a terminal WebSocket to the worker that owns the session"""
+    url = record["worker_url"].replace("http://", "ws://", 1).replace("https://", "wss://", 1) + path
+    logger.info(f"Proxying WebSocket for {record['session_id']} to worker {record['worker_id']}")
+    try:
+        async with websockets.connect(url, max_size=None) as upstream:
+            async def client_to_owner():
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        break
+                    await upstream.send(message["bytes"] if message.get("bytes") is not None else message["text"])
+            
+            async def owner_to_client():
+                async for message in upstream:
+                    if isinstance(message, bytes):
+                        await websocket.send_bytes(message)
+                    else:
+                        await websocket.send_text(message)
+            
+            tasks = [asyncio.create_task(client_to_owner()), asyncio.create_task(owner_to_client())]
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    task.cancel()
+    except (OSError, websockets.exceptions.WebSocketException) as e:
+        logger.error(f"WebSocket proxy to {record['worker_id']} failed: {str(e)}")
+        await websocket.send_text(json.dumps({
+            "type": "error",
+            "message": "Session worker unreachable"
+        }))
+
+def request_number(data: dict, key: str, default: float, upper: float, cast: Callable = float):
+    """A positive number from a request body, capped at ``upper``; 400 when it is anything else"""
+    try:
+        value = cast(data.get(key, default))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"{key} must be a number")
+    if not value > 0:
+        raise HTTPException(status_code=400, detail=f"{key} must be positive")
+    return min(value, upper)
+
+BATCH_RUNNING = "A batch is already running on this session"
+
+def session_executor(session_id: str, timeout: float):
+    """The session's batch lock, prompt tracker and a new executor; 409 while another batch runs
+
+    The lock is taken where the response starts streaming, with
+    ``batch_lock_taken`` checked first: a free lock is acquired without
+    yielding, so of two requests that both passed the 409 check only one
+    runs, and a client that leaves before the body starts never strands it.
+    """
+    lock = batch_locks.setdefault(session_id, asyncio.Lock())
+    if lock.locked():
+        raise HTTPException(status_code=409, detail=BATCH_RUNNING)
+    
+    prompt = active_prompts.setdefault(session_id, PromptTracker())
+    executor = BatchExecutor(
+        active_shells[session_id],
+        active_pumps[session_id],
+        prompt,
+        pager=active_pagers.get(session_id),
+        timeout=timeout
+    )
+    return lock, prompt, executor
+
+def batch_lock_taken(lock: asyncio.Lock) -> Optional[str]:
+    """The NDJSON error line for a request that lost the race for the batch lock"""
+    if lock.locked():
+        return json.dumps({"type": "error", "status": 409, "message": BATCH_RUNNING}) + "\n"
+    return None
+
+@app.post("/api/sessions/{session_id}/batch")
+async def run_batch(session_id: str, batch_data: dict):
+    """Run a command list on the session's shell, streaming NDJSON results
+
+    Each command is sent once the device prompt returns, so throughput is
+    bounded by the device rather than by fixed delays in the browser.
+    """
+    await require_local_session(session_id)
+    
+    commands = parse_commands(batch_data.get("commands", []))
+    if not commands:
+        raise HTTPException(status_code=400, detail="No commands to execute")
+    if len(commands) > settings.BATCH_MAX_COMMANDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_COMMANDS} commands per batch")
+    
+    timeout = request_number(batch_data, "timeout", settings.BATCH_COMMAND_TIMEOUT, settings.BATCH_MAX_COMMAND_TIMEOUT)
+    lock, prompt, executor = session_executor(session_id, timeout)
+    
+    async def stream_results():
+        taken = batch_lock_taken(lock)
+        if taken:
+            yield taken
+            return
+        async with lock, executor:
+            started = time.monotonic()
+            reaper.begin_work(session_id)
+            try:
+                if prompt.pattern is None:
+                    await executor.learn_prompt()
+                yield json.dumps({"type": "prompt", "prompt": prompt.prompt}) + "\n"
+                
+                completed = 0
+                audit.record("batch", commands=commands, **session_context(session_id))
+                async for result in executor.run(commands):
+                    completed += result["status"] == "ok"
+                    reaper.touch(session_id)
+                    yield json.dumps({"type": "result", **result}) + "\n"
+                
+                yield json.dumps({
+                    "type": "done",
+                    "commands": len(commands),
+                    "completed": completed,
+                    "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+                }) + "\n"
+                logger.info(f"Batch finished on {session_id}: {completed}/{len(commands)} commands")
+            except Exception as e:
+                logger.error(f"Batch error on {session_id}: {str(e)}")
+                yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+            finally:
+                reaper.end_work(session_id)
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+def parse_commands(commands) -> list:
+    """Accept a list of commands or one newline-separated script"""
+    if isinstance(commands, str):
+        commands = commands.splitlines()
+    return [command for command in commands if command.strip()]
+
+@app.get("/api/parsers")
+async def get_parsers():
+    """Output templates available to the parse endpoints"""
+    return {"templates": list_templates()}
+
+@app.post("/api/sessions/{session_id}/parse")
+async def parse_command(session_id: str, parse_data: dict):
+    """Run one show command and stream its output as parsed records (NDJSON)
+
+    The template is chosen by the session's detected platform (or
+    ``platform`` in the request). Records are sent as soon as their lines
+    arrive, and output is read from the device only as fast as the client
+    takes the records, so long tables are never held in memory whole.
+    """
+    await require_local_session(session_id)
+    
+    command = (parse_data.get("command") or "").strip()
+    if not command:
+        raise HTTPException(status_code=400, detail="No command given")
+    record = registry.sessions.get(session_id) or {}
+    platform = parse_data.get("platform") or record.get("platform")
+    template = find_template(platform, command)
+    if template is None:
+        raise HTTPException(status_code=400, detail=f"No parser for {command!r} on platform {platform!r}")
+    
+    timeout = request_number(parse_data, "timeout", settings.BATCH_COMMAND_TIMEOUT, settings.BATCH_MAX_COMMAND_TIMEOUT)
+    lock, prompt, executor = session_executor(session_id, timeout)
+    
+    async def stream_records():
+        taken = batch_lock_taken(lock)
+        if taken:
+            yield taken
+            return
+        async with lock, executor:
+            started = time.monotonic()
+            reaper.begin_work(session_id)
+            try:
+                if prompt.pattern is None:
+                    await executor.learn_prompt()
+                audit.record("parse", command=command, template=template.name, **session_context(session_id))
+                
+                parser = template.parser()
+                count = 0
+                async for item in executor.stream_command(command):
+                    if not isinstance(item, str):
+                        result = item
+                        continue
+                    for parsed in parser.feed(item):
+                        count += 1
+                        yield json.dumps({"type": "record", "record": parsed}) + "\n"
+                for parsed in parser.close():
+                    count += 1
+                    yield json.dumps({"type": "record", "record": parsed}) + "\n"
+                
+                yield json.dumps({
+                    "type": "done",
+                    "command": command,
+                    "template": template.name,
+                    "status": result["status"],
+                    "records": count,
+                    "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+                }) + "\n"
+            except Exception as e:
+                logger.error(f"Parse error on {session_id}: {str(e)}")
+                yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+            finally:
+                reaper.end_work(session_id)
+    
+    return StreamingResponse(stream_records(), media_type="application/x-ndjson")
+
+def start_fanout(job_data: dict, on_device=None, user_id: Optional[str] = None) -> StreamingResponse:
+    """Validate a fan-out request and stream its per-device results as NDJSON
+
+    ``on_device`` can adjust each device's connection data before it is
+    opened (the NMS integration uses it for inventory lookups and auditing).
+
+    Each device holds a slot against ``SSH_MAX_SESSIONS`` while it runs; a
+    device that finds none fails like any other connect. The per-user
+    limit is for interactive sessions and doesn't apply, since
+    ``concurrency`` already bounds how many devices one job opens at once.
+    """
+    devices = job_data.get("devices", [])
+    commands = parse_commands(job_data.get("commands", []))
+    if not devices:
+        raise HTTPException(status_code=400, detail="No devices given")
+    if not commands:
+        raise HTTPException(status_code=400, detail="No commands to execute")
+    if len(devices) > settings.FANOUT_MAX_DEVICES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.FANOUT_MAX_DEVICES} devices per job")
+    if len(commands) > settings.BATCH_MAX_COMMANDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_COMMANDS} commands per job")
+    
+    async def open_device(device: dict):
+        if on_device is not None:
+            device = await on_device(device)
+        await admit_session(None)
+        try:
+            return await open_device_shell(device)
+        except BaseException:
+            release_session_slot(None)
+            raise
+    
+    async def close_device(shell: paramiko.Channel, pump: ShellPump):
+        try:
+            await close_device_shell(shell, pump)
+        finally:
+            release_session_slot(None)
+    
+    job = FanoutJob(
+        open_device,
+        close_device,
+        devices,
+        commands,
+        defaults=job_data,
+        concurrency=request_number(job_data, "concurrency", settings.FANOUT_CONCURRENCY, settings.FANOUT_CONCURRENCY,
+                                   cast=int),
+        timeout=request_number(job_data, "timeout", settings.BATCH_COMMAND_TIMEOUT, settings.BATCH_MAX_COMMAND_TIMEOUT),
+        parse=bool(job_data.get("parse"))
+    )
+    logger.info(f"Fan-out job {job.job_id}: {len(devices)} devices, {len(commands)} commands")
+    
+    async def stream_results():
+        async for result in job.run():
+            if result["type"] == "device":
+                audit.record(
+                    "fanout_device",
+                    job_id=job.job_id,
+                    device_id=result.get("device_id"),
+                    device_ip=result.get("host"),
+                    user_id=user_id,
+                    status=result["status"],
+                    commands=commands
+                )
+            yield json.dumps(result) + "\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.post("/api/jobs/fanout")
+async def run_fanout(job_data: dict):
+    """Run the same commands on many devices, streaming NDJSON per device"""
+    return start_fanout(job_data)
 
 @app.get("/api/sessions")
-async def list_sessions():
-    """List active SSH sessions (for admin monitoring)"""
+async def list_sessions(user_id: Optional[str] = None, device_id: Optional[str] = None,
+                        limit: int = 100, offset: int = 0):
+    """List active SSH sessions across all workers (for admin monitoring), one page at a time"""
     sessions = []
-    for session_id in active_connections:
+    records = await registry.list_sessions(user_id=user_id, device_id=device_id,
+                                           limit=min(limit, 1000), offset=offset)
+    for record in records:
         sessions.append({
-            "session_id": session_id,
-            "status": "active"
+            **record,
+            "status": "active",
+            "local": registry.is_local(record)
         })
-    return {"sessions": sessions}
+    return {
+        "sessions": sessions,
+        "total": await registry.count_sessions(user_id=user_id, device_id=device_id),
+        "limit": min(limit, 1000),
+        "offset": offset,
+        "worker_id": registry.worker_id
+    }
+
+async def open_transcript(session_id: str) -> TranscriptReader:
+    """Reader for a live or finished session's transcript, with live output flushed first"""
+    transcript = active_transcripts.get(session_id)
+    if transcript is not None:
+        pending = transcript.flush()
+        if pending is not None:
+            await pending
+    try:
+        return await asyncio.to_thread(TranscriptReader, settings.TRANSCRIPT_DIR, session_id)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="No transcript for this session")
+
+@app.get("/api/sessions/{session_id}/transcript")
+async def transcript_info(session_id: str):
+    """Transcript size, block count and time span"""
+    reader = await open_transcript(session_id)
+    return reader.info()
+
+@app.get("/api/sessions/{session_id}/transcript/data")
+async def transcript_data(session_id: str, start: int = 0, end: Optional[int] = None,
+                          since: Optional[float] = None, until: Optional[float] = None):
+    """Raw output in a byte range [start, end) and/or time range [since, until)
+
+    Only the compressed blocks overlapping the range are read, one at a
+    time as the response streams. The first returned byte's offset is in the
+    ``X-Transcript-Offset`` header.
+    """
+    reader = await open_transcript(session_id)
+    chunks = stream_range(reader, since, until, start, end)
+    first = await anext(chunks, None)
+    offset = start if first is None else first[0]
+    
+    async def body():
+        if first is None:
+            return
+        yield first[1]
+        async for _, data in chunks:
+            yield data
+    
+    return StreamingResponse(
+        body(),
+        media_type="application/octet-stream",
+        headers={"X-Transcript-Offset": str(offset), "X-Transcript-Size": str(reader.size)}
+    )
+
+@app.websocket("/api/sessions/{session_id}/replay")
+async def replay_session(websocket: WebSocket, session_id: str, speed: float = 1.0,
+                         idle_limit: Optional[float] = None, since: Optional[float] = None,
+                         framing: str = "json"):
+    """Stream a recorded session back with its original timing
+
+    Output goes out exactly like a live session's (binary frames with
+    ``?framing=binary``, JSON "output" messages otherwise), bracketed by
+    ``{"type": "replay", "state": "start" | "end"}`` messages. ``speed``
+    scales the clock (0 = as fast as possible) and ``idle_limit`` caps
+    pauses, in seconds.
+    """
+    await websocket.accept()
+    try:
+        try:
+            reader = await open_transcript(session_id)
+        except HTTPException as e:
+            await websocket.send_text(json.dumps({"type": "error", "message": e.detail}))
+            return
+        
+        info = reader.info()
+        await websocket.send_text(json.dumps({
+            "type": "replay",
+            "state": "start",
+            "session_id": session_id,
+            "bytes": info["recorded_bytes"],
+            "first_ts": info["first_ts"],
+            "last_ts": info["last_ts"]
+        }))
+        binary_output = framing == "binary"
+        decoder = output_decoder()
+        sent = 0
+        async for _, data in replay(reader, speed=max(speed, 0.0), idle_limit=idle_limit, since=since):
+            sent += len(data)
+            if binary_output:
+                await websocket.send_bytes(data)
+            else:
+                text = decoder.decode(data)
+                if text:
+                    await websocket.send_text(json.dumps({"type": "output", "data": text}))
+        await websocket.send_text(json.dumps({"type": "replay", "state": "end", "bytes": sent}))
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Replay error for {session_id}: {str(e)}")
+    finally:
+        await close_websocket(websocket)
+
+@app.get("/api/sessions/{session_id}/replay.cast")
+async def replay_asciicast(session_id: str, idle_limit: Optional[float] = None):
+    """The recorded session as an asciicast v2 file for asciinema players"""
+    reader = await open_transcript(session_id)
+    return StreamingResponse(
+        asciicast(reader, idle_limit=idle_limit),
+        media_type="application/x-asciicast",
+        headers={"Content-Disposition": f'attachment; filename="{session_id}.cast"'}
+    )
+
+@app.get("/api/audit")
+async def query_audit(user_id: Optional[str] = None, device_id: Optional[str] = None,
+                      device_ip: Optional[str] = None, session_id: Optional[str] = None,
+                      action: Optional[str] = None, since: Optional[float] = None,
+                      until: Optional[float] = None, limit: int = 100, offset: int = 0):
+    """Audit events, newest first; ``since``/``until`` are Unix timestamps"""
+    if not audit.enabled:
+        raise HTTPException(status_code=404, detail="Audit logging is disabled")
+    events = await audit.query(
+        user_id=user_id, device_id=device_id, device_ip=device_ip, session_id=session_id,
+        action=action, since=since, until=until, limit=min(limit, 1000), offset=offset
+    )
+    return {"events": events, "count": len(events)}
+
+@app.get("/api/audit/stats")
+async def audit_stats():
+    """Audit queue depth, drops and write throughput"""
+    return audit.get_stats()
+
+@app.get("/api/sessions/stats")
+async def session_stats():
+    """Session counts against the limits and what the idle reaper has reclaimed"""
+    pool = connector.pool.get_stats()
+    return {
+        "active": len(active_shells),
+        "fleet_active": await registry.count_sessions(),
+        "pending_connects": sum(pending_connects.values()),
+        "max_sessions": settings.SSH_MAX_SESSIONS,
+        "max_sessions_per_user": settings.SSH_MAX_SESSIONS_PER_USER,
+        **limit_stats,
+        "reaper": reaper.get_stats(),
+        # Transports closed once their last session went away
+        "transports_reclaimed": pool["expired"] + pool["evicted"],
+        "output_queue": output_queue_stats()
+    }
+
+def output_queue_stats(slowest: int = 10) -> dict:
+    """Output queue limits and the sessions that have fallen furthest behind"""
+    consumers = sorted(
+        ({"session_id": session_id, **pump.get_stats()} for session_id, pump in active_pumps.items()),
+        key=lambda stats: stats["high_water"], reverse=True
+    )
+    return {
+        "max_bytes": settings.OUTPUT_QUEUE_MAX_BYTES,
+        "policy": settings.OUTPUT_QUEUE_POLICY,
+        "paused": sum(stats["paused"] for stats in consumers),
+        "slow_consumers": [
+            stats for stats in consumers[:slowest] if stats["pauses"] or stats["dropped_bytes"]
+        ]
+    }
+
+@app.get("/api/sessions/{session_id}/subscribers")
+async def get_session_subscribers(session_id: str):
+    """WebSockets sharing a local session, with their roles and how far behind each has fallen"""
+    await require_local_session(session_id)
+    return active_hubs[session_id].get_stats()
+
+@app.get("/api/sessions/{session_id}/screen")
+async def get_session_screen(session_id: str):
+    """What a terminal attached to a local session would show right now"""
+    await require_local_session(session_id)
+    hub = active_hubs[session_id]
+    if hub.screen is None:
+        raise HTTPException(status_code=404, detail="This session has no screen model")
+    snapshot = hub.screen.snapshot()
+    return {"offset": hub.screen.offset, **snapshot}
+
+@app.get("/api/sessions/{session_id}")
+async def get_session(session_id: str):
+    """One session's record from any worker, including the detected platform and prompt"""
+    record = await registry.get(session_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Invalid session ID")
+    return {**record, "local": registry.is_local(record)}
 
 if __name__ == "__main__":
     import uvicorn
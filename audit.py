@@ -0,0 +1,216 @@
+"""
+Audit logging for Monetx NCM SSH Emulator
+Queues audit events in memory and writes them to SQLite in batches from a single task
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Columns callers can filter on; everything else goes in the JSON detail
+AUDIT_COLUMNS = ("action", "user_id", "username", "session_id", "device_id", "device_ip")
+
+AUDIT_QUEUE_DEPTH = metrics.REGISTRY.add(metrics.Gauge(
+    "ncm_audit_queue_depth", "Audit events waiting to be written"
+))
+AUDIT_EVENTS = metrics.REGISTRY.add(metrics.Counter(
+    "ncm_audit_events_total", "Audit events by outcome (written, dropped, failed)", labelnames=("outcome",)
+))
+AUDIT_BATCH_SIZE = metrics.REGISTRY.add(metrics.Histogram(
+    "ncm_audit_batch_size", "Audit events per insert batch", (1, 5, 10, 50, 100, 250, 500, 1000)
+))
+AUDIT_FLUSH_SECONDS = metrics.REGISTRY.add(metrics.Histogram(
+    "ncm_audit_flush_seconds", "Time to write one audit batch"
+))
+
+
+class AuditLog:
+    """Bounded, non-blocking audit pipeline
+
+    ``record()`` never waits: when the queue is full the event is dropped
+    and counted, so auditing cannot slow down the terminal.
+    """
+
+    def __init__(self, path: str, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 0.5, enabled: bool = True):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.writer_task: Optional[asyncio.Task] = None
+        # Events taken off the queue but not yet handed to a write
+        self.pending: List[Dict[str, Any]] = []
+        self.inflight: Optional[asyncio.Future] = None
+        self.db: Optional[sqlite3.Connection] = None
+        self.stats = {"written": 0, "dropped": 0, "failed": 0, "batches": 0, "max_queue_depth": 0}
+        AUDIT_QUEUE_DEPTH.callback = self.queue.qsize
+
+    def _open(self):
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA busy_timeout=5000")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS audit_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, action TEXT NOT NULL, "
+            "user_id TEXT, username TEXT, session_id TEXT, device_id TEXT, device_ip TEXT, detail TEXT)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS audit_ts ON audit_events (ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS audit_user ON audit_events (user_id, ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS audit_device ON audit_events (device_id, ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS audit_device_ip ON audit_events (device_ip, ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS audit_session ON audit_events (session_id, ts)")
+        return db
+
+    async def start(self):
+        if not self.enabled or self.writer_task is not None:
+            return
+        self.db = await asyncio.to_thread(self._open)
+        self.writer_task = asyncio.create_task(self._writer())
+        logger.info(f"Audit log writing to {self.path}")
+
+    def record(self, action: str, **fields):
+        """Queue one event; returns immediately"""
+        if not self.enabled:
+            return
+        event = {"ts": time.time(), "action": action, **fields}
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            AUDIT_EVENTS.inc(outcome="dropped")
+            return
+        depth = self.queue.qsize()
+        if depth > self.stats["max_queue_depth"]:
+            self.stats["max_queue_depth"] = depth
+
+    def _insert(self, batch: List[Dict[str, Any]]):
+        rows = []
+        for event in batch:
+            detail = {key: value for key, value in event.items() if key not in AUDIT_COLUMNS and key != "ts"}
+            rows.append((
+                event["ts"],
+                *(None if event.get(column) is None else str(event[column]) for column in AUDIT_COLUMNS),
+                json.dumps(detail, default=str) if detail else None
+            ))
+        self.db.execute("BEGIN")
+        try:
+            self.db.executemany(
+                "INSERT INTO audit_events (ts, action, user_id, username, session_id, device_id, device_ip, detail) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._insert, batch)
+        except Exception as e:
+            logger.error(f"Audit write of {len(batch)} events failed: {str(e)}")
+            self.stats["failed"] += len(batch)
+            AUDIT_EVENTS.inc(len(batch), outcome="failed")
+            return
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+        AUDIT_EVENTS.inc(len(batch), outcome="written")
+        AUDIT_BATCH_SIZE.observe(len(batch))
+        AUDIT_FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+    async def _writer(self):
+        while True:
+            self.pending = [await self.queue.get()]
+            if self.queue.qsize() < self.batch_size:
+                # Let a burst build up into one transaction
+                await asyncio.sleep(self.flush_interval)
+            while len(self.pending) < self.batch_size and not self.queue.empty():
+                self.pending.append(self.queue.get_nowait())
+            batch, self.pending = self.pending, []
+            # Shielded so stopping the writer never abandons a half-done insert
+            self.inflight = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self.inflight)
+
+    async def stop(self):
+        """Write whatever is still queued and close the database"""
+        if self.writer_task is None:
+            return
+        self.writer_task.cancel()
+        await asyncio.gather(self.writer_task, return_exceptions=True)
+        self.writer_task = None
+        if self.inflight is not None:
+            await self.inflight
+        batch, self.pending = self.pending, []
+        while batch or not self.queue.empty():
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self._write(batch)
+            batch = []
+        self.db.close()
+        self.db = None
+
+    def _select(self, sql: str, params: list) -> List[Dict[str, Any]]:
+        # Readers get their own connection so they never wait on the writer's
+        db = sqlite3.connect(self.path)
+        try:
+            db.row_factory = sqlite3.Row
+            return [dict(row) for row in db.execute(sql, params)]
+        finally:
+            db.close()
+
+    async def query(self, user_id: Optional[str] = None, device_id: Optional[str] = None,
+                    device_ip: Optional[str] = None, session_id: Optional[str] = None,
+                    action: Optional[str] = None, since: Optional[float] = None,
+                    until: Optional[float] = None, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """Events matching every given filter, newest first"""
+        if self.db is None:
+            return []
+        clauses, params = [], []
+        for column, value in (("user_id", user_id), ("device_id", device_id), ("device_ip", device_ip),
+                              ("session_id", session_id), ("action", action)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        sql = "SELECT * FROM audit_events"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY ts DESC, id DESC LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+        events = await asyncio.to_thread(self._select, sql, params)
+        for event in events:
+            if event["detail"]:
+                event.update(json.loads(event["detail"]))
+            del event["detail"]
+        return events
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize
+        }
+
+
+def database_path(url: str) -> Optional[str]:
+    """File path of a ``sqlite:///`` DATABASE_URL, or None for other databases"""
+    if not url.startswith("sqlite:///"):
+        logger.warning(f"Audit log needs a sqlite:/// DATABASE_URL, got {url!r}; auditing disabled")
+        return None
+    return url[len("sqlite:///"):]
@@ -0,0 +1,195 @@
+"""
+Server-side batch command execution for Monetx NCM SSH Emulator
+Runs command lists against an open shell, pacing each line on the device prompt
+"""
+
+import asyncio
+import logging
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+import paramiko
+
+from pager import PagerEngine
+from shell_pump import ShellPump, output_decoder
+
+logger = logging.getLogger(__name__)
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]|\x1b[()][A-Za-z0-9]")
+
+
+class PromptTracker:
+    """Learns a device prompt and recognises it at the end of output
+
+    The learned pattern keeps the hostname and allows the mode decorations
+    devices add around it: ``Router(config-if)#``, ``[~HUAWEI-Gi0/0/1]``,
+    ``user@host:/tmp$``.
+    """
+
+    def __init__(self):
+        self.prompt: Optional[str] = None
+        self.pattern: Optional[re.Pattern] = None
+
+    def learn(self, line: str):
+        prompt = ANSI_ESCAPE.sub("", line).strip()
+        match = re.match(r"^[<\[]?~?\*?([^\s<\[(:#>$%\]]+)", prompt)
+        base = match.group(1) if match else prompt.rstrip("#>$%] ")
+        self.prompt = prompt
+        self.pattern = re.compile(
+            r"^[<\[]?~?\*?" + re.escape(base) + r"[^\r\n]{0,64}?[#>$%\]]\s*$"
+        )
+
+    def matches(self, tail: str) -> bool:
+        """True when the last line of ``tail`` is the device prompt"""
+        if self.pattern is None:
+            return False
+        last_line = ANSI_ESCAPE.sub("", tail.rsplit("\n", 1)[-1]).strip("\r")
+        return bool(self.pattern.match(last_line))
+
+
+class BatchExecutor:
+    """Runs commands one after another on an interactive shell
+
+    Output waiting to be consumed is bounded by ``max_buffered`` bytes:
+    past that the pump is held, so a slow consumer holds the device back
+    through SSH flow control rather than piling output up in memory.
+    """
+
+    def __init__(self, shell: paramiko.Channel, pump: ShellPump, prompt: PromptTracker,
+                 pager: Optional[PagerEngine] = None, timeout: float = 30.0, max_buffered: int = 1048576):
+        self.shell = shell
+        self.pump = pump
+        self.prompt = prompt
+        self.pager = pager
+        self.timeout = timeout
+        self.max_buffered = max_buffered
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.buffered = 0
+
+    def _on_output(self, data: bytes):
+        """Pump listener: buffer output for the command being run"""
+        self.queue.put_nowait(data)
+        self.buffered += len(data)
+        if self.buffered >= self.max_buffered:
+            self.pump.hold(self)
+
+    async def _next(self, timeout: float) -> bytes:
+        data = await asyncio.wait_for(self.queue.get(), timeout)
+        self.buffered -= len(data)
+        if self.buffered <= self.max_buffered // 2:
+            self.pump.release(self)
+        return data
+
+    async def __aenter__(self):
+        self.pump.listeners.append(self._on_output)
+        if self.pager is not None:
+            # Pages must keep flowing even if no browser is attached
+            self.pager.set_enabled(True, batch=True)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.pump.listeners.remove(self._on_output)
+        self.pump.release(self)
+        if self.pager is not None:
+            self.pager.set_enabled(False, batch=True)
+
+    def _drain(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.buffered = 0
+        self.pump.release(self)
+
+    async def learn_prompt(self, quiet: float = 0.3) -> str:
+        """Send an empty line and take the last line the device prints as its prompt"""
+        self._drain()
+        self.shell.send("\n")
+        decoder = output_decoder()
+        text = ""
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            try:
+                data = await self._next(quiet)
+            except asyncio.TimeoutError:
+                if text.strip():
+                    break
+                continue
+            text += decoder.decode(data)
+        lines = [line for line in text.splitlines() if line.strip()]
+        if not lines:
+            raise TimeoutError("Device did not print a prompt")
+        self.prompt.learn(lines[-1])
+        return self.prompt.prompt
+
+    async def stream_command(self, command: str) -> AsyncIterator[Union[str, Dict[str, Any]]]:
+        """Send one command and yield its output as it arrives, then its result once the prompt is back
+
+        Output is only taken from the pump as fast as the caller asks for
+        it; time the caller spends on a chunk doesn't count against the
+        timeout.
+        """
+        self._drain()
+        decoder = output_decoder()
+        tail = ""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        self.shell.send(command.rstrip("\n") + "\n")
+
+        status = "ok"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                status = "timeout"
+                break
+            try:
+                data = await self._next(remaining)
+            except asyncio.TimeoutError:
+                status = "timeout"
+                break
+            text = decoder.decode(data)
+            if text:
+                yielded = time.monotonic()
+                yield text
+                deadline += time.monotonic() - yielded
+            # Only the last line matters for prompt detection
+            tail = (tail + text)[-512:]
+            if self.prompt.matches(tail):
+                break
+
+        yield {
+            "command": command,
+            "status": status,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+        }
+
+    async def run_command(self, command: str) -> Dict[str, Any]:
+        """Send one command and wait for the prompt to come back, with its output collected into the result"""
+        collected: List[str] = []
+        async for item in self.stream_command(command):
+            if isinstance(item, str):
+                collected.append(item)
+            else:
+                result = item
+        result["output"] = self._strip_echo_and_prompt(command, "".join(collected))
+        return result
+
+    def _strip_echo_and_prompt(self, command: str, output: str) -> str:
+        lines = output.split("\n")
+        if lines and command.strip() and command.strip() in lines[0]:
+            lines = lines[1:]
+        if lines and self.prompt.matches(lines[-1]):
+            lines = lines[:-1]
+        return "\n".join(lines)
+
+    async def run(self, commands: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Run commands in order, yielding one result per command
+
+        Stops at the first command whose prompt never came back, since the
+        device is then in an unknown state.
+        """
+        for index, command in enumerate(commands):
+            result = await self.run_command(command)
+            result["index"] = index
+            yield result
+            if result["status"] != "ok":
+                break
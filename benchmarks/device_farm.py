@@ -0,0 +1,329 @@
+"""
+End-to-end load test against a simulated device farm
+
+Starts the device simulator and the service as local processes (or uses a
+running service with --url), then drives /api/connect and /ws/{session_id}
+the way browsers do, with no network device:
+
+    python benchmarks/device_farm.py --clients 1000 --concurrency 100
+
+Reports connect and attach p50/p99, keystroke echo p50/p99, bulk output
+throughput and the service's resident memory per session.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from simulator import PROFILES
+
+# What a browser asks each vendor for when the user clicks "show run"
+CONFIG_COMMANDS = {
+    "cisco": "show running-config",
+    "juniper": "show configuration",
+    "huawei": "display current-configuration",
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_kb(pid):
+    """Resident set size of a local process, None where /proc isn't available"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def raise_file_limit():
+    # Each session is a few sockets on both sides; thousands need more than the usual 1024
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def wait_until(check, timeout, what, process=None, log=None):
+    """Poll ``check`` until it passes; give up at once if ``process`` exits first, and stop it on timeout"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            hint = f"; see {log}" if log else ""
+            raise RuntimeError(f"{what} exited with status {process.returncode} before it started{hint}")
+        try:
+            if check():
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    if process is not None:
+        process.terminate()
+        process.wait()
+    raise RuntimeError(f"{what} did not start within {timeout}s")
+
+
+def start_simulator(args):
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "simulator.py"), "--port", str(port),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--config-lines", str(args.config_lines)
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_until(lambda: socket.create_connection(("127.0.0.1", port), timeout=1).close() is None,
+               30, "Device simulator", process)
+    return process, port
+
+
+def start_service(args):
+    """The service under test, with limits opened up for the load and nothing written to disk"""
+    port = free_port()
+    env = dict(os.environ)
+    env.setdefault("SSH_MAX_SESSIONS", str(args.clients * 2))
+    env.setdefault("SSH_MAX_CONNECTS_PER_HOST", str(args.concurrency))
+    env.setdefault("SSH_CONNECT_WORKERS", str(args.concurrency))
+    env.setdefault("TRANSCRIPTS_ENABLED", "false")
+    env.setdefault("AUDIT_LOGS_ENABLED", "false")
+    log = open(args.service_log, "ab")
+    process = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+        "--log-level", "warning"
+    ], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    url = f"http://127.0.0.1:{port}"
+    wait_until(lambda: urllib.request.urlopen(f"{url}/health", timeout=1).status == 200, 60, "Service",
+               process, args.service_log)
+    return process, url
+
+
+def post_json(url, body=None):
+    request = urllib.request.Request(
+        url, data=json.dumps(body or {}).encode(), headers={"Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+class Browser:
+    """One simulated browser tab: connect, attach, type and read output"""
+
+    def __init__(self, index, args, url, device_port):
+        self.vendor = args.vendors[index % len(args.vendors)]
+        # Each device is its own SSH connection, as when browsers open different routers
+        self.username = f"{self.vendor}-{index % args.devices}"
+        self.args = args
+        self.url = url
+        self.device_port = device_port
+        self.session_id = None
+        self.websocket = None
+        self.prompt = None
+        self.received = b""
+        self.connect_ms = None
+        self.attach_ms = None
+        self.echo_ms = []
+        self.bulk = None
+
+    async def connect(self):
+        started = time.perf_counter()
+        reply = await asyncio.to_thread(post_json, f"{self.url}/api/connect", {
+            "host": "127.0.0.1", "port": self.device_port, "username": self.username,
+            "password": "bench", "vendor": self.vendor
+        })
+        self.session_id = reply["session_id"]
+        self.connect_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        ws_url = self.url.replace("http", "ws", 1) + f"/ws/{self.session_id}?framing=binary&pager=server"
+        self.websocket = await websockets.connect(ws_url, max_size=None, ping_interval=None)
+        # The banner ends in the prompt; remember it to know when later output is complete
+        await self.read_until(lambda: self.received.rstrip().endswith((b"#", b">")))
+        self.prompt = self.received.rsplit(b"\n", 1)[-1]
+        self.attach_ms = (time.perf_counter() - started) * 1000
+
+    async def read_until(self, done):
+        while not done():
+            frame = await asyncio.wait_for(self.websocket.recv(), self.args.timeout)
+            if isinstance(frame, bytes):
+                self.received += frame
+                # Only the tail matters for spotting the prompt
+                self.received = self.received[-4096:]
+
+    async def send(self, command):
+        await self.websocket.send(json.dumps({"type": "command", "command": command}))
+
+    async def echo(self):
+        """Keystroke to first output byte: an empty line answered with a fresh prompt"""
+        for _ in range(self.args.echo_samples):
+            self.received = b""
+            started = time.perf_counter()
+            await self.send("\n")
+            await self.read_until(lambda: self.received)
+            self.echo_ms.append((time.perf_counter() - started) * 1000)
+            await self.read_until(lambda: self.received.endswith(self.prompt))
+            await asyncio.sleep(self.args.think_ms / 1000)
+
+    async def bulk_output(self):
+        """Bytes of a paged configuration dump and how long it took to arrive"""
+        self.received = b""
+        total = 0
+        started = time.perf_counter()
+        await self.send(CONFIG_COMMANDS[self.vendor] + "\n")
+        while not (total > len(self.prompt) and self.received.endswith(self.prompt)):
+            frame = await asyncio.wait_for(self.websocket.recv(), self.args.timeout)
+            if isinstance(frame, bytes):
+                total += len(frame)
+                self.received = (self.received + frame)[-4096:]
+        self.bulk = (total, time.perf_counter() - started)
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+        if self.session_id is not None:
+            await asyncio.to_thread(post_json, f"{self.url}/api/disconnect/{self.session_id}")
+
+
+def percentiles(values):
+    if not values:
+        return None, None
+    values = sorted(values)
+    return round(statistics.median(values), 2), round(values[max(int(len(values) * 0.99) - 1, 0)], 2)
+
+
+async def run_phase(browsers, step, concurrency):
+    """Run ``step`` for every browser, ``concurrency`` at a time; the browsers that failed"""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(browser):
+        async with slots:
+            try:
+                await step(browser)
+                return None
+            except Exception as e:
+                return browser, e
+
+    results = await asyncio.gather(*(one(browser) for browser in browsers))
+    return [result for result in results if result is not None]
+
+
+async def run(args, url, device_port, service_pid):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(args.concurrency))
+    rss_idle = rss_kb(service_pid) if service_pid else None
+    browsers = [Browser(i, args, url, device_port) for i in range(args.clients)]
+
+    started = time.perf_counter()
+    failed = await run_phase(browsers, Browser.connect, args.concurrency)
+    connect_seconds = time.perf_counter() - started
+    for browser, error in failed:
+        browsers.remove(browser)
+    if failed:
+        print(f"{len(failed)} clients failed to connect, e.g. {failed[0][1]!r}")
+    # Every session open and attached at once
+    await asyncio.sleep(1)
+    rss_loaded = rss_kb(service_pid) if service_pid else None
+
+    # All browsers typing at once, with every other session open
+    failed += await run_phase(browsers, Browser.echo, len(browsers) or 1)
+
+    bulk_browsers = browsers[:args.bulk_clients]
+    started = time.perf_counter()
+    failed += await run_phase(bulk_browsers, Browser.bulk_output, len(bulk_browsers) or 1)
+    bulk_seconds = time.perf_counter() - started
+    bulk = [browser.bulk for browser in bulk_browsers if browser.bulk]
+
+    await run_phase(browsers, Browser.close, args.concurrency)
+
+    connect_p50, connect_p99 = percentiles([browser.connect_ms for browser in browsers if browser.connect_ms])
+    attach_p50, attach_p99 = percentiles([browser.attach_ms for browser in browsers if browser.attach_ms])
+    echo_p50, echo_p99 = percentiles([ms for browser in browsers for ms in browser.echo_ms])
+    total_bytes = sum(size for size, _ in bulk)
+    return {
+        "clients": args.clients,
+        "sessions": len(browsers),
+        "failed": len(failed),
+        "connect_rate_per_s": round(len(browsers) / connect_seconds, 1) if connect_seconds else None,
+        "connect_p50_ms": connect_p50,
+        "connect_p99_ms": connect_p99,
+        "attach_p50_ms": attach_p50,
+        "attach_p99_ms": attach_p99,
+        "echo_p50_ms": echo_p50,
+        "echo_p99_ms": echo_p99,
+        "bulk_sessions": len(bulk),
+        "bulk_throughput_mb_s": round(total_bytes / bulk_seconds / 1e6, 2) if bulk_seconds else None,
+        "bulk_per_session_mb_s": round(statistics.median(size / seconds for size, seconds in bulk) / 1e6, 2)
+        if bulk else None,
+        "rss_idle_mb": round(rss_idle / 1024, 1) if rss_idle else None,
+        "rss_loaded_mb": round(rss_loaded / 1024, 1) if rss_loaded else None,
+        "rss_per_session_kb": round((rss_loaded - rss_idle) / len(browsers), 1)
+        if rss_idle and rss_loaded and browsers else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=200, help="simulated browsers, one session each")
+    parser.add_argument("--concurrency", type=int, default=50, help="connects in flight at once")
+    parser.add_argument("--devices", type=int, default=None, help="distinct devices (default: one per client)")
+    parser.add_argument("--vendors", default="cisco,juniper,huawei", help="comma-separated, assigned round robin")
+    parser.add_argument("--echo-samples", type=int, default=5, help="keystrokes timed per client")
+    parser.add_argument("--think-ms", type=float, default=100.0, help="pause between keystrokes")
+    parser.add_argument("--bulk-clients", type=int, default=50, help="clients that dump their configuration")
+    parser.add_argument("--config-lines", type=int, default=2000, help="length of each device's configuration")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="device delay before every command answer")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random extra device delay")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for any one reply")
+    parser.add_argument("--url", help="use a running service instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="pid of the --url service, for memory figures")
+    parser.add_argument("--service-log", default=os.devnull, help="file for the started service's log")
+    parser.add_argument("--device-port", type=int, help="use a running simulator on this port")
+    args = parser.parse_args()
+    args.vendors = [vendor.strip() for vendor in args.vendors.split(",") if vendor.strip()]
+    unknown = [vendor for vendor in args.vendors if vendor not in PROFILES]
+    if unknown:
+        parser.error(f"unknown vendors {', '.join(unknown)}; use {', '.join(PROFILES)}")
+    args.devices = args.devices or args.clients
+
+    raise_file_limit()
+    processes = []
+    try:
+        device_port = args.device_port
+        if device_port is None:
+            simulator, device_port = start_simulator(args)
+            processes.append(simulator)
+        if args.url:
+            url, service_pid = args.url.rstrip("/"), args.server_pid
+        else:
+            service, url = start_service(args)
+            processes.append(service)
+            service_pid = service.pid
+        print(f"{args.clients} clients against {url}, devices on port {device_port}")
+        print(asyncio.run(run(args, url, device_port, service_pid)))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Echo latency and idle CPU benchmark for the shell output pump
+
+Compares ShellPump against the previous recv_ready()/sleep(0.1) polling loop
+using an in-process paramiko server, so no device is needed:
+
+    python benchmarks/shell_pump.py --sessions 500 --idle-seconds 5
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import paramiko
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shell_pump import ShellPump
+
+SERVER_KEY = paramiko.RSAKey.generate(2048)
+
+
+class EchoServer(paramiko.ServerInterface):
+    """Accepts any password and echoes every shell channel"""
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        threading.Thread(target=self._echo, args=(channel,), daemon=True).start()
+        return True
+
+    @staticmethod
+    def _echo(channel):
+        while True:
+            data = channel.recv(1024)
+            if not data:
+                return
+            channel.sendall(data)
+
+
+def accept_forever(server):
+    # Keep accepted channels referenced; paramiko closes collected channels
+    channels = []
+    while server.is_active():
+        channel = server.accept(1)
+        if channel is not None:
+            channels.append(channel)
+
+
+def open_transports(count):
+    """Client/server transport pairs over local socket pairs"""
+    transports = []
+    for _ in range(count):
+        client_sock, server_sock = socket.socketpair()
+        server = paramiko.Transport(server_sock)
+        server.add_server_key(SERVER_KEY)
+        server.start_server(event=threading.Event(), server=EchoServer())
+        client = paramiko.Transport(client_sock)
+        client.connect(username="bench", password="bench")
+        threading.Thread(target=accept_forever, args=(server,), daemon=True).start()
+        transports.append(client)
+    return transports
+
+
+def open_shells(transports, sessions):
+    shells = []
+    for i in range(sessions):
+        channel = transports[i % len(transports)].open_session()
+        channel.get_pty()
+        channel.invoke_shell()
+        shells.append(channel)
+    return shells
+
+
+async def polling_reader(shell, received):
+    """The pre-pump read loop from websocket_endpoint"""
+    while True:
+        if shell.recv_ready():
+            received.put_nowait(shell.recv(4096))
+        await asyncio.sleep(0.1)
+
+
+async def pump_reader(pump, received):
+    while True:
+        data = await pump.read()
+        if not data:
+            return
+        received.put_nowait(data)
+
+
+async def run(mode, shells, samples, idle_seconds):
+    queues = [asyncio.Queue() for _ in shells]
+    pumps = []
+    tasks = []
+    for shell, received in zip(shells, queues):
+        if mode == "pump":
+            pump = ShellPump(shell)
+            pump.start()
+            pumps.append(pump)
+            tasks.append(asyncio.create_task(pump_reader(pump, received)))
+        else:
+            tasks.append(asyncio.create_task(polling_reader(shell, received)))
+
+    # Idle CPU of the event loop thread with every session attached
+    await asyncio.sleep(0.5)
+    cpu_start = time.thread_time()
+    wall_start = time.perf_counter()
+    await asyncio.sleep(idle_seconds)
+    idle_cpu = (time.thread_time() - cpu_start) / (time.perf_counter() - wall_start) * 100
+
+    # Keystroke to echo round trips on the first session
+    latencies = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        shells[0].send(b"x")
+        await queues[0].get()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+
+    for task in tasks:
+        task.cancel()
+    for pump in pumps:
+        pump.stop()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "idle_loop_cpu_pct": round(idle_cpu, 2),
+        "echo_p50_ms": round(statistics.median(latencies), 2),
+        "echo_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--transports", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    transports = open_transports(args.transports)
+    shells = open_shells(transports, args.sessions)
+    print(f"{args.sessions} sessions over {args.transports} transports")
+    for mode in ("polling", "pump"):
+        print(asyncio.run(run(mode, shells, args.samples, args.idle_seconds)))
+    for transport in transports:
+        transport.close()
+
+
+if __name__ == "__main__":
+    main()
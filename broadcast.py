@@ -0,0 +1,400 @@
+"""
+Session broadcast for Monetx NCM SSH Emulator
+One reader per session encodes each output chunk once and fans it out to every attached WebSocket
+"""
+
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from fastapi import WebSocket
+
+import metrics
+from pager import PagerEngine
+from scrollback import ScrollbackBuffer
+from screen import SessionScreen
+from shell_pump import ShellPump, output_decoder
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("read-write", "read-only")
+# What a subscriber is sent: the output stream, or the session's screen and its changes
+VIEWS = ("stream", "screen")
+
+
+class OutputFrame:
+    """One coalesced chunk of output, with its JSON message built once for every subscriber
+
+    ``start`` and ``end`` are stream offsets; they differ from the data
+    length when the chunk carries a truncation marker. ``screen`` is the
+    screen diff message for screen viewers, when any are attached.
+    """
+
+    __slots__ = ("data", "start", "end", "text", "eof", "screen")
+
+    def __init__(self, data: bytes, start: int, end: int, text: Optional[str] = None, eof: bool = False,
+                 screen: Optional[str] = None):
+        self.data = data
+        self.start = start
+        self.end = end
+        self.text = text
+        self.eof = eof
+        self.screen = screen
+
+
+def output_message(text: str, offset: int) -> str:
+    return json.dumps({"type": "output", "data": text, "offset": offset})
+
+
+class Subscriber:
+    """One WebSocket watching a session, with its own bounded frame queue
+
+    A subscriber that may ``pause`` holds the session's reader back when its
+    queue is full, which in turn pauses the shell pump; everyone else drops
+    frames that don't fit and gets one truncation marker instead, so a slow
+    viewer never slows down the engineer driving the session. A screen
+    viewer gets a fresh snapshot in place of a truncation marker.
+    """
+
+    def __init__(self, websocket: WebSocket, role: str, binary: bool, max_bytes: Optional[int], pauses: bool,
+                 screen: Optional[SessionScreen] = None):
+        self.websocket = websocket
+        self.role = role
+        self.binary = binary
+        self.screen = screen
+        self.max_bytes = max_bytes
+        self.pauses = pauses
+        self.frames: deque = deque()
+        self.queued_bytes = 0
+        self.ready = asyncio.Event()
+        self.room = asyncio.Event()
+        self.room.set()
+        self.closed = False
+        # Whether this client asked the server to answer pager prompts
+        self.pager = False
+        # Sent before any frame: the attach message and scrollback being replayed
+        self.attach: Dict[str, Any] = {}
+        self.replay = b""
+        self.snapshot: Optional[str] = None
+        self.dropping = 0
+        self.dropped_until = 0
+        self.stats = {"high_water": 0, "dropped_bytes": 0, "truncations": 0, "frames": 0}
+        self.task: Optional[asyncio.Task] = None
+
+    def full(self) -> bool:
+        return self.max_bytes is not None and self.queued_bytes >= self.max_bytes
+
+    def offer(self, frame: OutputFrame):
+        """Queue a frame, or count it into the truncation marker when it doesn't fit"""
+        if self.closed:
+            return
+        size = len(frame.data)
+        # An empty queue takes any frame, so chunks bigger than the limit still get through;
+        # empty ones (end of output, screen snapshots) always do
+        if size and not self.pauses and self.max_bytes is not None \
+                and self.queued_bytes and self.queued_bytes + size > self.max_bytes:
+            if not self.dropping:
+                metrics.OUTPUT_BACKPRESSURE.inc(action="truncate")
+            self.dropping += size
+            self.dropped_until = frame.end
+            self.stats["dropped_bytes"] += size
+            metrics.OUTPUT_DROPPED_BYTES.inc(size)
+            return
+        if self.dropping:
+            # The marker goes where the gap is, ahead of the first frame that fits
+            self._truncate()
+        self._push(frame)
+        if self.full():
+            self.room.clear()
+        self.ready.set()
+
+    def _push(self, frame: OutputFrame):
+        self.frames.append(frame)
+        self.queued_bytes += len(frame.data)
+        if self.queued_bytes > self.stats["high_water"]:
+            self.stats["high_water"] = self.queued_bytes
+
+    def _truncate(self):
+        """Queue one marker for everything dropped since the last frame that fit"""
+        if self.screen is not None:
+            # Diffs were lost, so the whole screen goes out again
+            self.dropping = 0
+            self.stats["truncations"] += 1
+            self._push(OutputFrame(b"", self.dropped_until, self.dropped_until,
+                                   screen=self.screen.snapshot_message()))
+            return
+        marker = f"\r\n[output truncated: {self.dropping} bytes dropped]\r\n"
+        self.dropping = 0
+        self.stats["truncations"] += 1
+        self._push(OutputFrame(marker.encode(), self.dropped_until, self.dropped_until,
+                               text=output_message(marker, self.dropped_until)))
+
+    async def _send(self, frame: OutputFrame):
+        if self.screen is not None:
+            if frame.screen:
+                await self.websocket.send_text(frame.screen)
+        elif self.binary:
+            if frame.data:
+                await self.websocket.send_bytes(frame.data)
+            # A truncation marker isn't device output, so binary byte counts drift past one
+            if frame.end != frame.start + len(frame.data):
+                await self.websocket.send_text(json.dumps({"type": "offset", "offset": frame.end}))
+        elif frame.text:
+            await self.websocket.send_text(frame.text)
+        metrics.OUTPUT_FRAMES.inc(stage="sent")
+
+    async def _send_replay(self, chunk_bytes: int):
+        decoder = output_decoder()
+        offset = self.attach["offset"]
+        for start in range(0, len(self.replay), chunk_bytes):
+            chunk = self.replay[start:start + chunk_bytes]
+            text = None
+            if not self.binary:
+                decoded = decoder.decode(chunk)
+                text = output_message(decoded, offset + start + len(chunk)) if decoded else None
+            await self._send(OutputFrame(chunk, offset + start, offset + start + len(chunk), text))
+        self.replay = b""
+
+    async def run(self, chunk_bytes: int):
+        """Send the attach message, any replay, then frames as the session reader queues them"""
+        try:
+            await self.websocket.send_text(json.dumps({"type": "attached", **self.attach}))
+            if self.snapshot is not None:
+                await self.websocket.send_text(self.snapshot)
+                self.snapshot = None
+            await self._send_replay(chunk_bytes)
+            while True:
+                if not self.frames:
+                    if self.dropping:
+                        self._truncate()
+                    else:
+                        self.ready.clear()
+                        await self.ready.wait()
+                        continue
+                frame = self.frames.popleft()
+                self.queued_bytes -= len(frame.data)
+                if self.max_bytes is None or self.queued_bytes <= self.max_bytes // 2:
+                    self.room.set()
+                if frame.eof:
+                    if self.screen is not None:
+                        await self._send(frame)
+                    elif frame.text and not self.binary:
+                        await self.websocket.send_text(frame.text)
+                    await self.websocket.send_text(json.dumps({
+                        "type": "error",
+                        "message": "Session closed by remote host"
+                    }))
+                    return
+                await self._send(frame)
+                self.stats["frames"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"Subscriber stopped sending: {str(e)}")
+        finally:
+            self.closed = True
+            # Never leave the session reader waiting on a subscriber that's gone
+            self.room.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "role": self.role,
+            "framing": "binary" if self.binary else "json",
+            "view": "screen" if self.screen is not None else "stream",
+            "queued_bytes": self.queued_bytes,
+            "max_bytes": self.max_bytes,
+            "pauses_session": self.pauses,
+            **self.stats
+        }
+
+
+class SessionHub:
+    """Fans one session's output out to every WebSocket attached to it
+
+    The hub is the shell pump's only queue reader while anyone is attached.
+    Each chunk is decoded and turned into a JSON message once, whatever the
+    number of subscribers, so twenty viewers cost about what one does.
+    Under the ``pause`` policy read-write subscribers hold the session back
+    when they fall behind; read-only ones always drop. Screen viewers
+    share one diff per frame in the same way. The session's pager answers
+    prompts while any read-write subscriber asks it to.
+    """
+
+    def __init__(self, pump: ShellPump, scrollback: Optional[ScrollbackBuffer] = None,
+                 max_bytes: Optional[int] = None, policy: str = "pause",
+                 chunk_bytes: int = 65536, window: float = 0.005, screen: Optional[SessionScreen] = None,
+                 pager: Optional[PagerEngine] = None):
+        self.pump = pump
+        self.pager = pager
+        self.scrollback = scrollback
+        self.screen = screen
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.chunk_bytes = chunk_bytes
+        self.window = window
+        self.subscribers: List[Subscriber] = []
+        self.reader: Optional[asyncio.Task] = None
+        self.decoder = output_decoder()
+        # Whether the decoder has seen every byte up to self.position
+        self.decoding = False
+        # Whether anyone has attached yet; the first stream viewer also gets the output before it
+        self.attached_once = False
+        # Stream offset just past the last frame handed to subscribers
+        self.position = pump.read_offset
+
+    def subscribe(self, websocket: WebSocket, role: str = "read-write", binary: bool = False,
+                  resume: Optional[int] = None, view: str = "stream", server_pager: bool = False) -> Subscriber:
+        """Attach a WebSocket; with ``resume``, it first gets what it missed from scrollback
+
+        The session's first stream subscriber is replayed everything still
+        in scrollback, since the banner and first prompt arrive before any
+        browser connects. A ``screen`` view starts from a snapshot of the
+        screen instead, and needs the hub to have a screen model.
+        ``server_pager`` asks the server to answer pager prompts; the attach
+        message says whether it will.
+        """
+        screen = self.screen if view == "screen" else None
+        if view == "screen" and screen is None:
+            raise ValueError("This session has no screen model")
+        if screen is not None:
+            resume = None
+        replay_from = resume
+        if replay_from is None and screen is None and not self.attached_once and self.scrollback is not None:
+            replay_from = self.scrollback.start
+        self.attached_once = True
+        subscriber = Subscriber(
+            websocket, role, binary, self.max_bytes,
+            pauses=self.policy == "pause" and role == "read-write",
+            screen=screen
+        )
+        reading = self.reader is not None and not self.reader.done()
+        if not reading:
+            # Nobody is reading the pump, so its queue starts where the last reader stopped
+            self.position = self.pump.read_offset
+            self.decoding = False
+        offset, lost = self.position, 0
+        if replay_from is not None and self.scrollback is not None:
+            if not reading:
+                # What queued up while detached is in scrollback too, from an offset the client can name
+                self.pump.discard()
+                self.position = self.pump.read_offset
+            # Synchronous with joining, so replay and live frames meet at self.position
+            subscriber.replay, offset = self.scrollback.read(replay_from, self.position)
+            offset = min(offset, self.position)
+            lost = max(0, offset - replay_from)
+        self.subscribers.append(subscriber)
+        server_pager = self.set_pager(subscriber, server_pager)
+        subscriber.attach = {
+            "offset": offset,
+            "resumed": resume is not None and self.scrollback is not None,
+            "replayed": len(subscriber.replay),
+            "lost": lost,
+            "role": role,
+            "view": view,
+            "server_pager": server_pager
+        }
+        if screen is not None:
+            subscriber.snapshot = screen.snapshot_message()
+        subscriber.task = asyncio.create_task(subscriber.run(self.chunk_bytes))
+        if not reading:
+            self.pump.set_queueing(True)
+            self.pump.set_limit(self.max_bytes, self.policy)
+            self.reader = asyncio.create_task(self._read())
+        return subscriber
+
+    def set_pager(self, subscriber: Subscriber, enabled: bool) -> bool:
+        """Record whether a subscriber wants the server to answer pager prompts; True if the server now does"""
+        subscriber.pager = enabled and subscriber.role == "read-write"
+        return self._update_pager()
+
+    def _update_pager(self) -> bool:
+        if self.pager is None:
+            return False
+        self.pager.set_enabled(any(subscriber.pager for subscriber in self.subscribers))
+        return self.pager.enabled
+
+    async def unsubscribe(self, subscriber: Subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+            self._update_pager()
+        subscriber.closed = True
+        subscriber.room.set()
+        if subscriber.task is not None:
+            subscriber.task.cancel()
+        if not self.subscribers and self.reader is not None:
+            self.reader.cancel()
+            self.reader = None
+            # Nothing drains the queue until someone attaches again; scrollback keeps the output meanwhile
+            self.pump.set_queueing(False)
+
+    def _prime_decoder(self, offset: int):
+        """Restart decoding at ``offset``, carrying in a character that output before it left unfinished"""
+        self.decoder = output_decoder()
+        if self.scrollback is not None:
+            # A UTF-8 character is at most 4 bytes, so only the last 3 can be waiting for the rest
+            tail, _ = self.scrollback.read(max(0, offset - 3), offset)
+            self.decoder.decode(tail)
+
+    async def _read(self):
+        while True:
+            metrics.OUTPUT_QUEUE_DEPTH.observe(self.pump.queue.qsize())
+            try:
+                data = await self.pump.read_batch(max_bytes=self.chunk_bytes, window=self.window)
+            except Exception as e:
+                logger.error(f"Shell read error: {str(e)}")
+                data = b""
+            start, self.position = self.position, self.pump.read_offset
+            wants_text = any(not subscriber.binary and subscriber.screen is None for subscriber in self.subscribers)
+            wants_screen = any(subscriber.screen is not None for subscriber in self.subscribers)
+            if wants_text and not self.decoding:
+                self._prime_decoder(start)
+            self.decoding = wants_text
+            if not data:
+                tail = self.decoder.decode(b"", final=True)
+                frame = OutputFrame(b"", start, self.position, output_message(tail, self.position) if tail else None, eof=True)
+            else:
+                text = None
+                if wants_text:
+                    decoded = self.decoder.decode(data)
+                    text = output_message(decoded, self.position) if decoded else None
+                frame = OutputFrame(data, start, self.position, text)
+            if wants_screen:
+                frame.screen = self.screen.diff_message()
+            metrics.OUTPUT_FRAMES.inc(stage="encoded")
+            for subscriber in list(self.subscribers):
+                if subscriber.pauses and subscriber.full():
+                    await subscriber.room.wait()
+                subscriber.offer(frame)
+            if frame.eof:
+                return
+
+    def resize_screen(self, columns: int, lines: int):
+        """Resize the screen model and send screen viewers a snapshot at the new size"""
+        if self.screen is None:
+            return
+        self.screen.resize(columns, lines)
+        viewers = [subscriber for subscriber in self.subscribers if subscriber.screen is not None]
+        if viewers:
+            frame = OutputFrame(b"", self.position, self.position, screen=self.screen.snapshot_message())
+            for subscriber in viewers:
+                subscriber.offer(frame)
+
+    def close(self):
+        for subscriber in self.subscribers:
+            subscriber.closed = True
+            if subscriber.task is not None:
+                subscriber.task.cancel()
+        self.subscribers.clear()
+        if self.reader is not None:
+            self.reader.cancel()
+            self.reader = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "position": self.position,
+            "policy": self.policy,
+            "screen": self.screen.get_stats() if self.screen is not None else None,
+            "subscribers": [subscriber.get_stats() for subscriber in self.subscribers]
+        }
@@ -0,0 +1,248 @@
+"""
+Tab completion for Monetx NCM SSH Emulator
+Lists directories and commands over a side channel, so completion never types into the user's shell
+"""
+
+import asyncio
+import logging
+import posixpath
+import re
+import shlex
+import stat
+import time
+from typing import Dict, List, Optional, Tuple
+
+import paramiko
+
+import metrics
+from device_detect import PlatformDetector
+from ssh_pool import PooledTransport, TransportPool
+
+logger = logging.getLogger(__name__)
+
+COMPLETION_SECONDS = metrics.REGISTRY.add(metrics.Histogram(
+    "ncm_completion_seconds", "Time to answer a completion request, by where the answer came from",
+    labelnames=("source",)
+))
+
+# Lists every executable name on $PATH in one round trip
+PATH_COMMANDS = 'IFS=:; for d in $PATH; do ls -1 "$d" 2>/dev/null; done'
+# Anything else in that output is an error message from a non-POSIX CLI
+COMMAND_NAME = re.compile(r"^[\w.+-]+$")
+
+
+class CompletionUnavailable(Exception):
+    """The device offers neither SFTP nor exec channels next to the shell"""
+
+
+class CompletionBusy(Exception):
+    """The transport has no room for another channel right now"""
+
+
+class SessionCompleter:
+    """Directory listings and command names for one session
+
+    Listings come from an SFTP client on the session's transport, or from
+    ``ls`` on an exec channel when the device has no SFTP subsystem, and are
+    cached for ``ttl`` seconds. Command names are read from ``$PATH`` once.
+    Relative paths resolve against the login directory, not the shell's
+    current one, which the side channel cannot see.
+
+    Side channels count against the transport's channels in the pool
+    (``pool`` and ``entry``), so they never take a channel a pooled shell
+    needs. Exec channels run a POSIX shell command, so they are only used
+    once ``detector`` says the device is ``linux``.
+    """
+
+    def __init__(self, transport: paramiko.Transport, ttl: float = 5.0, timeout: float = 2.0,
+                 max_entries: int = 256, pool: Optional[TransportPool] = None,
+                 entry: Optional[PooledTransport] = None, detector: Optional[PlatformDetector] = None):
+        self.transport = transport
+        self.pool = pool
+        self.entry = entry
+        self.detector = detector
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.sftp: Optional[paramiko.SFTPClient] = None
+        self.sftp_failed = False
+        self.sftp_lock = asyncio.Lock()
+        self.unavailable = False
+        self.listings: Dict[str, Tuple[List[str], float]] = {}
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.command_names: Optional[asyncio.Future] = None
+        self.closed = False
+
+    def _exec(self, command: str) -> str:
+        """Blocking: run one command on a fresh exec channel and return its stdout"""
+        try:
+            channel = self.transport.open_session(timeout=self.timeout)
+        except paramiko.ChannelException as e:
+            # e.g. IOS allows one channel per connection, and the shell has it
+            raise CompletionUnavailable(str(e))
+        try:
+            channel.settimeout(self.timeout)
+            channel.exec_command(command)
+            chunks = []
+            while True:
+                chunk = channel.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            return b"".join(chunks).decode("utf-8", errors="replace")
+        finally:
+            channel.close()
+
+    def _open_sftp(self) -> Optional[paramiko.SFTPClient]:
+        """Blocking: an SFTP client on the session's transport, None when the device has no SFTP"""
+        try:
+            sftp = paramiko.SFTPClient.from_transport(self.transport)
+            sftp.get_channel().settimeout(self.timeout)
+            return sftp
+        except Exception as e:
+            logger.info(f"No SFTP for completion: {str(e)}")
+            return None
+
+    async def _counted(self, func, *args, keep=lambda result: False):
+        """Run a blocking call that opens a side channel, with the channel counted in the pool
+
+        The channel stays counted while ``keep(result)`` is true (the SFTP
+        client holds its channel until ``close``).
+        """
+        if self.pool is not None and self.entry is not None and not self.pool.reserve(self.entry):
+            raise CompletionBusy("No channel free on this transport")
+        try:
+            result = await asyncio.to_thread(func, *args)
+        except CompletionUnavailable:
+            self._uncount(refused=True)
+            raise
+        except BaseException:
+            self._uncount()
+            raise
+        if not keep(result):
+            self._uncount()
+        return result
+
+    def _uncount(self, refused: bool = False):
+        if self.pool is None or self.entry is None:
+            return
+        if refused:
+            self.pool.refuse(self.entry)
+        else:
+            self.pool.release(self.entry)
+
+    async def _exec_allowed(self) -> bool:
+        """Exec completion runs shell commands, which only make sense on a Linux host"""
+        if self.detector is None:
+            return True
+        return (await self.detector.wait(self.timeout))["platform"] == "linux"
+
+    async def _sftp_client(self) -> Optional[paramiko.SFTPClient]:
+        async with self.sftp_lock:
+            if self.sftp is None and not self.sftp_failed and not self.closed:
+                self.sftp = await self._counted(self._open_sftp, keep=lambda sftp: sftp is not None)
+                self.sftp_failed = self.sftp is None
+            return self.sftp
+
+    async def _list(self, path: str) -> Tuple[List[str], str]:
+        """Entries of ``path`` with a trailing / on directories, and the channel used"""
+        sftp = await self._sftp_client()
+        if sftp is not None:
+            return await asyncio.to_thread(self._list_sftp, sftp, path), "sftp"
+        if not await self._exec_allowed():
+            raise CompletionUnavailable("No SFTP, and exec completion needs a Linux host")
+        return await self._counted(self._list_exec, path), "exec"
+
+    def _list_sftp(self, sftp: paramiko.SFTPClient, path: str) -> List[str]:
+        """Blocking: one directory listing over SFTP"""
+        if path.startswith("~"):
+            path = sftp.normalize(".") + path[1:]
+        try:
+            entries = sftp.listdir_attr(path)
+        except IOError:
+            return []
+        return sorted(
+            entry.filename + ("/" if entry.st_mode is not None and stat.S_ISDIR(entry.st_mode) else "")
+            for entry in entries
+        )
+
+    def _list_exec(self, path: str) -> List[str]:
+        """Blocking: one directory listing with ls on an exec channel"""
+        # ~ must stay unquoted for the remote shell to expand it
+        if path.startswith("~"):
+            head, _, rest = path.partition("/")
+            target = head + ("/" + shlex.quote(rest) if rest else "")
+        else:
+            target = shlex.quote(path)
+        output = self._exec(f"ls -1Ap -- {target} 2>/dev/null")
+        return [line for line in output.splitlines() if line]
+
+    def _remember(self, path: str, files: List[str]):
+        self.listings[path] = (files, time.monotonic())
+        while len(self.listings) > self.max_entries:
+            self.listings.pop(next(iter(self.listings)))
+
+    async def list_dir(self, path: str = "") -> List[str]:
+        """Names in ``path`` (empty for the login directory); [] when the device can't tell us"""
+        started = time.perf_counter()
+        path = posixpath.normpath(path or ".")
+        cached = self.listings.get(path)
+        if cached is not None and time.monotonic() - cached[1] < self.ttl:
+            COMPLETION_SECONDS.observe(time.perf_counter() - started, source="cache")
+            return cached[0]
+        if self.unavailable or self.closed:
+            return []
+        pending = self.inflight.get(path)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[path] = future
+        try:
+            files, source = await self._list(path)
+        except CompletionUnavailable as e:
+            logger.info(f"Completion unavailable on this device: {str(e)}")
+            self.unavailable = True
+            files, source = [], "unavailable"
+        except CompletionBusy:
+            files, source = [], "busy"
+        except Exception as e:
+            logger.error(f"Completion listing of {path!r} failed: {str(e)}")
+            files, source = [], "error"
+        except BaseException:
+            future.set_result([])
+            raise
+        finally:
+            del self.inflight[path]
+        if source in ("sftp", "exec"):
+            self._remember(path, files)
+        future.set_result(files)
+        COMPLETION_SECONDS.observe(time.perf_counter() - started, source=source)
+        return files
+
+    async def _commands(self) -> List[str]:
+        if not await self._exec_allowed():
+            return []
+        try:
+            output = await self._counted(self._exec, PATH_COMMANDS)
+        except Exception as e:
+            logger.info(f"Could not list commands on $PATH: {str(e)}")
+            return []
+        return sorted({line.strip() for line in output.splitlines() if COMMAND_NAME.match(line.strip())})
+
+    async def commands(self) -> List[str]:
+        """Executable names on a Linux device's $PATH, read once per session; [] on network gear"""
+        if self.command_names is None:
+            self.command_names = asyncio.ensure_future(self._commands())
+        return await asyncio.shield(self.command_names)
+
+    def close(self):
+        """Close the SFTP channel; the transport itself belongs to the pool"""
+        self.closed = True
+        self.listings.clear()
+        if self.sftp is not None:
+            try:
+                self.sftp.close()
+            except Exception as e:
+                logger.error(f"Error closing completion SFTP client: {str(e)}")
+            self.sftp = None
+            self._uncount()
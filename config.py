@@ -31,16 +31,71 @@ class Settings:
     SSH_TIMEOUT: int = int(os.getenv("SSH_TIMEOUT", "10"))
     SSH_MAX_SESSIONS: int = int(os.getenv("SSH_MAX_SESSIONS", "100"))
     SSH_SESSION_TIMEOUT: int = int(os.getenv("SSH_SESSION_TIMEOUT", "3600"))  # 1 hour
+    SSH_ORPHAN_TIMEOUT: int = int(os.getenv("SSH_ORPHAN_TIMEOUT", "300"))  # no browser attached
+    SSH_MAX_SESSIONS_PER_USER: int = int(os.getenv("SSH_MAX_SESSIONS_PER_USER", "5"))
+    SESSION_REAP_INTERVAL: int = int(os.getenv("SESSION_REAP_INTERVAL", "15"))
+    SESSION_IDLE_AFTER: int = int(os.getenv("SESSION_IDLE_AFTER", "60"))  # reported idle, not closed
+    SSH_CONNECT_WORKERS: int = int(os.getenv("SSH_CONNECT_WORKERS", "32"))
+    SSH_MAX_CONNECTS_PER_HOST: int = int(os.getenv("SSH_MAX_CONNECTS_PER_HOST", "4"))
+    SSH_POOL_SIZE: int = int(os.getenv("SSH_POOL_SIZE", "256"))
+    SSH_POOL_IDLE_TTL: int = int(os.getenv("SSH_POOL_IDLE_TTL", "300"))  # 5 minutes
+    
+    # Terminal output framing
+    OUTPUT_COALESCE_MS: int = int(os.getenv("OUTPUT_COALESCE_MS", "5"))
+    OUTPUT_COALESCE_BYTES: int = int(os.getenv("OUTPUT_COALESCE_BYTES", "65536"))
+    # Output waiting for a slow browser: "pause" stops reading the device
+    # (SSH flow control), "drop" discards it behind a truncation marker;
+    # read-only viewers of a shared session always drop
+    OUTPUT_QUEUE_MAX_BYTES: int = int(os.getenv("OUTPUT_QUEUE_MAX_BYTES", "1048576"))
+    OUTPUT_QUEUE_POLICY: str = os.getenv("OUTPUT_QUEUE_POLICY", "pause")
+    # Output kept in memory per session for reconnecting browsers
+    SCROLLBACK_BYTES: int = int(os.getenv("SCROLLBACK_BYTES", "262144"))
+    # Server-side VT100 screen per session (needs pyte and scrollback) for ?view=screen
+    SCREEN_MODEL_ENABLED: bool = os.getenv("SCREEN_MODEL_ENABLED", "true").lower() == "true"
+    
+    # Pager handling: "auto" answers --More-- on the server, "disable" sends
+    # the vendor's terminal-length command at login, "off" leaves it to the client
+    PAGER_MODE: str = os.getenv("PAGER_MODE", "auto").lower()
+    
+    # Server-side batch execution
+    BATCH_COMMAND_TIMEOUT: int = int(os.getenv("BATCH_COMMAND_TIMEOUT", "30"))
+    BATCH_MAX_COMMAND_TIMEOUT: int = int(os.getenv("BATCH_MAX_COMMAND_TIMEOUT", "600"))  # cap on a request's timeout
+    BATCH_MAX_COMMANDS: int = int(os.getenv("BATCH_MAX_COMMANDS", "1000"))
+    FANOUT_CONCURRENCY: int = int(os.getenv("FANOUT_CONCURRENCY", "20"))
+    FANOUT_MAX_DEVICES: int = int(os.getenv("FANOUT_MAX_DEVICES", "1000"))
+    
+    # Multi-worker deployment: "memory" for one worker, or
+    # "sqlite:///./sessions.db" to share sessions between workers on one host
+    SESSION_REGISTRY_URL: str = os.getenv("SESSION_REGISTRY_URL", "memory")
+    WORKER_ID: str = os.getenv("WORKER_ID", "")  # defaults to hostname-pid
+    WORKER_URL: str = os.getenv("WORKER_URL", "")  # where other workers reach this one, e.g. http://127.0.0.1:8002
     
     # NMS Integration settings
     NMS_INTEGRATION_ENABLED: bool = os.getenv("NMS_INTEGRATION_ENABLED", "true").lower() == "true"
     NMS_BASE_URL: str = os.getenv("NMS_BASE_URL", "https://your-nms-domain.com")
     NMS_AUTH_ENDPOINT: str = os.getenv("NMS_AUTH_ENDPOINT", "/api/auth")
     NMS_API_KEY: str = os.getenv("NMS_API_KEY", "your-nms-api-key")
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+    NMS_TOKEN_CACHE_TTL: int = int(os.getenv("NMS_TOKEN_CACHE_TTL", "60"))  # seconds a verified NMS token is trusted
+    INVENTORY_SOURCE: str = os.getenv("INVENTORY_SOURCE", "demo")  # demo, json:///path, csv:///path or sqlite:///path
+    DEVICE_CACHE_TTL: int = int(os.getenv("DEVICE_CACHE_TTL", "300"))
+    DEVICE_CACHE_STALE_SECONDS: int = int(os.getenv("DEVICE_CACHE_STALE_SECONDS", "3600"))  # served while refreshing
+    DEVICE_CACHE_SIZE: int = int(os.getenv("DEVICE_CACHE_SIZE", "50000"))
     
     # Database settings (for audit logs)
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./audit.db")
     AUDIT_LOGS_ENABLED: bool = os.getenv("AUDIT_LOGS_ENABLED", "true").lower() == "true"
+    AUDIT_QUEUE_SIZE: int = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))  # events dropped beyond this
+    AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    
+    # Session transcripts (compressed, seekable recordings of all output)
+    TRANSCRIPTS_ENABLED: bool = os.getenv("TRANSCRIPTS_ENABLED", "true").lower() == "true"
+    TRANSCRIPT_DIR: str = os.getenv("TRANSCRIPT_DIR", "./transcripts")
+    TRANSCRIPT_BLOCK_BYTES: int = int(os.getenv("TRANSCRIPT_BLOCK_BYTES", "65536"))
+    TRANSCRIPT_FLUSH_SECONDS: int = int(os.getenv("TRANSCRIPT_FLUSH_SECONDS", "2"))
+    
+    # Tab completion
+    COMPLETION_CACHE_TTL: int = int(os.getenv("COMPLETION_CACHE_TTL", "5"))  # seconds a directory listing is reused
     
     # File upload settings
     MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", "10485760"))  # 10MB
@@ -63,7 +118,14 @@ class Settings:
             "allowed_origins": cls.CORS_ORIGINS,
             "audit_log_enabled": cls.AUDIT_LOGS_ENABLED,
             "session_timeout": cls.SSH_SESSION_TIMEOUT,
-            "max_sessions_per_user": 5
+            "max_sessions_per_user": cls.SSH_MAX_SESSIONS_PER_USER,
+            "api_key": cls.NMS_API_KEY,
+            "token_cache_size": cls.TOKEN_CACHE_SIZE,
+            "nms_token_cache_ttl": cls.NMS_TOKEN_CACHE_TTL,
+            "inventory_source": cls.INVENTORY_SOURCE,
+            "device_cache_ttl": cls.DEVICE_CACHE_TTL,
+            "device_cache_stale_ttl": cls.DEVICE_CACHE_STALE_SECONDS,
+            "device_cache_size": cls.DEVICE_CACHE_SIZE
         }
 
 # Development settings
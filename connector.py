@@ -0,0 +1,259 @@
+"""
+SSH connection setup for Monetx NCM SSH Emulator
+Runs the blocking paramiko handshake on a bounded thread pool so the event loop stays free,
+and reuses authenticated transports from the pool when it can
+"""
+
+import asyncio
+import logging
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Set, Tuple
+
+import paramiko
+
+import metrics
+from ssh_pool import PoolKey, PooledTransport, TransportPool
+
+logger = logging.getLogger(__name__)
+
+
+class HandshakeAbandoned(Exception):
+    """The client that started a shared handshake went away before it finished"""
+
+
+class SSHConnector:
+    """Bounded SSH connection setup with per-host concurrency limits and transport reuse"""
+
+    def __init__(self, max_workers: int = 32, per_host_limit: int = 4, timeout: int = 10,
+                 pool_size: int = 256, pool_idle_ttl: float = 300.0):
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ssh-connect")
+        self.pool = TransportPool(max_size=pool_size, idle_ttl=pool_idle_ttl)
+        self.host_slots: Dict[str, asyncio.Semaphore] = {}
+        self.host_stats: Dict[str, Dict[str, int]] = {}
+        self.inflight: Dict[PoolKey, asyncio.Future] = {}
+        # Credentials whose device allows only one channel per connection
+        self.single_channel: Set[PoolKey] = set()
+        self.leases: Dict[int, PooledTransport] = {}
+        self.maintenance_task: Optional[asyncio.Task] = None
+        self.stats = {
+            "queued": 0,
+            "connecting": 0,
+            "connected": 0,
+            "failed": 0,
+            "max_queue_depth": 0
+        }
+
+    def _connect(self, hostname: str, port: int, username: str, password: str,
+                 phases: Dict[str, float]) -> paramiko.Transport:
+        """Blocking TCP connect, key exchange and password auth, runs on the executor
+
+        Fills ``phases`` with the seconds each step took; the caller records
+        them on the event loop.
+        """
+        started = time.perf_counter()
+        sock = socket.create_connection((hostname, port), timeout=self.timeout)
+        # Keystrokes are tiny writes; don't let Nagle hold them back
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        phases["tcp"] = time.perf_counter() - started
+        transport = paramiko.Transport(sock)
+        try:
+            started = time.perf_counter()
+            transport.start_client(timeout=self.timeout)
+            phases["kex"] = time.perf_counter() - started
+            started = time.perf_counter()
+            transport.auth_password(username, password)
+            phases["auth"] = time.perf_counter() - started
+        except Exception:
+            transport.close()
+            raise
+        # Keep pooled connections alive through idle NAT/firewall timeouts
+        transport.set_keepalive(30)
+        return transport
+
+    def _open_channel(self, transport: paramiko.Transport) -> paramiko.Channel:
+        """Blocking open of an interactive shell channel, runs on the executor"""
+        channel = transport.open_session(timeout=self.timeout)
+        channel.get_pty(term="vt100", width=80, height=24)
+        channel.invoke_shell()
+        channel.settimeout(0.1)
+        return channel
+
+    async def _run_blocking(self, func, *args, cleanup=None):
+        """Run on the executor; if the caller is cancelled, hand the late result to ``cleanup``"""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, func, *args)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if cleanup is not None:
+                def abandon(done):
+                    if not done.cancelled() and done.exception() is None:
+                        cleanup(done.result())
+                future.add_done_callback(abandon)
+            raise
+
+    async def _handshake(self, key: PoolKey, hostname: str, port: int, username: str, password: str) -> PooledTransport:
+        """New pooled transport under the per-host limit, with one channel reserved"""
+        host_key = f"{hostname}:{port}"
+        slot = self.host_slots.setdefault(host_key, asyncio.Semaphore(self.per_host_limit))
+        host = self.host_stats.setdefault(host_key, {"queued": 0, "connecting": 0})
+
+        self.stats["queued"] += 1
+        host["queued"] += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.stats["queued"])
+        waiting = True
+        try:
+            async with slot:
+                waiting = False
+                self.stats["queued"] -= 1
+                host["queued"] -= 1
+                self.stats["connecting"] += 1
+                host["connecting"] += 1
+                phases: Dict[str, float] = {}
+                try:
+                    transport = await self._run_blocking(
+                        self._connect, hostname, port, username, password, phases,
+                        cleanup=lambda late: self.executor.submit(late.close)
+                    )
+                    self.stats["connected"] += 1
+                    # A device that refused a second channel will refuse it on this connection too
+                    return self.pool.add(key, transport, max_channels=1 if key in self.single_channel else None)
+                except Exception:
+                    self.stats["failed"] += 1
+                    metrics.SSH_CONNECT_FAILURES.inc()
+                    raise
+                finally:
+                    for phase, seconds in list(phases.items()):
+                        metrics.SSH_CONNECT_SECONDS.observe(seconds, phase=phase)
+                    self.stats["connecting"] -= 1
+                    host["connecting"] -= 1
+        finally:
+            if waiting:
+                self.stats["queued"] -= 1
+                host["queued"] -= 1
+            if host["queued"] == 0 and host["connecting"] == 0:
+                self.host_slots.pop(host_key, None)
+                self.host_stats.pop(host_key, None)
+
+    async def _fresh_transport(self, key: PoolKey, hostname: str, port: int, username: str, password: str) -> Optional[PooledTransport]:
+        """Handshake, or wait for an identical handshake already in flight
+
+        Returns None after waiting, so the caller retries the pool.
+        """
+        pending = self.inflight.get(key)
+        if pending is not None and key not in self.single_channel:
+            try:
+                await asyncio.shield(pending)
+            except HandshakeAbandoned:
+                pass
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            entry = await self._handshake(key, hostname, port, username, password)
+            future.set_result(None)
+            return entry
+        except BaseException as e:
+            # Waiters share a real failure, but retry if the requester just went away
+            future.set_exception(e if isinstance(e, Exception) else HandshakeAbandoned())
+            future.exception()  # don't warn about it when nobody was waiting
+            raise
+        finally:
+            if self.inflight.get(key) is future:
+                del self.inflight[key]
+
+    async def open_shell(self, hostname: str, port: int, username: str, password: str) -> Tuple[paramiko.Transport, paramiko.Channel]:
+        """Open an interactive shell, on a pooled transport when one is warm"""
+        key = self.pool.make_key(hostname, port, username, password)
+        while True:
+            entry = self.pool.acquire(key)
+            reused = entry is not None
+            if entry is None:
+                entry = await self._fresh_transport(key, hostname, port, username, password)
+                if entry is None:
+                    continue
+            started = time.perf_counter()
+            try:
+                channel = await self._run_blocking(
+                    self._open_channel, entry.transport,
+                    cleanup=lambda late: late.close()
+                )
+            except asyncio.CancelledError:
+                self.pool.release(entry)
+                raise
+            except paramiko.ChannelException as e:
+                if reused:
+                    # e.g. IOS allows one shell per connection; handshake a new one
+                    logger.info(f"Device refused another channel on a pooled transport: {hostname}:{port} ({e})")
+                    self.pool.refuse(entry)
+                    self.single_channel.add(key)
+                    continue
+                self.pool.release(entry)
+                raise
+            except Exception:
+                self.pool.release(entry)
+                if reused and not entry.transport.is_active():
+                    # The pooled connection died while idle; reap it and connect again
+                    self._close_transports(self.pool.reap())
+                    continue
+                raise
+            metrics.SSH_CONNECT_SECONDS.observe(time.perf_counter() - started, phase="channel")
+            metrics.SSH_CONNECTS.inc(transport="pooled" if reused else "new")
+            self.leases[id(channel)] = entry
+            return entry.transport, channel
+
+    def lease(self, channel: paramiko.Channel) -> Optional[PooledTransport]:
+        """The pooled transport a session's shell was opened on"""
+        return self.leases.get(id(channel))
+
+    def release(self, channel: paramiko.Channel):
+        """Close a session's channel and return its transport to the pool"""
+        entry = self.leases.pop(id(channel), None)
+        try:
+            channel.close()
+        except Exception as e:
+            logger.error(f"Error closing channel: {str(e)}")
+        if entry is not None:
+            self.pool.release(entry)
+        self._close_transports(self.pool.reap())
+
+    def _close_transports(self, transports):
+        # Transport.close() joins the transport thread
+        for transport in transports:
+            self.executor.submit(transport.close)
+
+    async def _maintain(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self._close_transports(self.pool.reap())
+
+    def start(self, interval: float = 30.0):
+        """Expire idle pooled transports in the background"""
+        if self.maintenance_task is None:
+            self.maintenance_task = asyncio.create_task(self._maintain(interval))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, throughput and pool counters for monitoring"""
+        return {
+            **self.stats,
+            "workers": self.max_workers,
+            "per_host_limit": self.per_host_limit,
+            "hosts": {
+                host_key: dict(host)
+                for host_key, host in self.host_stats.items()
+            },
+            "pool": self.pool.get_stats()
+        }
+
+    def shutdown(self):
+        """Stop accepting new connection jobs and close pooled transports"""
+        if self.maintenance_task is not None:
+            self.maintenance_task.cancel()
+        for transport in self.pool.drain():
+            transport.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,116 @@
+"""
+Platform detection for Monetx NCM SSH Emulator
+Recognises the device platform once per session from its login banner and first prompt
+"""
+
+import asyncio
+import logging
+import re
+from typing import Any, Dict, Optional
+
+from batch import ANSI_ESCAPE
+from shell_pump import output_decoder
+
+logger = logging.getLogger(__name__)
+
+# Banner phrases that name the platform outright; first match in the text wins
+BANNER_PATTERN = re.compile(
+    r"(?P<cisco>Cisco (?:IOS|Nexus|Adaptive Security)|IOS[ -]XE|NX-OS|Cisco Systems, Inc)"
+    r"|(?P<arista>Arista Networks|Arista EOS|\bEOS-\d)"
+    r"|(?P<juniper>JUNOS \d|Junos OS|Juniper Networks)"
+    r"|(?P<huawei>Huawei Versatile Routing Platform|HUAWEI TECHNOLOGIES|\bVRP\b \(R\) software)"
+    r"|(?P<linux>\bGNU/Linux\b|\bUbuntu \d|\bDebian GNU|Red Hat Enterprise Linux|CentOS|\bLinux [\w.-]+ \d+\.\d+\.\d+-)",
+    re.IGNORECASE
+)
+
+# Prompt shapes, tried in order; the first that fits the last line decides
+PROMPT_PATTERNS = [
+    # [user@host ~]$ (RHEL) and user@host:~$ (Debian)
+    ("linux", re.compile(r"^(?:\[[\w.-]+@[\w.-]+[^\]]*\]|[\w.-]+@[\w.-]+:[^\s]*)\s?[$#]\s*$")),
+    # user@router> / user@router#
+    ("juniper", re.compile(r"^[\w.-]+@[\w.-]+[>#]\s*$")),
+    # <HUAWEI> user view, [~HUAWEI-GigabitEthernet0/0/1] system view
+    ("huawei", re.compile(r"^(?:<[\w.-]+>|\[~?\*?[\w.-]+(?:-[^\]]*)?\])\s*$")),
+    # Router> / Router# / Router(config-if)#; Arista looks the same, so the banner has to tell them apart
+    ("cisco", re.compile(r"^[\w.-]+(?:\([\w/.-]+\))?[>#]\s*$")),
+    # $ / bash-5.1$ and other plain shell prompts
+    ("linux", re.compile(r"^[\w.@:~/-]*\$\s*$")),
+]
+
+# Last line of output that ends the way device prompts do
+PROMPT_END = re.compile(r"[#>$%\]]\s*$")
+
+
+def is_known_prompt(line: str) -> bool:
+    """True when the line has the shape of a prompt we recognise, safe to pace commands on"""
+    return any(pattern.match(line) for _, pattern in PROMPT_PATTERNS)
+
+
+def detect_platform(text: str) -> Dict[str, Any]:
+    """Platform, prompt and the evidence used, from a banner ending in the first prompt"""
+    clean = ANSI_ESCAPE.sub("", text).replace("\r", "")
+    lines = [line.strip() for line in clean.split("\n") if line.strip()]
+    prompt = lines[-1] if lines and PROMPT_END.search(lines[-1]) else None
+
+    match = BANNER_PATTERN.search(clean)
+    if match:
+        return {"platform": match.lastgroup, "prompt": prompt, "detected_by": "banner"}
+    if prompt is not None:
+        for platform, pattern in PROMPT_PATTERNS:
+            if pattern.match(prompt):
+                return {"platform": platform, "prompt": prompt, "detected_by": "prompt"}
+    return {"platform": "unknown", "prompt": prompt, "detected_by": None}
+
+
+class PlatformDetector:
+    """Pump listener that collects output until the first prompt, then detects once
+
+    A last line the device leaves open ends collection at once when it has
+    a prompt shape we know. One that merely ends like a prompt (an unknown
+    prompt, or a banner line cut mid-way such as ``CPU 5%``) ends it only
+    after ``quiet`` seconds without more output.
+
+    The result is available from ``result``; after that the listener does
+    nothing, so it costs one length check per chunk for the rest of the session.
+    """
+
+    def __init__(self, max_bytes: int = 16384, quiet: float = 0.5):
+        self.max_bytes = max_bytes
+        self.quiet = quiet
+        self.decoder = output_decoder()
+        self.text = ""
+        self.size = 0
+        self.loop = asyncio.get_running_loop()
+        self.result: asyncio.Future = self.loop.create_future()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def feed(self, data: bytes):
+        if self.result.done():
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.size += len(data)
+        self.text += self.decoder.decode(data)
+        # A prompt is a last line the device leaves open for input
+        last_line = ANSI_ESCAPE.sub("", self.text.rsplit("\n", 1)[-1]).strip()
+        if self.size >= self.max_bytes or (last_line and is_known_prompt(last_line)):
+            self.finish()
+        elif last_line and PROMPT_END.search(last_line):
+            self._timer = self.loop.call_later(self.quiet, self.finish)
+
+    def finish(self):
+        """Decide with whatever has arrived (also used when the device stays quiet)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.result.done():
+            self.result.set_result(detect_platform(self.text))
+            self.text = ""
+
+    async def wait(self, timeout: float = 10.0) -> Dict[str, Any]:
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.result), timeout)
+        except asyncio.TimeoutError:
+            self.finish()
+            return self.result.result()
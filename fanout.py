@@ -0,0 +1,161 @@
+"""
+Multi-device command fan-out for Monetx NCM SSH Emulator
+Runs one command script across many devices with bounded concurrency
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+from batch import BatchExecutor, PromptTracker
+from device_detect import is_known_prompt
+from parsers import find_template
+
+logger = logging.getLogger(__name__)
+
+# Credential fields a job may supply once for every device
+SHARED_FIELDS = ("port", "username", "password", "vendor", "pager_mode")
+
+
+class FanoutJob:
+    """One command script run against a list of devices
+
+    ``open_device`` is the same connect path interactive sessions use and
+    returns ``(transport, shell, pump, pager, detector)``; ``close_device``
+    releases the shell so its transport can serve the next device job. With
+    ``parse`` set, commands that have a template for the device's platform
+    stream their parsed records as ``records`` messages while they run, and
+    their result carries the record count instead of raw output.
+
+    Messages wait in a queue of at most ``max_pending``; devices stop
+    reading output while it is full, so a slow client holds them back
+    instead of the job piling their output up.
+    """
+
+    def __init__(self, open_device: Callable[[Dict[str, Any]], Awaitable], close_device: Callable[..., Awaitable],
+                 devices: List[Dict[str, Any]],
+                 commands: List[str], defaults: Dict[str, Any] = None, concurrency: int = 20,
+                 timeout: float = 30.0, parse: bool = False, max_pending: int = 256):
+        self.job_id = str(uuid.uuid4())
+        self.open_device = open_device
+        self.close_device = close_device
+        self.devices = [self._with_defaults(device, defaults or {}) for device in devices]
+        self.commands = commands
+        self.slots = asyncio.Semaphore(concurrency)
+        self.timeout = timeout
+        self.parse = parse
+        self.messages: asyncio.Queue = asyncio.Queue(max_pending)
+
+    @staticmethod
+    def _with_defaults(device: Dict[str, Any], defaults: Dict[str, Any]) -> Dict[str, Any]:
+        merged = {field: defaults[field] for field in SHARED_FIELDS if defaults.get(field) is not None}
+        merged.update({key: value for key, value in device.items() if value is not None})
+        return merged
+
+    async def run_device(self, index: int, device: Dict[str, Any]) -> Dict[str, Any]:
+        """Connect, run the script and disconnect one device"""
+        result = {
+            "type": "device",
+            "job_id": self.job_id,
+            "index": index,
+            "host": device.get("host") or device.get("device_ip"),
+            "device_id": device.get("device_id"),
+            "results": []
+        }
+        async with self.slots:
+            started = time.monotonic()
+            try:
+                _, shell, pump, pager, detector = await self.open_device(device)
+            except Exception as e:
+                result.update(status="failed", error=f"Connection failed: {getattr(e, 'detail', None) or str(e)}")
+                return result
+            try:
+                result["connect_ms"] = round((time.monotonic() - started) * 1000, 1)
+                prompt = PromptTracker()
+                async with BatchExecutor(shell, pump, prompt, pager=pager, timeout=self.timeout) as executor:
+                    # The login prompt usually tells us the prompt already, saving a round trip
+                    detected = await detector.wait(self.timeout)
+                    result["platform"] = detected["platform"]
+                    if detected["prompt"] and is_known_prompt(detected["prompt"]):
+                        prompt.learn(detected["prompt"])
+                        result["prompt"] = prompt.prompt
+                    else:
+                        result["prompt"] = await executor.learn_prompt()
+                    for index, command in enumerate(self.commands):
+                        command_result = await self.run_command(executor, command, result["platform"], index=index,
+                                                                device_index=result["index"])
+                        command_result["index"] = index
+                        result["results"].append(command_result)
+                        # The device is in an unknown state once a prompt never came back
+                        if command_result["status"] != "ok":
+                            break
+                completed = sum(r["status"] == "ok" for r in result["results"])
+                result["status"] = "ok" if completed == len(self.commands) else "partial"
+            except Exception as e:
+                result.update(status="failed", error=str(e))
+            finally:
+                await self.close_device(shell, pump)
+                result["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return result
+
+    async def run_command(self, executor: BatchExecutor, command: str, platform: str, index: int = 0,
+                          device_index: int = 0) -> Dict[str, Any]:
+        """One command's result, its records sent on as they are parsed when a template fits"""
+        template = find_template(platform, command) if self.parse else None
+        if template is None:
+            return await executor.run_command(command)
+        parser = template.parser()
+        count = 0
+        async for item in executor.stream_command(command):
+            if isinstance(item, str):
+                count += await self._send_records(parser.feed(item), device_index, index)
+            else:
+                result = item
+        count += await self._send_records(parser.close(), device_index, index)
+        result.update(template=template.name, records=count)
+        return result
+
+    async def _send_records(self, records: List[Dict[str, Any]], device_index: int, index: int) -> int:
+        if records:
+            await self.messages.put({
+                "type": "records",
+                "job_id": self.job_id,
+                "device_index": device_index,
+                "index": index,
+                "records": records
+            })
+        return len(records)
+
+    async def _report_device(self, index: int, device: Dict[str, Any]):
+        await self.messages.put(await self.run_device(index, device))
+
+    async def run(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield parsed records as they come and each device's result as soon as it finishes, then a summary"""
+        started = time.monotonic()
+        tasks = [
+            asyncio.create_task(self._report_device(index, device))
+            for index, device in enumerate(self.devices)
+        ]
+        counts = {"ok": 0, "partial": 0, "failed": 0}
+        try:
+            remaining = len(tasks)
+            while remaining:
+                message = await self.messages.get()
+                if message["type"] == "device":
+                    remaining -= 1
+                    counts[message["status"]] += 1
+                yield message
+        finally:
+            # The client went away: stop devices that have not finished
+            for task in tasks:
+                task.cancel()
+        logger.info(f"Fan-out job {self.job_id} finished: {counts}")
+        yield {
+            "type": "done",
+            "job_id": self.job_id,
+            "devices": len(self.devices),
+            **counts,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+        }
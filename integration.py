@@ -7,13 +7,22 @@ from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 import jwt
-import secrets
+import hmac
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import logging
 
+from inventory import DeviceCache, create_inventory_source
+from token_cache import TokenCache
+
 logger = logging.getLogger(__name__)
 
+# Upper bound on device_ids in one bulk device-info request
+MAX_BULK_DEVICES = 5000
+
+# The example API key; anyone reading the docs knows it
+DEFAULT_API_KEY = "your-nms-api-key"
+
 class NMSIntegration:
     """Integration handler for existing NMS"""
     
@@ -21,9 +30,33 @@ class NMSIntegration:
         self.app = app
         self.nms_config = nms_config or {}
         self.templates = Jinja2Templates(directory="templates")
-        self.active_sessions = {}
+        # Verified tokens, so repeat requests skip JWT decoding and NMS round trips
+        cache_size = self.nms_config.get("token_cache_size", 10000)
+        self.session_tokens = TokenCache("session", max_size=cache_size)
+        self.nms_tokens = TokenCache(
+            "nms", max_size=cache_size, default_ttl=self.nms_config.get("nms_token_cache_ttl", 60)
+        )
+        # Device info is looked up in bulk and cached, so dashboards don't hit the inventory per terminal
+        self.devices = DeviceCache(
+            create_inventory_source(self.nms_config.get("inventory_source", "demo")),
+            ttl=self.nms_config.get("device_cache_ttl", 300),
+            stale_ttl=self.nms_config.get("device_cache_stale_ttl", 3600),
+            max_size=self.nms_config.get("device_cache_size", 50000)
+        )
         self.setup_integration_routes()
     
+    def require_api_key(self, request: Request, allow_default: bool = True):
+        """Reject calls that don't carry the NMS API key
+
+        With ``allow_default`` off the endpoint stays disabled until a real
+        key replaces the example one.
+        """
+        if not allow_default and (self.nms_config.get("api_key") or DEFAULT_API_KEY) == DEFAULT_API_KEY:
+            raise HTTPException(status_code=403, detail="Set NMS_API_KEY to enable this endpoint")
+        api_key = request.headers.get("X-API-Key") or ""
+        if not hmac.compare_digest(api_key, self.nms_config.get("api_key") or ""):
+            raise HTTPException(status_code=401, detail="Invalid API key")
+    
     def setup_integration_routes(self):
         """Setup integration endpoints for NMS"""
         
@@ -60,6 +93,36 @@ class NMSIntegration:
                 logger.error(f"NMS auth error: {str(e)}")
                 raise HTTPException(status_code=401, detail="Authentication failed")
         
+        @self.app.post("/nms/api/logout")
+        async def nms_logout(request: Request):
+            """Revoke the caller's session token"""
+            session_token = request.headers.get("X-Session-Token")
+            user_data = self.verify_session_token(session_token)
+            self.session_tokens.revoke(session_token, user_data.get("exp"))
+            return {"status": "revoked"}
+        
+        @self.app.post("/nms/api/revoke")
+        async def nms_revoke(request: Request):
+            """Revoke a session token, or every token of a user (called by the NMS with its API key)"""
+            self.require_api_key(request, allow_default=False)
+            data = await request.json()
+            if data.get("session_token"):
+                self.session_tokens.revoke(data["session_token"])
+            if data.get("nms_token"):
+                self.nms_tokens.revoke(data["nms_token"])
+            if data.get("user_id"):
+                self.session_tokens.revoke_user(data["user_id"])
+                self.nms_tokens.revoke_user(data["user_id"])
+            return {"status": "revoked"}
+        
+        @self.app.get("/nms/api/token-cache/stats")
+        async def token_cache_stats():
+            """Token verification cache hit rate and revocations"""
+            return {
+                "session": self.session_tokens.get_stats(),
+                "nms": self.nms_tokens.get_stats()
+            }
+        
         @self.app.post("/nms/api/device-connect")
         async def device_connect(request: Request):
             """Connect to specific device from NMS"""
@@ -85,7 +148,7 @@ class NMSIntegration:
                 
                 # Create SSH connection
                 from app import connect_ssh
-                result = await connect_ssh(device_info)
+                result = await connect_ssh({**device_info, "user_id": user_data["user_id"]})
                 
                 return {
                     "success": True,
@@ -93,10 +156,35 @@ class NMSIntegration:
                     "device_info": device_info
                 }
                 
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"Device connection error: {str(e)}")
                 raise HTTPException(status_code=500, detail=f"Connection failed: {str(e)}")
         
+        @self.app.post("/nms/api/fanout")
+        async def device_fanout(request: Request):
+            """Run a command script on many NMS devices"""
+            data = await request.json()
+            
+            # Validate session token
+            session_token = request.headers.get("X-Session-Token")
+            user_data = self.verify_session_token(session_token)
+            
+            # Look up every device without an address in one inventory pass up front
+            await self.devices.get_many(
+                device["device_id"] for device in data.get("devices", [])
+                if device.get("device_id") and not (device.get("device_ip") or device.get("host"))
+            )
+            
+            async def prepare_device(device: Dict[str, Any]) -> Dict[str, Any]:
+                device_info = await self.resolve_device(device, user_data)
+                await self.log_connection_attempt(user_data, device_info)
+                return device_info
+            
+            from app import start_fanout
+            return start_fanout(data, on_device=prepare_device, user_id=user_data["user_id"])
+        
         @self.app.get("/nms/api/device-info/{device_id}")
         async def get_device_info(device_id: str, request: Request):
             """Get device information from NMS"""
@@ -109,31 +197,113 @@ class NMSIntegration:
                 
                 return device_info
                 
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"Device info error: {str(e)}")
-                raise HTTPException(status_code=404, detail="Device not found")
+                raise HTTPException(status_code=503, detail="Device inventory unavailable")
+        
+        @self.app.post("/nms/api/device-info")
+        async def get_devices_info(request: Request):
+            """Get information for many devices in one call"""
+            session_token = request.headers.get("X-Session-Token")
+            self.verify_session_token(session_token)
+            
+            data = await request.json()
+            device_ids = data.get("device_ids") or []
+            if not isinstance(device_ids, list):
+                raise HTTPException(status_code=400, detail="device_ids must be a list")
+            if len(device_ids) > MAX_BULK_DEVICES:
+                raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_DEVICES} device_ids per request")
+            
+            try:
+                found = await self.devices.get_many(device_ids)
+            except Exception as e:
+                logger.error(f"Bulk device info error: {str(e)}")
+                raise HTTPException(status_code=503, detail="Device inventory unavailable")
+            
+            return {
+                "devices": {device_id: device for device_id, device in found.items() if device is not None},
+                "missing": [device_id for device_id, device in found.items() if device is None]
+            }
+        
+        @self.app.post("/nms/api/device-info/invalidate")
+        async def invalidate_device_info(request: Request):
+            """Drop cached device info after the NMS changes devices (all devices when no ids are given)"""
+            self.require_api_key(request)
+            data = await request.json()
+            self.devices.invalidate(data.get("device_ids"))
+            return {"status": "invalidated"}
+        
+        @self.app.get("/nms/api/device-info-cache/stats")
+        async def device_cache_stats():
+            """Device info cache hit rate and inventory fetches"""
+            return self.devices.get_stats()
         
         @self.app.get("/nms/api/user-sessions")
-        async def get_user_sessions(request: Request):
-            """Get user's active SSH sessions"""
+        async def get_user_sessions(request: Request, device_id: Optional[str] = None,
+                                    limit: int = 100, offset: int = 0):
+            """Get user's active SSH sessions, optionally on one device"""
             try:
                 session_token = request.headers.get("X-Session-Token")
                 user_data = self.verify_session_token(session_token)
                 
-                # Return user's active sessions
-                user_sessions = [
-                    session for session in self.active_sessions.values()
-                    if session.get("user_id") == user_data.get("user_id")
-                ]
+                # Return user's active sessions on every worker
+                from app import registry
+                user_id = user_data.get("user_id")
+                user_sessions = await registry.list_sessions(
+                    user_id=user_id, device_id=device_id, limit=min(limit, 1000), offset=offset
+                )
                 
-                return {"sessions": user_sessions}
+                return {
+                    "sessions": user_sessions,
+                    "total": await registry.count_sessions(user_id=user_id, device_id=device_id)
+                }
                 
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"Get sessions error: {str(e)}")
                 raise HTTPException(status_code=500, detail="Failed to get sessions")
     
+    async def resolve_device(self, device: Dict[str, Any], user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Connection details for one device, filling the address from the NMS when omitted
+
+        Every other field the device carries (including the job-wide
+        defaults a fan-out job merged in, such as ``pager_mode``) is kept.
+        """
+        device_info = {
+            **device,
+            "host": device.get("device_ip") or device.get("host"),
+            "port": device.get("port", 22),
+            "username": device.get("username"),
+            "password": device.get("password"),
+            "device_id": device.get("device_id"),
+            "device_name": device.get("device_name"),
+            "vendor": device.get("vendor")
+        }
+        
+        if not device_info["host"] and device_info["device_id"]:
+            nms_device = await self.fetch_device_from_nms(device_info["device_id"], user_data)
+            device_info["host"] = nms_device.get("device_ip")
+            device_info["device_name"] = device_info["device_name"] or nms_device.get("device_name")
+            device_info["vendor"] = device_info["vendor"] or (nms_device.get("vendor") or "").lower() or None
+        
+        return device_info
+    
     async def verify_nms_token(self, token: str) -> Dict[str, Any]:
-        """Verify NMS authentication token"""
+        """Verify NMS authentication token
+        
+        Results are cached for ``nms_token_cache_ttl`` seconds, and concurrent
+        requests with the same token share one upstream verification.
+        """
+        user_data = await self.nms_tokens.verify(token, lambda: self.verify_nms_token_upstream(token))
+        if self.nms_tokens.is_revoked(token, user_data):
+            raise HTTPException(status_code=401, detail="NMS token revoked")
+        return user_data
+    
+    async def verify_nms_token_upstream(self, token: str) -> Tuple[Dict[str, Any], Optional[float]]:
+        """Ask the NMS who this token belongs to; returns (user data, expiry timestamp or None)"""
         # Implement based on your NMS authentication system
         # This is a placeholder implementation
         
@@ -142,7 +312,7 @@ class NMSIntegration:
                 "user_id": "demo_user",
                 "username": "admin",
                 "permissions": ["ssh_connect", "device_manage"]
-            }
+            }, None
         
         # In production, verify against your NMS auth system
         # Example: JWT verification, database lookup, etc.
@@ -169,14 +339,22 @@ class NMSIntegration:
         if not token:
             raise HTTPException(status_code=401, detail="Session token required")
         
-        try:
-            secret_key = self.nms_config.get("jwt_secret", "your-secret-key")
-            payload = jwt.decode(token, secret_key, algorithms=["HS256"])
-            return payload
-        except jwt.ExpiredSignatureError:
-            raise HTTPException(status_code=401, detail="Session expired")
-        except jwt.InvalidTokenError:
-            raise HTTPException(status_code=401, detail="Invalid session token")
+        # Cached claims expire with the token, so a hit is as good as a decode
+        payload = self.session_tokens.get(token)
+        if payload is None:
+            try:
+                secret_key = self.nms_config.get("jwt_secret", "your-secret-key")
+                payload = jwt.decode(token, secret_key, algorithms=["HS256"])
+            except jwt.ExpiredSignatureError:
+                raise HTTPException(status_code=401, detail="Session expired")
+            except jwt.InvalidTokenError:
+                raise HTTPException(status_code=401, detail="Invalid session token")
+            if not self.session_tokens.is_revoked(token, payload):
+                self.session_tokens.put(token, payload, payload.get("exp"))
+        
+        if self.session_tokens.is_revoked(token, payload):
+            raise HTTPException(status_code=401, detail="Session revoked")
+        return payload
     
     async def log_connection_attempt(self, user_data: Dict[str, Any], device_info: Dict[str, Any]):
         """Log SSH connection attempts for auditing"""
@@ -191,29 +369,21 @@ class NMSIntegration:
         
         # Log to your audit system
         logger.info(f"SSH connection attempt: {log_entry}")
-        
-        # Store in active sessions
-        session_id = secrets.token_hex(16)
-        self.active_sessions[session_id] = log_entry
+        from app import audit
+        audit.record(
+            "ssh_connect_attempt",
+            user_id=user_data["user_id"],
+            username=user_data["username"],
+            device_id=device_info.get("device_id"),
+            device_ip=device_info.get("host")
+        )
     
     async def fetch_device_from_nms(self, device_id: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Fetch device information from NMS database"""
-        # Implement based on your NMS database structure
-        # This is a placeholder implementation
-        
-        if device_id == "demo-device-001":
-            return {
-                "device_id": "demo-device-001",
-                "device_name": "Core Router 01",
-                "device_ip": "192.168.1.1",
-                "device_type": "router",
-                "vendor": "Cisco",
-                "model": "ISR4321",
-                "location": "Data Center Rack 1",
-                "status": "online"
-            }
-        
-        raise HTTPException(status_code=404, detail="Device not found")
+        """Fetch device information from the NMS inventory (cached)"""
+        device = await self.devices.get(device_id)
+        if device is None:
+            raise HTTPException(status_code=404, detail="Device not found")
+        return device
 
 def create_embedded_template():
     """Create embedded template for NMS integration"""
@@ -366,5 +536,12 @@ NMS_CONFIG = {
     "allowed_origins": ["https://your-nms-domain.com"],
     "audit_log_enabled": True,
     "session_timeout": 3600,  # 1 hour
-    "max_sessions_per_user": 5
+    "max_sessions_per_user": 5,
+    "api_key": DEFAULT_API_KEY,
+    "token_cache_size": 10000,
+    "nms_token_cache_ttl": 60,
+    "inventory_source": "demo",
+    "device_cache_ttl": 300,
+    "device_cache_stale_ttl": 3600,
+    "device_cache_size": 50000
 }
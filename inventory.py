@@ -0,0 +1,251 @@
+"""
+Device inventory for Monetx NCM SSH Emulator
+Looks devices up in a local inventory source and caches them with stale-while-revalidate
+"""
+
+import asyncio
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEVICE_CACHE_LOOKUPS = metrics.REGISTRY.add(metrics.Counter(
+    "ncm_device_cache_lookups_total", "Device info cache lookups by result (hit, stale, miss, coalesced)",
+    labelnames=("result",)
+))
+INVENTORY_FETCH_SECONDS = metrics.REGISTRY.add(metrics.Histogram(
+    "ncm_inventory_fetch_seconds", "Time to look up one batch of devices in the inventory source",
+    metrics.CONNECT_BUCKETS
+))
+
+# SQLite's default limit on bound parameters
+SQLITE_MAX_VARIABLES = 999
+
+
+class DemoInventory:
+    """The built-in demo device, for trying the NMS integration without an inventory"""
+
+    DEVICES = {
+        "demo-device-001": {
+            "device_id": "demo-device-001",
+            "device_name": "Core Router 01",
+            "device_ip": "192.168.1.1",
+            "device_type": "router",
+            "vendor": "Cisco",
+            "model": "ISR4321",
+            "location": "Data Center Rack 1",
+            "status": "online"
+        }
+    }
+
+    def fetch_many(self, device_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return {device_id: dict(self.DEVICES[device_id]) for device_id in device_ids if device_id in self.DEVICES}
+
+
+class FileInventory:
+    """JSON or CSV inventory file, re-read whenever it changes on disk
+
+    JSON may be a list of device objects or an object keyed by device id;
+    CSV needs a ``device_id`` column.
+    """
+
+    def __init__(self, path: str, file_format: str):
+        self.path = path
+        self.file_format = file_format
+        self.devices: Dict[str, Dict[str, Any]] = {}
+        self.mtime: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        with open(self.path, newline="") as f:
+            if self.file_format == "csv":
+                records = [
+                    {key: value for key, value in row.items() if value not in (None, "")}
+                    for row in csv.DictReader(f)
+                ]
+            else:
+                data = json.load(f)
+                records = list(data.values()) if isinstance(data, dict) else data
+        devices = {}
+        for record in records:
+            if record.get("device_id") is not None:
+                devices[str(record["device_id"])] = record
+        return devices
+
+    def fetch_many(self, device_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            mtime = os.stat(self.path).st_mtime
+            if mtime != self.mtime:
+                self.devices = self._load()
+                self.mtime = mtime
+                logger.info(f"Loaded {len(self.devices)} devices from {self.path}")
+            return {device_id: dict(self.devices[device_id]) for device_id in device_ids if device_id in self.devices}
+
+
+class SQLiteInventory:
+    """A ``devices`` table with a ``device_id`` column; other columns become device fields"""
+
+    def __init__(self, path: str, table: str = "devices"):
+        self.path = path
+        self.table = table
+
+    def fetch_many(self, device_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        db = sqlite3.connect(self.path)
+        try:
+            db.row_factory = sqlite3.Row
+            devices = {}
+            for i in range(0, len(device_ids), SQLITE_MAX_VARIABLES):
+                chunk = device_ids[i:i + SQLITE_MAX_VARIABLES]
+                rows = db.execute(
+                    f"SELECT * FROM {self.table} WHERE device_id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                for row in rows:
+                    device = {key: row[key] for key in row.keys() if row[key] is not None}
+                    devices[str(device["device_id"])] = device
+            return devices
+        finally:
+            db.close()
+
+
+def create_inventory_source(url: str):
+    """Inventory source for INVENTORY_SOURCE: ``demo``, ``json:///path``, ``csv:///path`` or ``sqlite:///path``"""
+    if url == "demo":
+        return DemoInventory()
+    for scheme in ("json", "csv"):
+        if url.startswith(f"{scheme}:///"):
+            return FileInventory(url[len(f"{scheme}:///"):], scheme)
+    if url.startswith("sqlite:///"):
+        return SQLiteInventory(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported inventory source: {url}")
+
+
+class DeviceCache:
+    """Device lookups by id, cached for ``ttl`` seconds
+
+    For ``stale_ttl`` seconds after that an entry is still served while one
+    background fetch refreshes it. Misses are fetched from the source in one
+    batch per call, and concurrent lookups of the same device share a fetch.
+    Unknown devices are cached too, so repeated lookups of a bad id stay local.
+    """
+
+    def __init__(self, source, ttl: float = 300.0, stale_ttl: float = 3600.0, max_size: int = 50000):
+        self.source = source
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        # device_id -> (device or None when unknown, fetched at)
+        self.entries: "OrderedDict[str, Tuple[Optional[Dict[str, Any]], float]]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.fetch_tasks = set()
+        self.stats = {"hits": 0, "stale": 0, "misses": 0, "coalesced": 0, "fetches": 0,
+                      "fetch_errors": 0, "evicted": 0}
+
+    def _store(self, device_id: str, device: Optional[Dict[str, Any]], fetched_at: float):
+        self.entries[device_id] = (device, fetched_at)
+        self.entries.move_to_end(device_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def _count(self, stat: str, result: str):
+        self.stats[stat] += 1
+        DEVICE_CACHE_LOOKUPS.inc(result=result)
+
+    def _load(self, device_ids: List[str]):
+        """Start one source fetch for these ids; lookups wait on their entries in ``inflight``"""
+        loop = asyncio.get_running_loop()
+        futures = {device_id: loop.create_future() for device_id in device_ids}
+        self.inflight.update(futures)
+        # A task of its own, so a lookup that gives up doesn't cancel it for the others
+        task = asyncio.ensure_future(self._fetch(futures))
+        self.fetch_tasks.add(task)
+        task.add_done_callback(self.fetch_tasks.discard)
+
+    async def _fetch(self, futures: Dict[str, asyncio.Future]):
+        device_ids = list(futures)
+        self.stats["fetches"] += 1
+        started = time.perf_counter()
+        try:
+            found = await asyncio.to_thread(self.source.fetch_many, device_ids)
+        except Exception as e:
+            # Stale entries stay cached and keep being served
+            logger.error(f"Inventory lookup of {len(device_ids)} devices failed: {str(e)}")
+            self.stats["fetch_errors"] += 1
+            for future in futures.values():
+                future.set_exception(e)
+                future.exception()  # don't warn about it when nobody was waiting
+        else:
+            fetched_at = time.time()
+            for device_id, future in futures.items():
+                self._store(device_id, found.get(device_id), fetched_at)
+                future.set_result(found.get(device_id))
+        finally:
+            INVENTORY_FETCH_SECONDS.observe(time.perf_counter() - started)
+            for device_id, future in futures.items():
+                if self.inflight.get(device_id) is future:
+                    del self.inflight[device_id]
+
+    async def get_many(self, device_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Device info for every id (None for unknown devices), with one source fetch at most"""
+        device_ids = list(dict.fromkeys(str(device_id) for device_id in device_ids))
+        now = time.time()
+        result: Dict[str, Optional[Dict[str, Any]]] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        missing, refresh = [], []
+        for device_id in device_ids:
+            entry = self.entries.get(device_id)
+            age = now - entry[1] if entry is not None else None
+            if age is not None and age < self.ttl:
+                self._count("hits", "hit")
+                self.entries.move_to_end(device_id)
+                result[device_id] = entry[0]
+            elif age is not None and age < self.ttl + self.stale_ttl:
+                self._count("stale", "stale")
+                result[device_id] = entry[0]
+                if device_id not in self.inflight:
+                    refresh.append(device_id)
+            elif device_id in self.inflight:
+                self._count("coalesced", "coalesced")
+                waiting[device_id] = self.inflight[device_id]
+            else:
+                self._count("misses", "miss")
+                missing.append(device_id)
+        if refresh:
+            self._load(refresh)
+        if missing:
+            self._load(missing)
+            waiting.update((device_id, self.inflight[device_id]) for device_id in missing)
+        if waiting:
+            found = await asyncio.gather(*(asyncio.shield(future) for future in waiting.values()))
+            result.update(zip(waiting, found))
+        return {device_id: result[device_id] for device_id in device_ids}
+
+    async def get(self, device_id: str) -> Optional[Dict[str, Any]]:
+        return (await self.get_many([device_id]))[str(device_id)]
+
+    def invalidate(self, device_ids: Optional[Iterable[str]] = None):
+        """Forget some devices, or all of them, so the next lookup goes to the source"""
+        if device_ids is None:
+            self.entries.clear()
+            return
+        for device_id in device_ids:
+            self.entries.pop(str(device_id), None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "inflight": len(self.inflight),
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl
+        }
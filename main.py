@@ -72,17 +72,28 @@ async def shutdown_event():
     logger.info("Shutting down application")
     
     # Close all active SSH connections
-    from app import active_connections, active_shells
-    for session_id in list(active_connections.keys()):
+    from app import active_connections, active_shells, active_pumps, close_session, connector, reaper, registry
+    reaper.stop()
+    for session_id in list(active_shells.keys()):
         try:
-            active_connections[session_id].close()
-            logger.info(f"Closed SSH connection: {session_id}")
+            await close_session(session_id, "shutdown")
         except Exception as e:
             logger.error(f"Error closing connection {session_id}: {e}")
     
+    # Closes every pooled transport, including idle ones
+    connector.shutdown()
+    
+    # Drop this worker's sessions from the shared registry
+    await registry.close()
+    
+    # Flush audit events still queued
+    from app import audit
+    await audit.stop()
+    
     # Clear connection dictionaries
     active_connections.clear()
     active_shells.clear()
+    active_pumps.clear()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,201 @@
+"""
+Prometheus metrics for Monetx NCM SSH Emulator
+Counters, gauges and histograms cheap enough to leave on in production
+"""
+
+import bisect
+import logging
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+CONNECT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+BYTES_BUCKETS = (1024, 16384, 131072, 1048576, 8388608, 67108864, 536870912)
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for one metric family; updates are plain dict/list writes on the event loop"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self.values.items()
+        ]
+
+
+class Gauge(Metric):
+    """A gauge set directly, or read from ``callback`` at scrape time
+
+    The callback returns a number, or a dict of label value tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable] = None):
+        super().__init__(name, help_text, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+    def samples(self) -> List[str]:
+        values = self.values
+        if self.callback is not None:
+            try:
+                result = self.callback()
+            except Exception as e:
+                logger.error(f"Metric {self.name} callback failed: {str(e)}")
+                return []
+            values = result if isinstance(result, dict) else {(): result}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                 labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last)], sum
+        self.counts: Dict[LabelValues, List[int]] = {}
+        self.sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self.counts.get(key)
+        if counts is None:
+            counts = self.counts[key] = [0] * (len(self.buckets) + 1)
+            self.sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[key] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, counts in self.counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(self.sums[key])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def add(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+SSH_CONNECT_SECONDS = REGISTRY.add(Histogram(
+    "ncm_ssh_connect_seconds", "SSH connection setup time by phase (tcp, kex, auth, channel)",
+    CONNECT_BUCKETS, labelnames=("phase",)
+))
+SSH_CONNECTS = REGISTRY.add(Counter(
+    "ncm_ssh_connects_total", "SSH shells opened, by whether the transport came from the pool",
+    labelnames=("transport",)
+))
+SSH_CONNECT_FAILURES = REGISTRY.add(Counter(
+    "ncm_ssh_connect_failures_total", "SSH handshakes that failed"
+))
+ECHO_LATENCY_SECONDS = REGISTRY.add(Histogram(
+    "ncm_echo_latency_seconds", "Time from receiving keystrokes to the first output the device sends back"
+))
+OUTPUT_QUEUE_DEPTH = REGISTRY.add(Histogram(
+    "ncm_ws_output_queue_depth", "Shell output chunks waiting to be sent when a WebSocket frame is built",
+    DEPTH_BUCKETS
+))
+OUTPUT_BYTES = REGISTRY.add(Counter(
+    "ncm_terminal_output_bytes_total", "Shell output bytes received from devices"
+))
+INPUT_BYTES = REGISTRY.add(Counter(
+    "ncm_terminal_input_bytes_total", "Keystroke bytes sent to devices"
+))
+SESSION_OUTPUT_BYTES = REGISTRY.add(Histogram(
+    "ncm_session_output_bytes", "Shell output bytes over the lifetime of a session", BYTES_BUCKETS
+))
+SESSION_OUTPUT_HIGH_WATER = REGISTRY.add(Histogram(
+    "ncm_session_output_queue_high_water_bytes", "Most shell output a session ever had waiting for its WebSocket",
+    BYTES_BUCKETS
+))
+OUTPUT_BACKPRESSURE = REGISTRY.add(Counter(
+    "ncm_ws_output_backpressure_total", "Times a slow WebSocket filled its output queue, by what was done (pause, truncate)",
+    labelnames=("action",)
+))
+OUTPUT_FRAMES = REGISTRY.add(Counter(
+    "ncm_ws_output_frames_total", "Output frames built once per session (encoded) and sent to each WebSocket (sent)",
+    labelnames=("stage",)
+))
+WS_ATTACHES = REGISTRY.add(Counter(
+    "ncm_ws_attaches_total", "Terminal WebSockets attached, by whether they resumed from scrollback (new, resumed, partial)",
+    labelnames=("resume",)
+))
+OUTPUT_DROPPED_BYTES = REGISTRY.add(Counter(
+    "ncm_ws_output_dropped_bytes_total", "Shell output bytes dropped for slow WebSockets under the drop policy"
+))
+SESSIONS_CLOSED = REGISTRY.add(Counter(
+    "ncm_sessions_closed_total", "Sessions closed, by reason", labelnames=("reason",)
+))
@@ -0,0 +1,109 @@
+"""
+Pager handling for Monetx NCM SSH Emulator
+Answers --More-- style prompts on the server as soon as they arrive
+"""
+
+import logging
+import re
+from typing import Dict, Optional
+
+import paramiko
+
+logger = logging.getLogger(__name__)
+
+
+class PagerRule:
+    """How one vendor pages output and how to turn paging off"""
+
+    def __init__(self, vendor: str, prompt: bytes, reply: bytes, disable_command: str, max_prompt_len: int = 32):
+        self.vendor = vendor
+        self.prompt = prompt
+        self.reply = reply
+        self.disable_command = disable_command
+        self.max_prompt_len = max_prompt_len
+
+
+PAGER_RULES: Dict[str, PagerRule] = {
+    "cisco": PagerRule("cisco", rb"--More--", b" ", "terminal length 0\n"),
+    "arista": PagerRule("arista", rb"--More--", b" ", "terminal length 0\n"),
+    "juniper": PagerRule("juniper", rb"---\(more(?: \d{1,3}%)?\)---", b" ", "set cli screen-length 0\n"),
+    "huawei": PagerRule("huawei", rb"---- More ----", b" ", "screen-length 0 temporary\n"),
+}
+
+
+class PagerMatcher:
+    """Streaming pager prompt matcher
+
+    Keeps the last few bytes of each chunk so a prompt split across two
+    recv() calls is still found, and never reports the same prompt twice.
+    """
+
+    def __init__(self, vendor: Optional[str] = None):
+        self.set_vendor(vendor)
+
+    def set_vendor(self, vendor: Optional[str] = None):
+        """Restrict matching to one vendor's rule; None matches every vendor"""
+        rules = [PAGER_RULES[vendor]] if vendor in PAGER_RULES else list(PAGER_RULES.values())
+        self.vendor = vendor if vendor in PAGER_RULES else None
+        self.pattern = re.compile(b"|".join(b"(?:" + rule.prompt + b")" for rule in rules))
+        self.keep = max(rule.max_prompt_len for rule in rules) - 1
+        self.tail = b""
+
+    def feed(self, data: bytes) -> int:
+        """Number of new pager prompts completed by this chunk"""
+        window = self.tail + data
+        start = 0
+        found = 0
+        for match in self.pattern.finditer(window):
+            # Prompts that ended inside the carried tail were counted last time
+            if match.end() > len(self.tail):
+                found += 1
+            start = match.end()
+        self.tail = window[max(start, len(window) - self.keep):]
+        return found
+
+
+class PagerEngine:
+    """Answers pager prompts on a shell channel from the output pump"""
+
+    def __init__(self, shell: paramiko.Channel, vendor: Optional[str] = None, mode: str = "auto"):
+        self.shell = shell
+        self.matcher = PagerMatcher(vendor)
+        self.mode = mode
+        self.enabled = False
+        self.client_enabled = False
+        self.batch_enabled = False
+        self.pages = 0
+
+    def set_enabled(self, enabled: bool, batch: bool = False):
+        """Answer prompts only while a client or a running batch asks for it and the mode allows it
+
+        Clients and batches are tracked apart, so a batch finishing never
+        undoes a toggle a browser sent while it ran.
+        """
+        if batch:
+            self.batch_enabled = enabled
+        else:
+            self.client_enabled = enabled
+        self.enabled = (self.client_enabled or self.batch_enabled) and self.mode == "auto"
+
+    @property
+    def reply(self) -> bytes:
+        rule = PAGER_RULES.get(self.matcher.vendor)
+        return rule.reply if rule else b" "
+
+    def feed(self, data: bytes):
+        """Pump listener: reply to every prompt in this chunk"""
+        prompts = self.matcher.feed(data)
+        if prompts and self.enabled:
+            self.pages += prompts
+            try:
+                self.shell.send(self.reply * prompts)
+            except Exception as e:
+                logger.error(f"Pager reply failed: {str(e)}")
+
+
+def disable_paging_command(vendor: Optional[str]) -> Optional[str]:
+    """Command that turns paging off for this session, if the vendor is known"""
+    rule = PAGER_RULES.get((vendor or "").lower())
+    return rule.disable_command if rule else None
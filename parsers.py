@@ -0,0 +1,246 @@
+"""
+Structured output parsing for Monetx NCM SSH Emulator
+Turns show command output into records line by line, with precompiled per-vendor templates
+"""
+
+import logging
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+from batch import ANSI_ESCAPE
+
+logger = logging.getLogger(__name__)
+
+# What a server-answered --More-- leaves behind: the prompt and the backspaces that erase it
+PAGER_RESIDUE = re.compile(r"\s*--More--\s*|---\(more[^)]*\)---|\s*---- More ----|[\x08]+\s*[\x08]*")
+
+# Lines longer than this are cut, so one runaway line can't grow the buffer
+MAX_LINE = 65536
+
+
+class Rule:
+    """One line pattern of a template
+
+    ``action`` is what a match does: ``start`` begins a new record (emitting
+    the previous one), ``record`` fills and emits a one-line record at once,
+    ``fill`` adds fields to the current record, ``filldown`` ends the current
+    record and only sets the filldown fields for the records after it (e.g. a
+    wrapped line that names a prefix but leaves its next hops for the next).
+    """
+
+    def __init__(self, pattern: str, action: str = "fill"):
+        self.regex = re.compile(pattern)
+        self.action = action
+
+
+class Template:
+    """A TextFSM-style state machine for one command on one platform
+
+    ``filldown`` fields carry over from the previous record when a line
+    leaves them out (e.g. the prefix of an ECMP route's extra next hops).
+    """
+
+    def __init__(self, name: str, platforms: Sequence[str], command: str, rules: Sequence[Rule],
+                 filldown: Sequence[str] = (), numbers: Sequence[str] = ()):
+        self.name = name
+        self.platforms = tuple(platforms)
+        self.command = re.compile(command, re.IGNORECASE)
+        self.rules = list(rules)
+        self.filldown = tuple(filldown)
+        self.numbers = frozenset(numbers)
+
+    def parser(self) -> "StreamParser":
+        return StreamParser(self)
+
+
+class StreamParser:
+    """Feeds output through a template as it arrives
+
+    Only the unfinished last line and the record being built are held, so
+    memory stays flat however long the output is.
+    """
+
+    def __init__(self, template: Template):
+        self.template = template
+        self.partial = ""
+        self.current: Optional[Dict[str, Any]] = None
+        self.previous: Dict[str, Any] = {}
+        self.records = 0
+
+    def _convert(self, fields: Dict[str, str]) -> Dict[str, Any]:
+        return {
+            key: int(value) if key in self.template.numbers and value.isdigit() else value
+            for key, value in fields.items() if value is not None
+        }
+
+    def _emit(self, out: List[Dict[str, Any]]):
+        if self.current:
+            out.append(self.current)
+            self.previous = self.current
+            self.records += 1
+        self.current = None
+
+    def _new_record(self) -> Dict[str, Any]:
+        return {key: self.previous[key] for key in self.template.filldown if key in self.previous}
+
+    def _line(self, line: str, out: List[Dict[str, Any]]):
+        if "\x1b" in line:
+            line = ANSI_ESCAPE.sub("", line)
+        if "\x08" in line or "--" in line:
+            line = PAGER_RESIDUE.sub("", line)
+        if not line.strip():
+            return
+        for rule in self.template.rules:
+            match = rule.regex.match(line)
+            if match is None:
+                continue
+            fields = self._convert(match.groupdict())
+            if rule.action == "filldown":
+                self._emit(out)
+                self.previous = fields
+                return
+            if rule.action in ("start", "record"):
+                self._emit(out)
+                self.current = self._new_record()
+            elif self.current is None:
+                self.current = self._new_record()
+            self.current.update(fields)
+            if rule.action == "record":
+                self._emit(out)
+            return
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Records completed by this chunk of output"""
+        out: List[Dict[str, Any]] = []
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()[-MAX_LINE:]
+        for line in lines:
+            self._line(line[:MAX_LINE].rstrip("\r"), out)
+        return out
+
+    def close(self) -> List[Dict[str, Any]]:
+        """The last record, once the output has ended"""
+        out: List[Dict[str, Any]] = []
+        if self.partial:
+            self._line(self.partial, out)
+            self.partial = ""
+        self._emit(out)
+        return out
+
+
+IPV4 = r"\d{1,3}(?:\.\d{1,3}){3}"
+CISCO_NEXT_HOP = rf"via (?P<next_hop>{IPV4})(?:, (?P<uptime>[\w:.]+))?(?:, (?P<interface>\S+))?"
+
+TEMPLATES: List[Template] = [
+    Template(
+        "cisco_show_version", ("cisco", "arista"), r"^sh(?:o|ow)?\s+ver",
+        [
+            Rule(r"^Cisco IOS.*Version (?P<version>[^\s,]+)"),
+            Rule(r"^Arista (?P<model>\S+)"),
+            Rule(r"^Software image version: (?P<version>\S+)"),
+            Rule(r"^(?P<hostname>\S+) uptime is (?P<uptime>.+)$"),
+            Rule(r"^Uptime: (?P<uptime>.+)$"),
+            Rule(r"^[Cc]isco (?P<model>\S+) .*(?:processor|bytes of memory)"),
+            Rule(r"^Processor board ID (?P<serial>\S+)"),
+            Rule(r"^Serial number: (?P<serial>\S+)"),
+            Rule(r"^System image file is \"(?P<image>[^\"]+)\""),
+        ]
+    ),
+    Template(
+        "cisco_show_interfaces", ("cisco", "arista"), r"^sh(?:o|ow)?\s+int(?:e|er|erf|erfa|erfac|erface|erfaces)?\s*$",
+        [
+            Rule(r"^(?P<interface>\S+) is (?P<link_status>.+?), line protocol is (?P<protocol_status>\S+)", "start"),
+            Rule(r"^\s+Hardware is (?P<hardware>[^,]+)(?:, address is (?P<mac>\S+))?"),
+            Rule(r"^\s+Description: (?P<description>.*)$"),
+            Rule(r"^\s+Internet address is (?P<ip_address>\S+)"),
+            Rule(r"^\s+MTU (?P<mtu>\d+) bytes, BW (?P<bandwidth>\d+ [^,\s]+)"),
+            Rule(r"^\s+(?P<input_packets>\d+) packets input, (?P<input_bytes>\d+) bytes"),
+            Rule(r"^\s+(?P<output_packets>\d+) packets output, (?P<output_bytes>\d+) bytes"),
+            Rule(r"^\s+(?P<input_errors>\d+) input errors"),
+            Rule(r"^\s+(?P<output_errors>\d+) output errors"),
+        ],
+        numbers=("mtu", "input_packets", "input_bytes", "output_packets", "output_bytes",
+                 "input_errors", "output_errors")
+    ),
+    Template(
+        "cisco_show_ip_route", ("cisco", "arista"), r"^sh(?:o|ow)?\s+ip\s+ro(?:u|ut|ute)?\b",
+        [
+            Rule(rf"^(?P<protocol>[A-Z*][A-Za-z0-9*]*(?: [A-Z0-9]{{1,2}})?)\s+(?P<network>{IPV4}(?:/\d+)?)"
+                 rf" is directly connected, (?P<interface>\S+)", "record"),
+            Rule(rf"^(?P<protocol>[A-Z*][A-Za-z0-9*]*(?: [A-Z0-9]{{1,2}})?)\s+(?P<network>{IPV4}(?:/\d+)?)"
+                 rf"\s+\[(?P<distance>\d+)/(?P<metric>\d+)\] {CISCO_NEXT_HOP}", "record"),
+            # A prefix too long for one line; its next hops follow on the next
+            Rule(rf"^(?P<protocol>[A-Z*][A-Za-z0-9*]*(?: [A-Z0-9]{{1,2}})?)\s+(?P<network>{IPV4}(?:/\d+)?)\s*$",
+                 "filldown"),
+            # Further equal-cost next hops of the prefix above
+            Rule(rf"^\s+\[(?P<distance>\d+)/(?P<metric>\d+)\] {CISCO_NEXT_HOP}", "record"),
+        ],
+        filldown=("protocol", "network"),
+        numbers=("distance", "metric")
+    ),
+    Template(
+        "juniper_show_version", ("juniper",), r"^show\s+ver",
+        [
+            Rule(r"^Hostname: (?P<hostname>\S+)"),
+            Rule(r"^Model: (?P<model>\S+)"),
+            Rule(r"^Junos: (?P<version>\S+)"),
+            Rule(r"^JUNOS .*\[(?P<version>[^\]]+)\]"),
+        ]
+    ),
+    Template(
+        "juniper_show_interfaces_terse", ("juniper",), r"^show\s+int\w*\s+terse",
+        [
+            Rule(r"^(?P<interface>[a-z]{2,}[\w/.:-]*)\s+(?P<admin_status>up|down)\s+(?P<link_status>up|down)"
+                 r"(?:\s+(?P<protocol>\S+)\s+(?P<local_address>\S+))?", "record"),
+        ]
+    ),
+    Template(
+        "juniper_show_route", ("juniper",), r"^show\s+route\b",
+        [
+            Rule(rf"^(?P<network>{IPV4}/\d+)\s+[*+-]?\[(?P<protocol>\w+)/(?P<distance>\d+)\]"
+                 r"(?: (?P<age>\S+))?(?:, metric (?P<metric>\d+))?", "start"),
+            Rule(rf"^\s+>?\s*to (?P<next_hop>{IPV4}) via (?P<interface>\S+)"),
+            Rule(r"^\s+>\s*via (?P<interface>\S+)"),
+        ],
+        numbers=("distance", "metric")
+    ),
+    Template(
+        "huawei_display_version", ("huawei",), r"^dis(?:p|pl|pla|play)?\s+ver",
+        [
+            Rule(r"^VRP \(R\) software, Version (?P<version>\S+)(?: \((?P<model>\S+) (?P<release>[^)]+)\))?"),
+            Rule(r"^(?P<model>\S+) uptime is (?P<uptime>.+)$"),
+        ]
+    ),
+    Template(
+        "huawei_display_ip_routing_table", ("huawei",), r"^dis(?:p|pl|pla|play)?\s+ip\s+rou",
+        [
+            Rule(rf"^\s*(?P<network>{IPV4}/\d+)\s+(?P<protocol>\w+)\s+(?P<preference>\d+)\s+(?P<cost>\d+)"
+                 rf"\s+(?P<flags>[A-Z]*)\s+(?P<next_hop>{IPV4})\s+(?P<interface>\S+)", "record"),
+        ],
+        numbers=("preference", "cost")
+    ),
+    Template(
+        "linux_ip_route", ("linux",), r"^ip\s+(?:-4\s+)?r(?:o|ou|out|oute)?\b",
+        [
+            Rule(rf"^(?P<network>default|{IPV4}(?:/\d+)?)(?: via (?P<next_hop>{IPV4}))? dev (?P<interface>\S+)"
+                 r"(?:.*? proto (?P<protocol>\S+))?(?:.*? metric (?P<metric>\d+))?", "record"),
+        ],
+        numbers=("metric",)
+    ),
+]
+
+
+def find_template(platform: Optional[str], command: str) -> Optional[Template]:
+    """Template for this command on this platform (abbreviations allowed), if there is one"""
+    command = command.strip()
+    for template in TEMPLATES:
+        if platform in template.platforms and template.command.match(command):
+            return template
+    return None
+
+
+def list_templates() -> List[Dict[str, Any]]:
+    return [
+        {"name": template.name, "platforms": list(template.platforms), "command": template.command.pattern}
+        for template in TEMPLATES
+    ]
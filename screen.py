@@ -0,0 +1,112 @@
+"""
+Terminal screen model for Monetx NCM SSH Emulator
+Keeps what a VT100 would show for each session, so new viewers get a snapshot instead of the whole byte history
+"""
+
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from scrollback import ScrollbackBuffer
+
+try:
+    import pyte
+except ImportError:
+    pyte = None
+
+logger = logging.getLogger(__name__)
+
+# The PTY size open_device_shell asks for, until a client resizes it
+DEFAULT_COLUMNS = 80
+DEFAULT_LINES = 24
+
+# Bounds on what a client may resize the PTY to
+MAX_COLUMNS = 500
+MAX_LINES = 200
+
+
+def screen_available() -> bool:
+    return pyte is not None
+
+
+class SessionScreen:
+    """A pyte screen for one session, fed from its scrollback on demand
+
+    Emulating every byte as it arrives would cost every session CPU on the
+    event loop whether or not anyone looks at the screen, so the screen
+    only catches up with the scrollback when a snapshot or a diff is asked
+    for. Should it fall further behind than the scrollback holds, it is fed
+    what is left, which for line-oriented CLIs and for full-screen programs
+    that redraw still gives the current screen.
+
+    Diffs carry whole lines, taken from pyte's dirty set, so applying one
+    twice or after a later snapshot does no harm.
+    """
+
+    def __init__(self, scrollback: ScrollbackBuffer, columns: int = DEFAULT_COLUMNS, lines: int = DEFAULT_LINES):
+        self.scrollback = scrollback
+        self.screen = pyte.Screen(columns, lines)
+        self.stream = pyte.ByteStream(self.screen)
+        # Stream offset of the next byte the screen has not seen
+        self.offset = scrollback.start
+        self.skipped_bytes = 0
+
+    def update(self):
+        """Feed the screen whatever the scrollback has recorded since the last call"""
+        if self.offset >= self.scrollback.end:
+            return
+        data, start = self.scrollback.read(self.offset)
+        if start > self.offset:
+            self.skipped_bytes += start - self.offset
+        self.offset = start + len(data)
+        try:
+            self.stream.feed(data)
+        except Exception as e:
+            # A sequence pyte can't handle shouldn't end the session's screen
+            logger.error(f"Screen emulation error: {str(e)}")
+
+    def _cursor(self) -> Dict[str, int]:
+        return {"x": self.screen.cursor.x, "y": self.screen.cursor.y}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Every line of the screen as it stands, with the cursor and size"""
+        # The dirty set belongs to diff(), which every screen viewer shares
+        self.update()
+        return {
+            "columns": self.screen.columns,
+            "lines": self.screen.lines,
+            "cursor": self._cursor(),
+            "display": [line.rstrip() for line in self.screen.display]
+        }
+
+    def diff(self) -> Optional[Dict[str, Any]]:
+        """Lines changed since the last snapshot or diff as ``[row, text]`` pairs; None when nothing changed"""
+        self.update()
+        if not self.screen.dirty:
+            return None
+        display = self.screen.display
+        changes = [[row, display[row].rstrip()] for row in sorted(self.screen.dirty) if row < len(display)]
+        self.screen.dirty.clear()
+        return {"changes": changes, "cursor": self._cursor()}
+
+    def snapshot_message(self) -> str:
+        snapshot = self.snapshot()
+        return json.dumps({"type": "screen", "offset": self.offset, **snapshot})
+
+    def diff_message(self) -> Optional[str]:
+        changes = self.diff()
+        return json.dumps({"type": "screen-diff", "offset": self.offset, **changes}) if changes else None
+
+    def resize(self, columns: int, lines: int):
+        # Output so far was laid out at the old size
+        self.update()
+        self.screen.resize(lines=lines, columns=columns)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "columns": self.screen.columns,
+            "lines": self.screen.lines,
+            "offset": self.offset,
+            "behind_bytes": self.scrollback.end - self.offset,
+            "skipped_bytes": self.skipped_bytes
+        }
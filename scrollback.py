@@ -0,0 +1,59 @@
+"""
+Scrollback for Monetx NCM SSH Emulator
+Keeps the tail of each session's output in memory so a reconnecting browser gets only what it missed
+"""
+
+import logging
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ScrollbackBuffer:
+    """The last ``capacity`` bytes of one session's output, addressed by stream offset
+
+    Output is copied into one bytearray allocated up front, so recording a
+    chunk allocates nothing however long the session runs. Offsets count
+    every byte the device has sent since ``offset`` (the shell pump's
+    ``bytes_read`` when recording started).
+    """
+
+    def __init__(self, capacity: int, offset: int = 0):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.base = offset
+        # Stream offset just past the newest byte
+        self.end = offset
+
+    @property
+    def start(self) -> int:
+        """Offset of the oldest byte still held"""
+        return max(self.base, self.end - self.capacity)
+
+    def write(self, data: bytes):
+        """Pump listener: record a chunk, overwriting the oldest output"""
+        data = memoryview(data)
+        if len(data) > self.capacity:
+            # Only the tail can be kept; skip the rest without copying it
+            self.end += len(data) - self.capacity
+            data = data[-self.capacity:]
+        position = self.end % self.capacity
+        first = min(len(data), self.capacity - position)
+        self.view[position:position + first] = data[:first]
+        if first < len(data):
+            self.view[:len(data) - first] = data[first:]
+        self.end += len(data)
+
+    def read(self, offset: int, end: Optional[int] = None) -> Tuple[bytes, int]:
+        """Output from ``offset`` to ``end`` (the newest byte by default), and the offset it really starts at
+
+        The start moves forward when ``offset`` has already been overwritten.
+        """
+        end = self.end if end is None else min(max(end, self.start), self.end)
+        offset = min(max(offset, self.start), end)
+        size = end - offset
+        position = offset % self.capacity if self.capacity else 0
+        if position + size <= self.capacity:
+            return bytes(self.view[position:position + size]), offset
+        return bytes(self.view[position:]) + bytes(self.view[:size - (self.capacity - position)]), offset
@@ -0,0 +1,166 @@
+"""
+Idle and orphaned session reaping for Monetx NCM SSH Emulator
+Closes sessions nobody is using so their channels, pumps and transports are reclaimed
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SessionActivity:
+    """Last activity and current users of one session"""
+
+    def __init__(self):
+        self.last_activity = time.monotonic()
+        # WebSockets attached and batches running; a session with neither is orphaned
+        self.attached = 0
+        self.busy = 0
+        self.detached_at: Optional[float] = self.last_activity
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+
+class SessionReaper:
+    """Background task closing idle, orphaned and dead sessions
+
+    ``close_session(session_id, reason)`` does the actual teardown;
+    ``is_alive(session_id)`` reports whether the shell channel is still open.
+    """
+
+    def __init__(self, close_session: Callable[[str, str], Awaitable], is_alive: Callable[[str], bool],
+                 idle_timeout: float = 3600, orphan_timeout: float = 300, interval: float = 15,
+                 idle_after: float = 60):
+        self.close_session = close_session
+        self.is_alive = is_alive
+        self.idle_timeout = idle_timeout
+        # Only for reporting: quiet this long and a session counts as idle, long before it is reaped
+        self.idle_after = idle_after
+        self.orphan_timeout = orphan_timeout
+        self.interval = interval
+        self.sessions: Dict[str, SessionActivity] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {
+            "reaped_idle": 0,
+            "reaped_orphaned": 0,
+            "reaped_closed": 0,
+            "runs": 0
+        }
+
+    def track(self, session_id: str):
+        self.sessions[session_id] = SessionActivity()
+
+    def forget(self, session_id: str):
+        self.sessions.pop(session_id, None)
+
+    def touch(self, session_id: str):
+        activity = self.sessions.get(session_id)
+        if activity is not None:
+            activity.touch()
+
+    def attach(self, session_id: str):
+        activity = self.sessions.get(session_id)
+        if activity is not None:
+            activity.attached += 1
+            activity.detached_at = None
+            activity.touch()
+
+    def detach(self, session_id: str):
+        activity = self.sessions.get(session_id)
+        if activity is not None:
+            activity.attached = max(0, activity.attached - 1)
+            if activity.attached == 0 and activity.busy == 0:
+                activity.detached_at = time.monotonic()
+
+    def begin_work(self, session_id: str):
+        """A batch started; the session is in use even without a browser"""
+        activity = self.sessions.get(session_id)
+        if activity is not None:
+            activity.busy += 1
+            activity.detached_at = None
+            activity.touch()
+
+    def end_work(self, session_id: str):
+        activity = self.sessions.get(session_id)
+        if activity is not None:
+            activity.busy = max(0, activity.busy - 1)
+            activity.touch()
+            if activity.attached == 0 and activity.busy == 0:
+                activity.detached_at = time.monotonic()
+
+    def reason_to_reap(self, session_id: str, activity: SessionActivity, now: float) -> Optional[str]:
+        if not self.is_alive(session_id):
+            return "closed"
+        if activity.busy:
+            return None
+        if now - activity.last_activity > self.idle_timeout:
+            return "idle"
+        if activity.detached_at is not None and now - activity.detached_at > self.orphan_timeout:
+            return "orphaned"
+        return None
+
+    def count_by_activity(self) -> Dict[Tuple[str, str], int]:
+        """Sessions by (attached or detached, active or idle)
+
+        A session is active while a batch runs on it or it saw activity in the
+        last ``idle_after`` seconds.
+        """
+        now = time.monotonic()
+        counts = {(state, use): 0 for state in ("attached", "detached") for use in ("active", "idle")}
+        for activity in self.sessions.values():
+            state = "attached" if activity.attached else "detached"
+            idle = not activity.busy and now - activity.last_activity > self.idle_after
+            counts[(state, "idle" if idle else "active")] += 1
+        return counts
+
+    async def reap(self) -> int:
+        """One sweep; returns how many sessions were closed"""
+        now = time.monotonic()
+        self.stats["runs"] += 1
+        doomed = [
+            (session_id, reason)
+            for session_id, activity in list(self.sessions.items())
+            for reason in [self.reason_to_reap(session_id, activity, now)]
+            if reason is not None
+        ]
+        for session_id, reason in doomed:
+            logger.info(f"Reaping {reason} session {session_id}")
+            try:
+                await self.close_session(session_id, reason)
+                self.stats[f"reaped_{reason}"] += 1
+            except Exception as e:
+                logger.error(f"Error reaping session {session_id}: {str(e)}")
+            self.forget(session_id)
+        return len(doomed)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Session reaper sweep failed: {str(e)}")
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "tracked": len(self.sessions),
+            "attached": sum(1 for activity in self.sessions.values() if activity.attached),
+            "busy": sum(1 for activity in self.sessions.values() if activity.busy),
+            "idle_timeout": self.idle_timeout,
+            "idle_after": self.idle_after,
+            "orphan_timeout": self.orphan_timeout
+        }
@@ -0,0 +1,271 @@
+"""
+Session registry for Monetx NCM SSH Emulator
+Records which worker owns each SSH session so several uvicorn workers can share the load
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SessionRegistry:
+    """In-process registry: every session lives in this worker
+
+    Records are plain dicts with at least ``session_id`` and ``worker_id``;
+    credentials are never stored. Sessions are also indexed by ``user_id``
+    and ``device_id``, so per-user and per-device lookups don't scan.
+    """
+
+    def __init__(self, worker_id: Optional[str] = None, worker_url: str = ""):
+        self.worker_id = worker_id or default_worker_id()
+        self.worker_url = worker_url.rstrip("/")
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        # user_id / device_id -> {session_id: record}, in registration order
+        self.by_user: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.by_device: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def _index(self, record: Dict[str, Any]):
+        for index, key in ((self.by_user, record.get("user_id")), (self.by_device, record.get("device_id"))):
+            if key is not None:
+                index.setdefault(key, {})[record["session_id"]] = record
+
+    def _unindex(self, record: Dict[str, Any]):
+        for index, key in ((self.by_user, record.get("user_id")), (self.by_device, record.get("device_id"))):
+            entries = index.get(key)
+            if entries is not None:
+                entries.pop(record["session_id"], None)
+                if not entries:
+                    del index[key]
+
+    def _matching(self, user_id: Optional[str], device_id: Optional[str]) -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+        """The smallest index bucket covering the filters, and the filter it still leaves to check"""
+        if user_id is None and device_id is None:
+            return self.sessions, None
+        if device_id is None:
+            return self.by_user.get(user_id, {}), None
+        if user_id is None:
+            return self.by_device.get(device_id, {}), None
+        users, devices = self.by_user.get(user_id, {}), self.by_device.get(device_id, {})
+        return (users, "device_id") if len(users) <= len(devices) else (devices, "user_id")
+
+    async def start(self):
+        """Begin advertising this worker"""
+
+    async def register(self, session_id: str, **fields) -> Dict[str, Any]:
+        record = {
+            **fields,
+            "session_id": session_id,
+            "worker_id": self.worker_id,
+            "worker_url": self.worker_url,
+            "created_at": time.time()
+        }
+        previous = self.sessions.get(session_id)
+        if previous is not None:
+            self._unindex(previous)
+        self.sessions[session_id] = record
+        self._index(record)
+        return record
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return self.sessions.get(session_id)
+
+    async def update(self, session_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """Add fields to a local session's record; None if it is gone"""
+        record = self.sessions.get(session_id)
+        if record is None:
+            return None
+        self._unindex(record)
+        record.update(fields)
+        self._index(record)
+        return record
+
+    async def unregister(self, session_id: str):
+        record = self.sessions.pop(session_id, None)
+        if record is not None:
+            self._unindex(record)
+
+    async def list_sessions(self, user_id: Optional[str] = None, device_id: Optional[str] = None,
+                            limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """Sessions matching the filters in registration order, one page of them when ``limit`` is set"""
+        candidates, check = self._matching(user_id, device_id)
+        records = iter(candidates.values())
+        if check is not None:
+            wanted = {"user_id": user_id, "device_id": device_id}[check]
+            records = (record for record in records if record.get(check) == wanted)
+        stop = None if limit is None else offset + limit
+        return list(itertools.islice(records, offset, stop))
+
+    async def count_sessions(self, user_id: Optional[str] = None, device_id: Optional[str] = None) -> int:
+        candidates, check = self._matching(user_id, device_id)
+        if check is None:
+            return len(candidates)
+        wanted = {"user_id": user_id, "device_id": device_id}[check]
+        return sum(1 for record in candidates.values() if record.get(check) == wanted)
+
+    def is_local(self, record: Dict[str, Any]) -> bool:
+        return record.get("worker_id") == self.worker_id
+
+    async def close(self):
+        """Forget this worker's sessions"""
+        self.sessions.clear()
+        self.by_user.clear()
+        self.by_device.clear()
+
+
+class SQLiteSessionRegistry(SessionRegistry):
+    """Registry shared by the workers on one host through a SQLite file in WAL mode
+
+    Each worker heartbeats a row in ``workers``; sessions of workers that
+    stopped heartbeating (crashed or killed) drop out of listings and are
+    purged by the next live worker.
+    """
+
+    def __init__(self, path: str, worker_id: Optional[str] = None, worker_url: str = "",
+                 heartbeat_interval: float = 10.0):
+        super().__init__(worker_id, worker_url)
+        self.path = path
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS workers ("
+            "worker_id TEXT PRIMARY KEY, worker_url TEXT, heartbeat REAL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, worker_id TEXT NOT NULL, user_id TEXT, device_id TEXT, "
+            "record TEXT NOT NULL)"
+        )
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(sessions)")]
+        if "device_id" not in columns:
+            # Registry files created before sessions were indexed by device
+            self.db.execute("ALTER TABLE sessions ADD COLUMN device_id TEXT")
+        self.db.execute("CREATE INDEX IF NOT EXISTS sessions_worker ON sessions (worker_id)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS sessions_user ON sessions (user_id)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS sessions_device ON sessions (device_id)")
+
+    async def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        # One connection per worker; the lock keeps statements from interleaving
+        async with self._lock:
+            return await asyncio.to_thread(lambda: self.db.execute(sql, params).fetchall())
+
+    @property
+    def _live_after(self) -> float:
+        return time.time() - 3 * self.heartbeat_interval
+
+    async def _heartbeat(self):
+        await self._execute(
+            "INSERT INTO workers (worker_id, worker_url, heartbeat) VALUES (?, ?, ?) "
+            "ON CONFLICT(worker_id) DO UPDATE SET worker_url = excluded.worker_url, heartbeat = excluded.heartbeat",
+            (self.worker_id, self.worker_url, time.time())
+        )
+        # Sessions of workers that died without cleaning up
+        dead = await self._execute("SELECT worker_id FROM workers WHERE heartbeat < ?", (self._live_after,))
+        for (worker_id,) in dead:
+            logger.warning(f"Purging sessions of unresponsive worker {worker_id}")
+            await self._execute("DELETE FROM sessions WHERE worker_id = ?", (worker_id,))
+            await self._execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self._heartbeat()
+            except Exception as e:
+                logger.error(f"Session registry heartbeat failed: {str(e)}")
+
+    async def start(self):
+        # A restarted worker may reuse the id of its previous incarnation
+        await self._execute("DELETE FROM sessions WHERE worker_id = ?", (self.worker_id,))
+        await self._heartbeat()
+        if self.heartbeat_task is None:
+            self.heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"Session registry {self.path}: worker {self.worker_id} at {self.worker_url or 'no URL'}")
+
+    async def register(self, session_id: str, **fields) -> Dict[str, Any]:
+        record = await super().register(session_id, **fields)
+        await self._execute(
+            "INSERT OR REPLACE INTO sessions (session_id, worker_id, user_id, device_id, record) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (session_id, self.worker_id, record.get("user_id"), record.get("device_id"), json.dumps(record))
+        )
+        return record
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        record = self.sessions.get(session_id)
+        if record is not None:
+            return record
+        rows = await self._execute(
+            "SELECT s.record FROM sessions s JOIN workers w ON w.worker_id = s.worker_id "
+            "WHERE s.session_id = ? AND w.heartbeat >= ?",
+            (session_id, self._live_after)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    async def update(self, session_id: str, **fields) -> Optional[Dict[str, Any]]:
+        record = await super().update(session_id, **fields)
+        if record is not None:
+            await self._execute(
+                "UPDATE sessions SET user_id = ?, device_id = ?, record = ? WHERE session_id = ?",
+                (record.get("user_id"), record.get("device_id"), json.dumps(record), session_id)
+            )
+        return record
+
+    async def unregister(self, session_id: str):
+        await super().unregister(session_id)
+        await self._execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _where(self, user_id: Optional[str], device_id: Optional[str]) -> Tuple[str, tuple]:
+        sql = " FROM sessions s JOIN workers w ON w.worker_id = s.worker_id WHERE w.heartbeat >= ?"
+        params: tuple = (self._live_after,)
+        if user_id is not None:
+            sql += " AND s.user_id = ?"
+            params += (user_id,)
+        if device_id is not None:
+            sql += " AND s.device_id = ?"
+            params += (device_id,)
+        return sql, params
+
+    async def list_sessions(self, user_id: Optional[str] = None, device_id: Optional[str] = None,
+                            limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        where, params = self._where(user_id, device_id)
+        sql = "SELECT s.record" + where + " ORDER BY s.rowid LIMIT ? OFFSET ?"
+        params += (-1 if limit is None else limit, offset)
+        return [json.loads(row[0]) for row in await self._execute(sql, params)]
+
+    async def count_sessions(self, user_id: Optional[str] = None, device_id: Optional[str] = None) -> int:
+        where, params = self._where(user_id, device_id)
+        return (await self._execute("SELECT COUNT(*)" + where, params))[0][0]
+
+    async def close(self):
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+        await super().close()
+        await self._execute("DELETE FROM sessions WHERE worker_id = ?", (self.worker_id,))
+        await self._execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+        self.db.close()
+
+
+def create_registry(url: str, worker_id: Optional[str] = None, worker_url: str = "") -> SessionRegistry:
+    """Registry for ``memory`` (single worker) or ``sqlite:///path/to/sessions.db``"""
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionRegistry(url[len("sqlite:///"):], worker_id, worker_url)
+    if url not in ("", "memory"):
+        logger.warning(f"Unknown SESSION_REGISTRY_URL {url!r}, using in-process registry")
+    return SessionRegistry(worker_id, worker_url)
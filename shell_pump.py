@@ -0,0 +1,300 @@
+"""
+Shell output pump for Monetx NCM SSH Emulator
+Pushes channel output into asyncio as soon as it arrives instead of polling recv_ready()
+"""
+
+import asyncio
+import codecs
+import logging
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import paramiko
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("pause", "drop")
+
+
+def output_decoder() -> codecs.IncrementalDecoder:
+    """UTF-8 decoder that carries partial characters across recv() boundaries"""
+    return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+class ShellPump:
+    """Readiness-driven reader for one interactive shell channel
+
+    The channel's event pipe is registered with the event loop, so an idle
+    session costs nothing until the device writes. Loops without add_reader
+    support (e.g. the Windows proactor) fall back to a reader thread.
+
+    Queued output can be bounded with ``set_limit`` while a slow consumer
+    reads it: ``pause`` stops reading the channel until the queue is half
+    drained, so SSH flow control holds the device back; ``drop`` discards
+    what doesn't fit and queues one truncation marker in its place.
+    Listeners always see every byte either way.
+
+    ``read_offset`` is how far into the device's output the queue reader has
+    got, counting dropped bytes as passed; it lines up with ``bytes_read``
+    and with scrollback recorded from the start of the session.
+
+    With ``queueing`` off, output only goes to listeners; sessions turn it
+    on while a browser reads the queue, so a detached session or a batch
+    job holds no output in memory beyond what its listeners keep. A
+    listener that buffers output for a slow consumer can ``hold`` the pump
+    the same way a full queue pauses it, until it calls ``release``.
+    """
+
+    def __init__(self, shell: paramiko.Channel, chunk_size: int = 32768, queueing: bool = True):
+        self.shell = shell
+        self.chunk_size = chunk_size
+        self.queueing = queueing
+        # (chunk, stream offset just past it)
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.listeners: List[Callable[[bytes], None]] = []
+        self.closed = False
+        self.bytes_read = 0
+        self.read_offset = 0
+        self.queued_bytes = 0
+        self.max_queued: Optional[int] = None
+        self.policy = "pause"
+        self.paused = False
+        self.dropping = 0
+        self.holds: Set[Any] = set()
+        self.stats = {"high_water": 0, "pauses": 0, "paused_seconds": 0.0, "dropped_bytes": 0, "truncations": 0}
+        self._paused_at = 0.0
+        self._resume = threading.Event()
+        self._resume.set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._fd: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Begin delivering output; must be called from the event loop"""
+        self.loop = asyncio.get_running_loop()
+        try:
+            self._fd = self.shell.fileno()
+            self.loop.add_reader(self._fd, self._on_readable)
+        except NotImplementedError:
+            self._fd = None
+            self._thread = threading.Thread(target=self._read_thread, name="shell-pump", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop reading; pending readers receive end-of-stream"""
+        if self._fd is not None and self.loop is not None:
+            self.loop.remove_reader(self._fd)
+            self._fd = None
+        self._resume.set()
+        self._finish()
+
+    def set_limit(self, max_bytes: Optional[int], policy: str = "pause"):
+        """Bound the queued output to ``max_bytes`` with this overflow policy, or lift the bound with None"""
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.max_queued = max_bytes
+        self.policy = policy
+        if self.dropping and (max_bytes is None or policy != "drop"):
+            self._flush_truncation(self.bytes_read)
+        if self.paused and not self.holds and (max_bytes is None or policy != "pause"):
+            self._unpause()
+
+    def set_queueing(self, enabled: bool):
+        """Start queueing output for a reader, or stop and forget what is queued once it has gone"""
+        self.queueing = enabled
+        if not enabled:
+            self.set_limit(None)
+            self.discard()
+
+    def hold(self, holder: Any):
+        """Stop reading the channel on behalf of ``holder`` until it calls ``release``"""
+        self.holds.add(holder)
+        if not self.paused and not self.closed:
+            self._pause()
+
+    def release(self, holder: Any):
+        """Drop ``holder``'s hold; reading resumes once nothing else holds the pump back"""
+        if holder not in self.holds:
+            return
+        self.holds.discard(holder)
+        queue_full = self.max_queued is not None and self.policy == "pause" \
+            and self.queued_bytes > self.max_queued // 2
+        if self.paused and not self.holds and not queue_full:
+            self._unpause()
+
+    def _pause(self):
+        self.paused = True
+        self.stats["pauses"] += 1
+        metrics.OUTPUT_BACKPRESSURE.inc(action="pause")
+        self._paused_at = time.monotonic()
+        if self._fd is not None:
+            self.loop.remove_reader(self._fd)
+        else:
+            self._resume.clear()
+
+    def _unpause(self):
+        self.paused = False
+        self.stats["paused_seconds"] += time.monotonic() - self._paused_at
+        if self._fd is not None:
+            # The event pipe stays readable while paramiko holds data, so this fires at once if any is waiting
+            self.loop.add_reader(self._fd, self._on_readable)
+        else:
+            self._resume.set()
+
+    def _enqueue(self, data: bytes, end: int):
+        self.queued_bytes += len(data)
+        if self.queued_bytes > self.stats["high_water"]:
+            self.stats["high_water"] = self.queued_bytes
+        self.queue.put_nowait((data, end))
+
+    def _flush_truncation(self, end: int):
+        """Queue the marker for output dropped so far (up to offset ``end``), once there is room again"""
+        marker = f"\r\n[output truncated: {self.dropping} bytes dropped]\r\n".encode()
+        self.dropping = 0
+        self.stats["truncations"] += 1
+        self._enqueue(marker, end)
+
+    def _take(self, item) -> bytes:
+        """Account for a chunk leaving the queue"""
+        data, self.read_offset = item
+        self.queued_bytes -= len(data)
+        if self.paused and not self.holds and self.queued_bytes <= (self.max_queued or 0) // 2:
+            self._unpause()
+        if self.dropping and self.queue.empty():
+            self._flush_truncation(self.bytes_read)
+        return data
+
+    def discard(self):
+        """Forget queued output, e.g. when a reattaching reader gets it from scrollback instead"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queued_bytes = 0
+        self.dropping = 0
+        self.read_offset = self.bytes_read
+        if self.paused and not self.holds:
+            self._unpause()
+        if self.closed:
+            self.queue.put_nowait((b"", self.bytes_read))
+
+    async def read(self) -> bytes:
+        """Next chunk of output, or b'' once the channel has closed"""
+        if self.closed and self.queue.empty():
+            return b""
+        return self._take(await self.queue.get())
+
+    async def read_batch(self, max_bytes: int = 65536, window: float = 0.005, bulk_threshold: int = 1024) -> bytes:
+        """Next output coalesced into one buffer
+
+        Small interactive chunks (echo, prompts) are returned immediately.
+        Once a chunk looks like bulk output, further chunks are collected for
+        up to ``window`` seconds or until ``max_bytes`` is reached.
+        """
+        data = await self.read()
+        chunks = [data]
+        size = len(data)
+        deadline = None
+        while data and size < max_bytes:
+            if not self.queue.empty():
+                data = self._take(self.queue.get_nowait())
+            elif size < bulk_threshold or self.closed:
+                break
+            else:
+                if deadline is None:
+                    deadline = self.loop.time() + window
+                timeout = deadline - self.loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    data = self._take(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            chunks.append(data)
+            size += len(data)
+        return b"".join(chunks)
+
+    def _on_readable(self):
+        chunks = []
+        # Under the pause policy read no more than the queue has room for
+        room = self.max_queued - self.queued_bytes if self.max_queued is not None and self.policy == "pause" else None
+        try:
+            while self.shell.recv_ready():
+                chunks.append(self.shell.recv(self.chunk_size))
+                if room is not None:
+                    room -= len(chunks[-1])
+                    if room <= 0:
+                        break
+        except Exception as e:
+            logger.error(f"Shell pump read error: {str(e)}")
+        if chunks:
+            self._dispatch(b"".join(chunks))
+        elif self.shell.closed or self.shell.eof_received:
+            self.stop()
+
+    def _read_thread(self):
+        while not self.closed:
+            self._resume.wait()
+            try:
+                data = self.shell.recv(self.chunk_size)
+            except socket.timeout:
+                continue
+            except Exception as e:
+                logger.error(f"Shell pump read error: {str(e)}")
+                data = b""
+            if not data:
+                self.loop.call_soon_threadsafe(self._finish)
+                return
+            self.loop.call_soon_threadsafe(self._dispatch, data)
+
+    def _dispatch(self, data: bytes):
+        if self.closed:
+            return
+        start = self.bytes_read
+        self.bytes_read += len(data)
+        for listener in list(self.listeners):
+            listener(data)
+        if not self.queueing:
+            # Nobody reads the queue, so the output counts as passed
+            self.read_offset = self.bytes_read
+            return
+        if self.max_queued is not None and self.policy == "drop":
+            room = self.max_queued - self.queued_bytes
+            if self.dropping and room > 0:
+                self._flush_truncation(start)
+                room = self.max_queued - self.queued_bytes
+            if len(data) > room:
+                # Keep what fits; the rest is counted into one marker
+                if not self.dropping:
+                    metrics.OUTPUT_BACKPRESSURE.inc(action="truncate")
+                overflow = len(data) - max(room, 0)
+                self.dropping += overflow
+                self.stats["dropped_bytes"] += overflow
+                metrics.OUTPUT_DROPPED_BYTES.inc(overflow)
+                data = data[:max(room, 0)]
+                if not data:
+                    return
+        self._enqueue(data, start + len(data))
+        if self.max_queued is not None and self.policy == "pause" and not self.paused \
+                and self.queued_bytes >= self.max_queued and not self.closed:
+            self._pause()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "paused_seconds": round(self.stats["paused_seconds"], 3),
+            "queued_bytes": self.queued_bytes,
+            "paused": self.paused,
+            "holds": len(self.holds),
+            "max_queued": self.max_queued,
+            "policy": self.policy
+        }
+
+    def _finish(self):
+        if not self.closed:
+            self.closed = True
+            if self.dropping:
+                self._flush_truncation(self.bytes_read)
+            self.queue.put_nowait((b"", self.bytes_read))
@@ -0,0 +1,417 @@
+"""
+Network device simulator for Monetx NCM SSH Emulator
+A local SSH server that answers like Cisco, Junos and Huawei CLIs, for load tests and demos without real routers
+"""
+
+import argparse
+import logging
+import random
+import re
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+import paramiko
+
+logger = logging.getLogger(__name__)
+
+# Username prefix that picks the vendor, e.g. "juniper-12" logs in to vmx12
+USERNAME = re.compile(r"^(?P<vendor>[a-z]+)(?:-(?P<index>\w+))?$")
+
+
+class DeviceProfile:
+    """How one vendor's CLI looks: banner, prompt, pager and error messages
+
+    ``pager_erase`` is what the device sends after a key answers the pager,
+    to wipe the prompt off the line. ``disable_paging`` matches the command
+    that turns paging off for the rest of the session.
+    """
+
+    def __init__(self, vendor: str, hostname: str, banner: str, prompt: str, pager: str, pager_erase: str,
+                 disable_paging: str, invalid: str, commands: Dict[str, str]):
+        self.vendor = vendor
+        self.hostname = hostname
+        self.banner = banner
+        self.prompt = prompt
+        self.pager = pager
+        self.pager_erase = pager_erase
+        self.disable_paging = re.compile(disable_paging, re.IGNORECASE)
+        self.invalid = invalid
+        # Command pattern to the name of the output it produces
+        self.commands = [(re.compile(pattern, re.IGNORECASE), output) for pattern, output in commands.items()]
+
+    def output_for(self, command: str) -> Optional[str]:
+        for pattern, output in self.commands:
+            if pattern.match(command):
+                return output
+        return None
+
+
+PROFILES: Dict[str, DeviceProfile] = {
+    "cisco": DeviceProfile(
+        "cisco", "Router",
+        banner="\r\nCisco IOS Software, C2900 Software (C2900-UNIVERSALK9-M), Version 15.7(3)M5, RELEASE SOFTWARE (fc1)\r\n"
+               "\r\nUser Access Verification\r\n\r\n",
+        prompt="{hostname}#",
+        pager=" --More-- ",
+        pager_erase="\x08" * 10 + " " * 10 + "\x08" * 10,
+        disable_paging=r"^term(?:i|in|ina|inal)?\s+len(?:g|gt|gth)?\s+0$",
+        invalid="% Invalid input detected at '^' marker.\r\n",
+        commands={
+            r"^sh(?:o|ow)?\s+ver": "version",
+            r"^sh(?:o|ow)?\s+ip\s+ro(?:u|ut|ute)?\b": "routes",
+            r"^sh(?:o|ow)?\s+run": "config",
+        }
+    ),
+    "juniper": DeviceProfile(
+        "juniper", "vmx",
+        banner="--- JUNOS 21.4R3-S2.3 Kernel 64-bit  JNPR-12.1-20220816.6f2f5ba_buil\r\n",
+        prompt="{username}@{hostname}> ",
+        pager="---(more)---",
+        pager_erase="\r" + " " * 12 + "\r",
+        disable_paging=r"^set\s+cli\s+screen-length\s+0$",
+        invalid="syntax error.\r\n",
+        commands={
+            r"^show\s+ver": "version",
+            r"^show\s+route\b": "routes",
+            r"^show\s+conf": "config",
+        }
+    ),
+    "huawei": DeviceProfile(
+        "huawei", "HUAWEI",
+        banner="\r\nInfo: The max number of VTY users is 10, and the number\r\n"
+               "      of current VTY users on line is 1.\r\n"
+               "Huawei Versatile Routing Platform Software\r\n",
+        prompt="<{hostname}>",
+        pager="  ---- More ----",
+        pager_erase="\x1b[16D" + " " * 16 + "\x1b[16D",
+        disable_paging=r"^screen-length\s+0\s+temp",
+        invalid="Error: Unrecognized command found at '^' position.\r\n",
+        commands={
+            r"^dis(?:p|pl|pla|play)?\s+ver": "version",
+            r"^dis(?:p|pl|pla|play)?\s+ip\s+rou": "routes",
+            r"^dis(?:p|pl|pla|play)?\s+cu": "config",
+        }
+    ),
+}
+
+EXIT_COMMANDS = ("exit", "quit", "logout")
+
+
+def version_output(vendor: str, hostname: str) -> List[str]:
+    if vendor == "juniper":
+        return [f"Hostname: {hostname}", "Model: vmx", "Junos: 21.4R3-S2.3"]
+    if vendor == "huawei":
+        return ["Huawei Versatile Routing Platform Software",
+                "VRP (R) software, Version 8.180 (NE40E V800R011C00SPC200)",
+                f"{hostname} uptime is 42 days, 3 hours, 12 minutes"]
+    return ["Cisco IOS Software, C2900 Software (C2900-UNIVERSALK9-M), Version 15.7(3)M5, RELEASE SOFTWARE (fc1)",
+            f"{hostname} uptime is 6 weeks, 2 days, 4 hours, 12 minutes",
+            "System image file is \"flash0:c2900-universalk9-mz.SPA.157-3.M5.bin\"",
+            "Cisco CISCO2911/K9 (revision 1.0) with 483328K/40960K bytes of memory.",
+            "Processor board ID FTX1840ALBN"]
+
+
+def route_output(vendor: str, routes: int) -> List[str]:
+    lines = []
+    for i in range(routes):
+        network = f"10.{i // 256}.{i % 256}.0/24"
+        next_hop = f"192.0.2.{i % 250 + 1}"
+        if vendor == "juniper":
+            lines.append(f"{network:<19}*[OSPF/10] 00:42:17, metric {i % 100}")
+            lines.append(f"                    >  to {next_hop} via ge-0/0/{i % 8}.0")
+        elif vendor == "huawei":
+            lines.append(f"  {network:<18} OSPF    10   {i % 100:<5} D   {next_hop:<15} GigabitEthernet0/0/{i % 8}")
+        else:
+            lines.append(f"O        {network} [110/{i % 100}] via {next_hop}, 1w2d, GigabitEthernet0/{i % 8}")
+    if vendor == "cisco":
+        return ["Codes: C - connected, S - static, O - OSPF", ""] + lines
+    if vendor == "huawei":
+        return ["Route Flags: R - relay, D - download to fib", "",
+                "Destination/Mask    Proto   Pre  Cost      Flags NextHop         Interface", ""] + lines
+    return ["inet.0: {} destinations, {} routes (active)".format(routes, routes), ""] + lines
+
+
+def config_output(vendor: str, hostname: str, lines: int) -> List[str]:
+    """About ``lines`` lines of configuration, built from per-interface blocks"""
+    if vendor == "juniper":
+        out = ["## Last commit: 2024-05-01 10:00:00 UTC by admin", "version 21.4R3-S2.3;",
+               "system {", f"    host-name {hostname};", "}", "interfaces {"]
+        block = ["    ge-0/0/{i} {{", "        description \"uplink {i}\";", "        unit 0 {{",
+                 "            family inet {{", "                address 10.{a}.{b}.1/30;", "            }}",
+                 "        }}", "    }}"]
+        tail = ["}"]
+    elif vendor == "huawei":
+        out = ["!Software Version V800R011C00SPC200", "#", f" sysname {hostname}", "#"]
+        block = ["interface GigabitEthernet0/0/{i}", " description uplink {i}",
+                 " ip address 10.{a}.{b}.1 255.255.255.252", "#"]
+        tail = ["return"]
+    else:
+        out = ["Building configuration...", "", "Current configuration : 123456 bytes", "!",
+               "version 15.7", f"hostname {hostname}", "!"]
+        block = ["interface GigabitEthernet0/{i}", " description uplink {i}",
+                 " ip address 10.{a}.{b}.1 255.255.255.252", " no shutdown", "!"]
+        tail = ["end"]
+    i = 0
+    while len(out) < lines:
+        out.extend(line.format(i=i, a=i // 256 % 256, b=i % 256) for line in block)
+        i += 1
+    return out + tail
+
+
+class DeviceShell:
+    """One interactive CLI session on a shell channel, run on its own thread
+
+    Echoes keystrokes, answers commands after the injected latency and pages
+    long output until the client turns paging off.
+    """
+
+    def __init__(self, simulator: "DeviceSimulator", channel: paramiko.Channel, profile: DeviceProfile,
+                 username: str, hostname: str):
+        self.simulator = simulator
+        self.channel = channel
+        self.profile = profile
+        self.username = username
+        self.hostname = hostname
+        self.prompt = profile.prompt.format(username=username, hostname=hostname)
+        self.paging = True
+
+    def run(self):
+        try:
+            self.write(self.profile.banner + self.prompt)
+            line = ""
+            last = ""
+            while True:
+                data = self.channel.recv(4096)
+                if not data:
+                    return
+                for char in data.decode("utf-8", errors="replace"):
+                    if char == "\n" and last == "\r":
+                        last = char
+                        continue
+                    last = char
+                    if char in "\r\n":
+                        self.write("\r\n")
+                        if not self.execute(line.strip()):
+                            return
+                        line = ""
+                    elif char in "\x7f\x08":
+                        if line:
+                            line = line[:-1]
+                            self.write("\x08 \x08")
+                    elif char == "\x03":
+                        line = ""
+                        self.write("^C\r\n" + self.prompt)
+                    elif char >= " ":
+                        line += char
+                        self.write(char)
+        except (OSError, EOFError, paramiko.SSHException) as e:
+            logger.debug(f"Simulated session ended: {str(e)}")
+        finally:
+            self.channel.close()
+
+    def execute(self, command: str) -> bool:
+        """Answer one command line; False when it ends the session"""
+        self.simulator.stats["commands"] += 1
+        if command in EXIT_COMMANDS:
+            return False
+        if command:
+            self.simulator.delay()
+        if not command:
+            lines = []
+        elif self.profile.disable_paging.match(command):
+            self.paging = False
+            lines = []
+        else:
+            output = self.profile.output_for(command)
+            if output == "version":
+                lines = version_output(self.profile.vendor, self.hostname)
+            elif output == "routes":
+                lines = route_output(self.profile.vendor, self.simulator.routes)
+            elif output == "config":
+                lines = config_output(self.profile.vendor, self.hostname, self.simulator.config_lines)
+            else:
+                lines = None
+        if lines is None:
+            self.write(self.profile.invalid)
+        else:
+            self.send_lines(lines)
+        self.write(self.prompt)
+        return True
+
+    def send_lines(self, lines: List[str]):
+        page = self.simulator.page_lines if self.paging else 0
+        if not page or len(lines) <= page:
+            self.send_block(lines)
+            return
+        for start in range(0, len(lines), page):
+            self.send_block(lines[start:start + page])
+            if start + page >= len(lines):
+                return
+            self.write(self.profile.pager)
+            key = self.channel.recv(1)
+            self.write(self.profile.pager_erase)
+            if not key or key in (b"q", b"Q", b"\x03"):
+                self.write("\r\n")
+                return
+
+    def write(self, text: str):
+        self.channel.sendall(text.encode())
+
+    def send_block(self, lines: List[str]):
+        if lines:
+            self.write("\r\n".join(lines) + "\r\n")
+
+
+class SimulatedServer(paramiko.ServerInterface):
+    """Accepts any password; the username picks the vendor and device"""
+
+    def __init__(self, simulator: "DeviceSimulator"):
+        self.simulator = simulator
+        self.username = ""
+
+    def check_auth_password(self, username, password):
+        self.username = username
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_window_change_request(self, channel, width, height, pixelwidth, pixelheight):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        profile, hostname = self.simulator.device_for(self.username)
+        shell = DeviceShell(self.simulator, channel, profile, self.username, hostname)
+        threading.Thread(target=shell.run, daemon=True).start()
+        self.simulator.stats["sessions"] += 1
+        return True
+
+
+class DeviceSimulator:
+    """A farm of simulated devices behind one listening port
+
+    Log in as ``<vendor>-<n>`` (e.g. ``huawei-7``) to reach device n of that
+    vendor; any other username gets device 1 of the default vendor. Every
+    command answer waits ``latency`` seconds plus up to ``jitter`` more.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 2222, vendor: str = "cisco",
+                 latency: float = 0.0, jitter: float = 0.0, config_lines: int = 2000, routes: int = 50,
+                 page_lines: int = 23, host_key: Optional[paramiko.PKey] = None):
+        if vendor not in PROFILES:
+            raise ValueError(f"Unknown vendor {vendor!r}; use one of {', '.join(PROFILES)}")
+        self.host = host
+        self.port = port
+        self.vendor = vendor
+        self.latency = latency
+        self.jitter = jitter
+        self.config_lines = config_lines
+        self.routes = routes
+        self.page_lines = page_lines
+        self.host_key = host_key or paramiko.RSAKey.generate(2048)
+        self.sock: Optional[socket.socket] = None
+        self.transports: List[paramiko.Transport] = []
+        self.stats = {"connections": 0, "sessions": 0, "commands": 0}
+
+    def device_for(self, username: str):
+        """Profile and hostname for a login name"""
+        match = USERNAME.match(username or "")
+        if match and match.group("vendor") in PROFILES:
+            profile = PROFILES[match.group("vendor")]
+            return profile, profile.hostname + (match.group("index") or "1")
+        profile = PROFILES[self.vendor]
+        return profile, profile.hostname + "1"
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def start(self) -> "DeviceSimulator":
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(1024)
+        # Port 0 asks the OS for a free one
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+        logger.info(f"Simulated {self.vendor} devices listening on {self.host}:{self.port}")
+        return self
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client: socket.socket):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        self.stats["connections"] += 1
+        self.transports.append(transport)
+        try:
+            transport.start_server(server=SimulatedServer(self))
+            # Shells run on their own threads; keep accepting channels until the client leaves
+            channels = []
+            while transport.is_active():
+                channel = transport.accept(1)
+                if channel is not None:
+                    channels.append(channel)
+        except (OSError, EOFError, paramiko.SSHException) as e:
+            logger.debug(f"Simulated connection ended: {str(e)}")
+        finally:
+            transport.close()
+            self.transports.remove(transport)
+
+    def stop(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        for transport in list(self.transports):
+            transport.close()
+
+    def __enter__(self) -> "DeviceSimulator":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--vendor", default="cisco", choices=sorted(PROFILES),
+                        help="vendor for usernames that don't name one")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay before every command answer")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random extra delay, up to this much")
+    parser.add_argument("--config-lines", type=int, default=2000, help="length of the running configuration")
+    parser.add_argument("--routes", type=int, default=50, help="routes in the routing table")
+    parser.add_argument("--page-lines", type=int, default=23, help="lines per pager page (0 never pages)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    simulator = DeviceSimulator(
+        args.host, args.port, args.vendor,
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        config_lines=args.config_lines, routes=args.routes, page_lines=args.page_lines
+    ).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Authenticated SSH transport pool for Monetx NCM SSH Emulator
+Lets new sessions open channels on a warm transport instead of repeating the handshake
+"""
+
+import hashlib
+import hmac
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import paramiko
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, int, str, str]
+
+
+class PooledTransport:
+    """One authenticated transport and the channels it is carrying"""
+
+    def __init__(self, key: PoolKey, transport: paramiko.Transport):
+        self.key = key
+        self.transport = transport
+        self.channels = 0
+        # Set once the device refuses another channel on this connection
+        self.max_channels: Optional[int] = None
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+    @property
+    def available(self) -> bool:
+        return self.transport.is_active() and (self.max_channels is None or self.channels < self.max_channels)
+
+
+class TransportPool:
+    """Transports keyed by (host, port, user, credential hash) with idle TTL and LRU eviction
+
+    All methods run on the event loop thread; closing evicted transports is
+    left to the caller because Transport.close() blocks.
+    """
+
+    def __init__(self, max_size: int = 256, idle_ttl: float = 300.0):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.by_key: Dict[PoolKey, List[PooledTransport]] = {}
+        self.lru: "OrderedDict[int, PooledTransport]" = OrderedDict()
+        # Per-process salt so the pool never holds a reusable password digest
+        self._salt = secrets.token_bytes(16)
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0, "expired": 0, "refused_channels": 0}
+
+    def make_key(self, hostname: str, port: int, username: str, password: str) -> PoolKey:
+        digest = hmac.new(self._salt, password.encode("utf-8"), hashlib.sha256).hexdigest()
+        return (hostname, int(port), username, digest)
+
+    def acquire(self, key: PoolKey) -> Optional[PooledTransport]:
+        """Most recently used live transport for this key, with a channel reserved"""
+        for entry in reversed(self.by_key.get(key, [])):
+            if entry.available:
+                entry.channels += 1
+                entry.last_used = time.monotonic()
+                self.lru.move_to_end(id(entry))
+                self.stats["hits"] += 1
+                return entry
+        return None
+
+    def add(self, key: PoolKey, transport: paramiko.Transport, max_channels: Optional[int] = None) -> PooledTransport:
+        """Register a fresh transport with one channel reserved (a pool miss)
+
+        ``max_channels`` caps it up front, for devices already known to
+        refuse more channels than that on one connection.
+        """
+        self.stats["misses"] += 1
+        entry = PooledTransport(key, transport)
+        entry.channels = 1
+        entry.max_channels = max_channels
+        self.by_key.setdefault(key, []).append(entry)
+        self.lru[id(entry)] = entry
+        return entry
+
+    def reserve(self, entry: PooledTransport) -> bool:
+        """Count another channel (e.g. a side channel next to a shell) on a transport, if it has room"""
+        if not entry.available:
+            return False
+        entry.channels += 1
+        entry.last_used = time.monotonic()
+        return True
+
+    def release(self, entry: PooledTransport):
+        entry.channels = max(0, entry.channels - 1)
+        entry.last_used = time.monotonic()
+
+    def refuse(self, entry: PooledTransport):
+        """The device would not open another channel; cap the transport where it is"""
+        self.stats["refused_channels"] += 1
+        entry.channels = max(0, entry.channels - 1)
+        entry.max_channels = max(1, entry.channels)
+
+    def _remove(self, entry: PooledTransport):
+        self.lru.pop(id(entry), None)
+        entries = self.by_key.get(entry.key, [])
+        if entry in entries:
+            entries.remove(entry)
+        if not entries:
+            self.by_key.pop(entry.key, None)
+
+    def reap(self) -> List[paramiko.Transport]:
+        """Drop dead, expired and over-capacity idle transports; returns those to close"""
+        now = time.monotonic()
+        to_close = []
+        for entry in list(self.lru.values()):
+            if not entry.transport.is_active():
+                self._remove(entry)
+            elif entry.channels == 0 and now - entry.last_used > self.idle_ttl:
+                self._remove(entry)
+                self.stats["expired"] += 1
+                to_close.append(entry.transport)
+        # Least recently used idle transports go first when over capacity
+        for entry in list(self.lru.values()):
+            if len(self.lru) <= self.max_size:
+                break
+            if entry.channels == 0:
+                self._remove(entry)
+                self.stats["evicted"] += 1
+                to_close.append(entry.transport)
+        return to_close
+
+    def drain(self) -> List[paramiko.Transport]:
+        """Forget every transport; returns them all to close"""
+        transports = [entry.transport for entry in self.lru.values()]
+        self.lru.clear()
+        self.by_key.clear()
+        return transports
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "transports": len(self.lru),
+            "idle_transports": sum(1 for entry in self.lru.values() if entry.channels == 0),
+            "channels": sum(entry.channels for entry in self.lru.values()),
+            "max_size": self.max_size,
+            "idle_ttl": self.idle_ttl
+        }
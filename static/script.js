@@ -1,11 +1,22 @@
+// Pager prompts the server pager knows: Cisco/Arista, Junos, Huawei
+const PAGER_PROMPT = /--More--|---\(more[^)]*\)---|---- More ----/g;
+
 class SSHEmulator {
     constructor() {
         this.sessionId = null;
         this.websocket = null;
         this.isConnected = false;
+        this.outputOffset = 0; // Bytes of shell output received, for resuming after a dropped WebSocket
+        this.reconnectAttempts = 0;
+        this.reconnectTimer = null;
+        this.role = 'read-write'; // 'read-only' when watching someone else's session
+        this.view = 'stream'; // 'screen' draws the server's terminal screen instead of appending output
+        this.screenLines = []; // One element per screen row in screen view
+        this.ptySize = null; // Last cols/rows sent to the server
         this.commandHistory = [];
         this.historyIndex = -1;
         this.paginationEnabled = true; // Auto-handle pagination like Putty_own.py
+        this.serverPager = false; // Whether the server answers pager prompts for us (from 'attached' / 'pager')
         this.lastSentCommand = null; // Track last sent command to filter echoes
         this.deviceType = null; // Track device type for specific commands
         this.learnedCommands = this.loadLearnedCommands(); // Load saved commands from localStorage
@@ -17,12 +28,36 @@ class SSHEmulator {
             'whoami', 'id', 'date', 'uptime', 'history', 'exit', 'clear',
             'sudo', 'su', 'passwd', 'crontab', 'wget', 'curl', 'git'
         ];
+        this.remoteCommands = []; // Commands on the device's $PATH, sent by the server once per session
+        this.completionRequests = new Map(); // Pending filelist requests by id
+        this.nextCompletionId = 1;
         this.fileCache = []; // Cache for file/directory names
         this.currentPath = '~'; // Track current directory
         
         this.initializeElements();
         this.bindEvents();
         this.loadSavedSession();
+        this.joinSharedSession();
+    }
+
+    async joinSharedSession() {
+        // ?session=<id>&role=read-only attaches to a running session instead of logging in again
+        const params = new URLSearchParams(window.location.search);
+        const sessionId = params.get('session');
+        if (!sessionId) return;
+        this.sessionId = sessionId;
+        this.role = params.get('role') === 'read-only' ? 'read-only' : 'read-write';
+        // Viewers start from the current screen rather than the session's whole history
+        this.view = params.get('view') || (this.role === 'read-only' ? 'screen' : 'stream');
+        try {
+            await this.connectWebSocket();
+            this.isConnected = true;
+            this.updateConnectionUI(true);
+            this.updateStatus('connected', this.role === 'read-only' ? 'Watching (read-only)' : 'Connected');
+        } catch (error) {
+            console.error('Could not join session:', error);
+            this.handleDisconnect();
+        }
     }
 
     loadLearnedCommands() {
@@ -195,6 +230,7 @@ class SSHEmulator {
         
         // Fullscreen control
         this.fullscreenBtn.addEventListener('click', () => this.toggleFullscreen());
+        window.addEventListener('resize', () => this.sendResize());
         
         // Tab switching
         this.tabBtns.forEach(btn => {
@@ -279,20 +315,35 @@ class SSHEmulator {
         }
     }
 
-    async connectWebSocket() {
-        const wsUrl = `ws://${window.location.host}/ws/${this.sessionId}`;
-        this.websocket = new WebSocket(wsUrl);
+    async connectWebSocket(resume = false) {
+        // Ask for raw binary output frames; the server keeps JSON for older clients
+        // and let the server answer --More-- prompts while auto-pagination is on
+        const pagerMode = this.paginationEnabled ? 'server' : 'client';
+        let wsUrl = `ws://${window.location.host}/ws/${this.sessionId}?framing=binary&pager=${pagerMode}&role=${this.role}&view=${this.view}`;
+        if (resume && this.view === 'stream') {
+            // Same SSH session; the server sends only the output we missed
+            wsUrl += `&resume=${this.outputOffset}`;
+        }
+        const socket = new WebSocket(wsUrl);
+        this.websocket = socket;
+        this.websocket.binaryType = 'arraybuffer';
+        this.outputDecoder = new TextDecoder('utf-8');
+        this.socketAttached = false;
+        this.serverPager = false;
+        let opened = false;
 
         return new Promise((resolve, reject) => {
             this.websocket.onopen = () => {
+                opened = true;
                 console.log('WebSocket connected');
+                // Fetch command names for Tab completion in the background
+                if (this.role !== 'read-only') {
+                    this.websocket.send(JSON.stringify({ type: 'commands' }));
+                }
                 resolve();
             };
 
-            this.websocket.onmessage = (event) => {
-                const data = JSON.parse(event.data);
-                this.handleWebSocketMessage(data);
-            };
+            this.websocket.onmessage = (event) => this.handleSocketFrame(event);
 
             this.websocket.onerror = (error) => {
                 console.error('WebSocket error:', error);
@@ -300,33 +351,103 @@ class SSHEmulator {
             };
 
             this.websocket.onclose = () => {
+                // Ignore sockets we already replaced or closed on purpose
+                if (this.websocket !== socket) return;
                 console.log('WebSocket disconnected');
-                this.handleDisconnect();
+                // Retry while the network is down; a socket refused after opening means the session is gone
+                if (this.sessionId && (this.socketAttached || (resume && !opened))) {
+                    this.scheduleReconnect();
+                } else {
+                    this.handleDisconnect();
+                }
             };
 
             // Timeout after 10 seconds
             setTimeout(() => {
-                if (this.websocket.readyState !== WebSocket.OPEN) {
+                if (socket.readyState !== WebSocket.OPEN) {
                     reject(new Error('WebSocket connection timeout'));
                 }
             }, 10000);
         });
     }
 
+    scheduleReconnect() {
+        // The SSH session outlives its WebSocket for a while, so a dropped socket is retried, not a new login
+        if (this.reconnectAttempts >= 8) {
+            this.handleDisconnect();
+            this.showNotification('Connection lost', 'error');
+            return;
+        }
+        const delay = Math.min(1000 * 2 ** this.reconnectAttempts, 30000);
+        this.reconnectAttempts += 1;
+        this.updateStatus('connecting', 'Reconnecting...');
+        this.reconnectTimer = setTimeout(async () => {
+            this.reconnectTimer = null;
+            try {
+                await this.connectWebSocket(true);
+            } catch (error) {
+                // onclose schedules the next attempt
+                console.error('Reconnect failed:', error);
+            }
+        }, delay);
+    }
+
+    handleSocketFrame(event) {
+        if (event.data instanceof ArrayBuffer) {
+            this.outputOffset += event.data.byteLength;
+            // Binary frames carry raw shell output
+            this.handleWebSocketMessage({
+                type: 'output',
+                data: this.outputDecoder.decode(event.data, { stream: true })
+            });
+            return;
+        }
+        const data = JSON.parse(event.data);
+        if (data.offset !== undefined) {
+            // Attach position, JSON output and corrections after a truncation marker
+            this.outputOffset = data.offset;
+        }
+        this.handleWebSocketMessage(data);
+    }
+
+    replaySession(sessionId, speed = 1, idleLimit = 2) {
+        // Play a recorded session through the same output path as a live one
+        if (this.isConnected) {
+            this.showNotification('Disconnect before replaying a session', 'error');
+            return;
+        }
+        if (this.replaySocket) {
+            this.replaySocket.close();
+        }
+        const params = new URLSearchParams({ framing: 'binary', speed });
+        if (idleLimit) {
+            params.set('idle_limit', idleLimit);
+        }
+        const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        this.replaySocket = new WebSocket(`${protocol}://${window.location.host}/api/sessions/${sessionId}/replay?${params}`);
+        this.replaySocket.binaryType = 'arraybuffer';
+        this.outputDecoder = new TextDecoder('utf-8');
+        this.lastSentCommand = null;
+        this.replaySocket.onmessage = (event) => this.handleSocketFrame(event);
+        this.replaySocket.onclose = () => {
+            this.replaySocket = null;
+        };
+    }
+
     handleWebSocketMessage(data) {
         if (data.type === 'output') {
             // Handle pagination exactly like Putty_own.py
             let processedData = data.data;
             
             // Detect device type from output
-            this.detectDeviceType(processedData);
-            
-            // Check for --More-- prompt
-            if (processedData.includes('--More--')) {
+            // Check for a pager prompt (Cisco/Arista, Junos, Huawei)
+            if (processedData.search(PAGER_PROMPT) !== -1) {
                 if (this.paginationEnabled) {
-                    // Auto-send space for pagination
-                    this.sendSpace(false); // Don't show message when auto-sending
-                    processedData = processedData.replace('--More--', '[More...]');
+                    if (!this.serverPager && this.role !== 'read-only') {
+                        // The server isn't answering (PAGER_MODE off, or paging could not be disabled)
+                        this.sendSpace(false);
+                    }
+                    processedData = processedData.replace(PAGER_PROMPT, '[More...]');
                 } else {
                     // Enable the Send Space button when pagination is manual
                     this.sendSpaceBtn.disabled = false;
@@ -381,79 +502,62 @@ class SSHEmulator {
                 // No command to filter, show all output
                 this.appendTerminalOutput(processedData);
             }
+        } else if (data.type === 'attached') {
+            // A socket that closes before this means the session itself is gone
+            this.socketAttached = true;
+            this.serverPager = Boolean(data.server_pager);
+            this.reconnectAttempts = 0;
+            if (data.resumed) {
+                this.updateStatus('connected', 'Connected');
+                if (data.lost > 0) {
+                    this.appendTerminalOutput(`\n[${data.lost} bytes of output lost while disconnected]\n`, 'info');
+                }
+            }
+            this.sendResize();
+        } else if (data.type === 'pager') {
+            this.serverPager = Boolean(data.server_pager);
+        } else if (data.type === 'screen') {
+            this.renderScreen(data);
+        } else if (data.type === 'screen-diff') {
+            this.updateScreen(data.changes);
         } else if (data.type === 'error') {
             this.appendTerminalOutput(`\n[ERROR] ${data.message}\n`, 'error');
+        } else if (data.type === 'replay') {
+            const label = data.state === 'start' ? 'Replay started' : 'Replay finished';
+            this.appendTerminalOutput(`\n[${label}]\n`, 'info');
         } else if (data.type === 'filelist') {
-            // Filelist responses are handled by the requestFileList method
-            // Don't display them in the terminal
-            return;
+            // Answer the requestFileList call waiting for this id; never shown in the terminal
+            const pending = this.completionRequests.get(data.id);
+            if (pending) {
+                this.completionRequests.delete(data.id);
+                pending(data.files || []);
+            }
+        } else if (data.type === 'platform') {
+            // Detected once on the server from the banner and first prompt
+            this.setDeviceType(data.platform);
+        } else if (data.type === 'commands') {
+            this.remoteCommands = data.commands || [];
         }
     }
     
-    detectDeviceType(output) {
-        // Only detect if device type is not already set
-        if (this.deviceType) return;
-        
-        const outputLower = output.toLowerCase();
-        
-        // Cisco IOS detection
-        if (outputLower.includes('cisco') || 
-            outputLower.includes('ios software') ||
-            outputLower.includes('cisco ios software') ||
-            outputLower.match(/router\#/i) ||
-            outputLower.match(/switch\#/i) ||
-            outputLower.includes('cisco systems')) {
-            this.deviceType = 'cisco';
-            this.showNotification('Cisco device detected - using Cisco commands', 'success');
-            return;
-        }
-        
-        // Juniper Junos detection
-        if (outputLower.includes('juniper') ||
-            outputLower.includes('junos') ||
-            outputLower.includes('junos os') ||
-            outputLower.match(/user@.*>/i) ||
-            outputLower.match(/user@.*\#/i)) {
-            this.deviceType = 'juniper';
-            this.showNotification('Juniper device detected - using Junos commands', 'success');
-            return;
-        }
-        
-        // Arista EOS detection
-        if (outputLower.includes('arista') ||
-            outputLower.includes('eos') ||
-            outputLower.includes('arista networks') ||
-            outputLower.match(/.*\#.*eos/i)) {
-            this.deviceType = 'arista';
-            this.showNotification('Arista device detected - using EOS commands', 'success');
-            return;
-        }
-        
-        // Huawei VRP detection
-        if (outputLower.includes('huawei') ||
-            outputLower.includes('vrp') ||
-            outputLower.includes('huawei versatile routing platform') ||
-            outputLower.match(/\[.*\]/i) ||
-            outputLower.includes('huawei technologies')) {
-            this.deviceType = 'huawei';
-            this.showNotification('Huawei device detected - using VRP commands', 'success');
-            return;
-        }
-        
-        // Linux/Unix detection (default)
-        if (outputLower.includes('linux') ||
-            outputLower.includes('unix') ||
-            outputLower.match(/.*\$/i) ||
-            outputLower.includes('welcome to')) {
-            this.deviceType = 'linux';
-            // Don't show notification for Linux as it's the default
-            return;
+    setDeviceType(platform) {
+        const labels = {
+            cisco: 'Cisco device detected - using Cisco commands',
+            juniper: 'Juniper device detected - using Junos commands',
+            arista: 'Arista device detected - using EOS commands',
+            huawei: 'Huawei device detected - using VRP commands'
+        };
+        this.deviceType = platform && platform !== 'unknown' ? platform : null;
+        // Don't show notification for Linux as it's the default
+        if (labels[platform]) {
+            this.showNotification(labels[platform], 'success');
         }
     }
 
     async disconnect() {
         try {
-            if (this.sessionId) {
+            // Viewers only leave; the session belongs to whoever is driving it
+            if (this.sessionId && this.role !== 'read-only') {
                 await fetch(`/api/disconnect/${this.sessionId}`, {
                     method: 'POST'
                 });
@@ -472,8 +576,19 @@ class SSHEmulator {
     }
 
     handleDisconnect() {
+        if (this.reconnectTimer) {
+            clearTimeout(this.reconnectTimer);
+            this.reconnectTimer = null;
+        }
+        this.reconnectAttempts = 0;
+        this.outputOffset = 0;
+        this.role = 'read-write';
+        this.view = 'stream';
+        this.screenLines = [];
+        this.ptySize = null;
         this.isConnected = false;
         this.sessionId = null;
+        this.deviceType = null;
         this.websocket = null;
         this.updateConnectionUI(false);
         this.updateStatus('disconnected', 'Disconnected');
@@ -527,7 +642,7 @@ class SSHEmulator {
         if (isCompletingCommand) {
             // Complete commands - use learned commands first, then default commands
             const learnedCommands = this.getLearnedCommands();
-            const allCommands = [...learnedCommands, ...this.availableCommands];
+            const allCommands = [...learnedCommands, ...this.availableCommands, ...this.remoteCommands];
             
             // Remove duplicates while preserving order (learned commands first)
             const uniqueCommands = [...new Set(allCommands)];
@@ -587,27 +702,22 @@ class SSHEmulator {
     
     async requestFileList(path = '') {
         return new Promise((resolve, reject) => {
-            // Create a temporary message handler for the file list response
-            const tempHandler = (data) => {
-                if (data.type === 'filelist') {
-                    this.websocket.removeEventListener('message', tempHandler);
-                    resolve(data.files || []);
-                }
-            };
-            
-            // Add temporary handler
-            this.websocket.addEventListener('message', tempHandler);
+            // The reply carries the same id, so overlapping Tab presses get their own answers
+            const id = this.nextCompletionId++;
+            this.completionRequests.set(id, resolve);
             
             // Send file list request
             this.websocket.send(JSON.stringify({
                 type: 'filelist',
-                path: path
+                path: path,
+                id: id
             }));
             
             // Timeout after 2 seconds
             setTimeout(() => {
-                this.websocket.removeEventListener('message', tempHandler);
-                reject(new Error('Timeout'));
+                if (this.completionRequests.delete(id)) {
+                    reject(new Error('Timeout'));
+                }
             }, 2000);
         });
     }
@@ -695,6 +805,44 @@ class SSHEmulator {
         this.terminalOutput.scrollTop = this.terminalOutput.scrollHeight;
     }
 
+    renderScreen(screen) {
+        // A snapshot replaces whatever the terminal showed
+        this.terminalOutput.innerHTML = '';
+        this.screenLines = screen.display.map((text) => {
+            const line = document.createElement('div');
+            line.className = 'screen-line';
+            line.textContent = text;
+            this.terminalOutput.appendChild(line);
+            return line;
+        });
+    }
+
+    updateScreen(changes) {
+        for (const [row, text] of changes) {
+            if (this.screenLines[row]) {
+                this.screenLines[row].textContent = text;
+            }
+        }
+    }
+
+    sendResize() {
+        // Size the device's PTY to what fits in the terminal, so output wraps where the browser does
+        if (this.role === 'read-only' || !this.websocket || this.websocket.readyState !== WebSocket.OPEN) return;
+        const probe = document.createElement('span');
+        probe.textContent = 'M'.repeat(10);
+        probe.style.visibility = 'hidden';
+        this.terminalOutput.appendChild(probe);
+        const charWidth = probe.getBoundingClientRect().width / 10;
+        const lineHeight = probe.getBoundingClientRect().height;
+        probe.remove();
+        if (!charWidth || !lineHeight) return;
+        const cols = Math.max(20, Math.floor((this.terminalOutput.clientWidth - 30) / charWidth));
+        const rows = Math.max(5, Math.floor((this.terminalOutput.clientHeight - 30) / lineHeight));
+        if (this.ptySize && this.ptySize.cols === cols && this.ptySize.rows === rows) return;
+        this.ptySize = { cols, rows };
+        this.websocket.send(JSON.stringify({ type: 'resize', cols, rows }));
+    }
+
     clearTerminal() {
         this.terminalOutput.innerHTML = '';
         const timestamp = new Date().toLocaleTimeString();
@@ -725,6 +873,12 @@ class SSHEmulator {
     // Pagination methods (exactly like Putty_own.py)
     togglePagination() {
         this.paginationEnabled = this.autoPaginationCheckbox.checked;
+        if (this.websocket && this.websocket.readyState === WebSocket.OPEN) {
+            this.websocket.send(JSON.stringify({
+                type: 'pager',
+                enabled: this.paginationEnabled
+            }));
+        }
         if (this.paginationEnabled) {
             this.sendSpaceBtn.disabled = true;
             this.appendTerminalOutput(`\n[${new Date().toLocaleTimeString()}] Auto-pagination: ON\n`, 'info');
@@ -796,14 +950,16 @@ class SSHEmulator {
     updateConnectionUI(connected) {
         this.connectBtn.disabled = connected;
         this.disconnectBtn.disabled = !connected;
-        this.terminalInput.disabled = !connected;
-        this.sendBtn.disabled = !connected;
+        // Read-only viewers watch without typing
+        const canType = connected && this.role !== 'read-only';
+        this.terminalInput.disabled = !canType;
+        this.sendBtn.disabled = !canType;
         
         this.commandButtons.forEach(btn => {
-            btn.disabled = !connected;
+            btn.disabled = !canType;
         });
 
-        if (connected) {
+        if (canType) {
             this.terminalInput.focus();
         }
     }
@@ -1018,26 +1174,75 @@ class SSHEmulator {
         const confirmEach = document.getElementById('confirm-each').checked;
         const showOutput = document.getElementById('show-output').checked;
         
-        this.showNotification(`Executing ${commands.length} batch commands`, 'info');
-        
-        for (let i = 0; i < commands.length; i++) {
-            const command = commands[i].trim();
-            
-            if (confirmEach) {
-                const confirmed = confirm(`Execute command: ${command}?`);
-                if (!confirmed) {
+        // Approve every command up front; the server then runs them back to back
+        if (confirmEach) {
+            for (const command of commands) {
+                if (!confirm(`Execute command: ${command.trim()}?`)) {
                     this.showNotification('Batch execution cancelled', 'info');
                     return;
                 }
             }
+        }
+        
+        this.showNotification(`Executing ${commands.length} batch commands`, 'info');
+        
+        try {
+            const summary = await this.runServerBatch(commands.map(command => command.trim()), showOutput);
+            if (summary && summary.completed === summary.commands) {
+                this.showNotification('Batch commands executed successfully', 'success');
+            } else {
+                this.showNotification('Batch stopped before all commands completed', 'warning');
+            }
+        } catch (error) {
+            console.error('Batch error:', error);
+            this.showNotification(`Batch failed: ${error.message}`, 'error');
+        }
+    }
+    
+    async runServerBatch(commands, showProgress = true) {
+        // Device output still arrives over the WebSocket; the stream only carries per-command results
+        const response = await fetch(`/api/sessions/${this.sessionId}/batch`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ commands })
+        });
+        
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || 'Batch failed');
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffered = '';
+        let summary = null;
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, { stream: true });
             
-            this.sendCommandToTerminal(command, showOutput);
-            
-            // Delay between commands
-            await new Promise(resolve => setTimeout(resolve, 500));
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const event = JSON.parse(line);
+                if (event.type === 'result' && showProgress) {
+                    this.appendTerminalOutput(
+                        `\n[batch ${event.index + 1}/${commands.length}] ${event.command} - ${event.status} (${event.elapsed_ms} ms)\n`,
+                        event.status === 'ok' ? 'info' : 'error'
+                    );
+                } else if (event.type === 'error') {
+                    throw new Error(event.message);
+                } else if (event.type === 'done') {
+                    summary = event;
+                }
+            }
         }
         
-        this.showNotification('Batch commands executed successfully', 'success');
+        return summary;
     }
     
     clearBatchCommands() {
@@ -1107,6 +1312,12 @@ class SSHEmulator {
 // Initialize the SSH emulator when DOM is loaded
 document.addEventListener('DOMContentLoaded', () => {
     window.sshEmulator = new SSHEmulator();
+    
+    // ?replay=<session_id>[&speed=2] plays back a recorded session
+    const params = new URLSearchParams(window.location.search);
+    if (params.get('replay')) {
+        window.sshEmulator.replaySession(params.get('replay'), parseFloat(params.get('speed') || '1'));
+    }
 });
 
 // Handle page unload to clean up connections
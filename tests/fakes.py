@@ -0,0 +1,61 @@
+"""Stand-ins for a paramiko channel and a WebSocket, for driving pumps and hubs without a device"""
+
+import asyncio
+import json
+from typing import List
+
+from shell_pump import ShellPump
+
+
+class FakeShell:
+    """Records what is sent; output is pushed into the pump with ``ShellPump._dispatch``"""
+
+    def __init__(self):
+        self.sent: List[str] = []
+        self.closed = False
+        self.eof_received = False
+
+    def send(self, data):
+        self.sent.append(data)
+        return len(data)
+
+    def recv_ready(self) -> bool:
+        return False
+
+
+class FakeWebSocket:
+    """Collects text and binary frames in the order they were sent"""
+
+    def __init__(self):
+        self.frames: list = []
+
+    async def send_text(self, text: str):
+        self.frames.append(text)
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(data)
+
+    async def send_json(self, message: dict):
+        self.frames.append(json.dumps(message))
+
+    def messages(self, kind: str = None) -> List[dict]:
+        decoded = [json.loads(frame) for frame in self.frames if isinstance(frame, str)]
+        return [message for message in decoded if kind is None or message["type"] == kind]
+
+
+def make_pump(queueing: bool = True) -> ShellPump:
+    """A pump on the running loop that is fed by hand instead of from a channel"""
+    pump = ShellPump(FakeShell(), queueing=queueing)
+    pump.loop = asyncio.get_running_loop()
+    return pump
+
+
+def split_randomly(data: bytes, rng, max_size: int = 7) -> List[bytes]:
+    """``data`` cut at random byte offsets, so multi-byte characters straddle chunks"""
+    chunks = []
+    position = 0
+    while position < len(data):
+        size = rng.randint(1, max_size)
+        chunks.append(data[position:position + size])
+        position += size
+    return chunks
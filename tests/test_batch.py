@@ -0,0 +1,15 @@
+"""Tests for prompt recognition in the batch executor"""
+
+from batch import PromptTracker
+
+
+def test_prompt_tracker_allows_mode_decorations():
+    tracker = PromptTracker()
+    assert not tracker.matches("Router#")
+    tracker.learn("\x1b[0mRouter#")
+    assert tracker.matches("show run\r\n...\r\nRouter(config-if)#")
+    assert tracker.matches("output\nRouter# ")
+    assert not tracker.matches("Router# show run\r\nBuilding configuration...")
+    assert not tracker.matches("OtherRouter#")
+    tracker.learn("<HUAWEI>")
+    assert tracker.matches("[~HUAWEI-GigabitEthernet0/0/1]")
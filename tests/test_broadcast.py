@@ -0,0 +1,93 @@
+"""Tests for per-subscriber queue bounds and attaching to the hub"""
+
+import asyncio
+
+from broadcast import OutputFrame, SessionHub, Subscriber, output_message
+from scrollback import ScrollbackBuffer
+from tests.fakes import FakeWebSocket, make_pump
+
+
+def frame(data: bytes, start: int) -> OutputFrame:
+    end = start + len(data)
+    return OutputFrame(data, start, end, output_message(data.decode(), end))
+
+
+def test_viewer_drops_what_does_not_fit_and_marks_the_gap():
+    subscriber = Subscriber(FakeWebSocket(), "read-only", False, max_bytes=10, pauses=False)
+    subscriber.offer(frame(b"12345678", 0))
+    subscriber.offer(frame(b"abcdefgh", 8))
+    subscriber.offer(frame(b"ijkl", 16))
+    assert subscriber.dropping == 12 and subscriber.dropped_until == 20
+    subscriber.frames.popleft()
+    subscriber.queued_bytes = 0
+    subscriber.offer(frame(b"m", 20))
+    marker, last = subscriber.frames
+    assert marker.data == b"\r\n[output truncated: 12 bytes dropped]\r\n"
+    assert marker.start == marker.end == 20
+    assert last.data == b"m"
+    assert subscriber.stats["dropped_bytes"] == 12 and subscriber.stats["truncations"] == 1
+
+
+def test_empty_queue_takes_a_frame_bigger_than_the_limit():
+    subscriber = Subscriber(FakeWebSocket(), "read-only", False, max_bytes=4, pauses=False)
+    subscriber.offer(frame(b"abcdefgh", 0))
+    assert subscriber.queued_bytes == 8 and not subscriber.dropping
+    assert subscriber.full() and not subscriber.room.is_set()
+
+
+def test_driver_queues_everything_and_signals_when_full():
+    subscriber = Subscriber(FakeWebSocket(), "read-write", False, max_bytes=10, pauses=True)
+    subscriber.offer(frame(b"12345678", 0))
+    assert subscriber.room.is_set()
+    subscriber.offer(frame(b"abcdefgh", 8))
+    assert subscriber.queued_bytes == 16 and not subscriber.dropping
+    assert not subscriber.room.is_set()
+
+
+def test_binary_subscriber_is_told_the_offset_after_a_marker():
+    async def scenario():
+        websocket = FakeWebSocket()
+        subscriber = Subscriber(websocket, "read-only", True, max_bytes=4, pauses=False)
+        subscriber.attach = {"offset": 0}
+        subscriber.task = asyncio.create_task(subscriber.run(65536))
+        subscriber.offer(frame(b"abcd", 0))
+        subscriber.offer(frame(b"efgh", 4))
+        subscriber.offer(OutputFrame(b"", 8, 8, eof=True))
+        await asyncio.wait_for(subscriber.task, 5)
+        return websocket
+
+    websocket = asyncio.run(scenario())
+    assert websocket.frames[1:3] == [b"abcd", b"\r\n[output truncated: 4 bytes dropped]\r\n"]
+    assert {"type": "offset", "offset": 8} in websocket.messages("offset")
+
+
+def test_first_subscriber_gets_the_output_sent_before_it_attached():
+    async def scenario():
+        pump = make_pump(queueing=False)
+        scrollback = ScrollbackBuffer(1024)
+        pump.listeners.append(scrollback.write)
+        hub = SessionHub(pump, scrollback, window=0)
+        # The login banner and first prompt arrive before any browser connects
+        pump._dispatch(b"Welcome to core-sw1\r\n")
+        pump._dispatch(b"core-sw1#")
+        first = FakeWebSocket()
+        subscriber = hub.subscribe(first, binary=True)
+        pump._dispatch(b"show clock\r\n")
+        while b"show clock\r\n" not in first.frames:
+            await asyncio.sleep(0.01)
+        await hub.unsubscribe(subscriber)
+        # Later viewers start live unless they ask to resume
+        second = FakeWebSocket()
+        subscriber = hub.subscribe(second, binary=True)
+        pump._dispatch(b"12:00:00 UTC\r\n")
+        pump.stop()
+        await asyncio.wait_for(subscriber.task, 5)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    attached = first.messages("attached")[0]
+    assert attached["offset"] == 0 and not attached["resumed"] and attached["lost"] == 0
+    assert b"".join(frame for frame in first.frames if isinstance(frame, bytes)) == \
+        b"Welcome to core-sw1\r\ncore-sw1#show clock\r\n"
+    assert second.messages("attached")[0]["offset"] == 42
+    assert b"".join(frame for frame in second.frames if isinstance(frame, bytes)) == b"12:00:00 UTC\r\n"
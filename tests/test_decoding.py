@@ -0,0 +1,98 @@
+"""UTF-8 output split at arbitrary recv() boundaries must reach every client intact"""
+
+import asyncio
+import random
+
+import pytest
+
+from broadcast import SessionHub
+from scrollback import ScrollbackBuffer
+from shell_pump import output_decoder
+from tests.fakes import FakeWebSocket, make_pump, split_randomly
+
+TEXT = "Router# show interfaces description\r\nGi0/1  up  Liaison — Zürich ☎ 東京 🚀\r\n" * 40
+
+
+async def read_all(pump, max_bytes):
+    batches = []
+    while True:
+        batch = await pump.read_batch(max_bytes=max_bytes, window=0)
+        if not batch:
+            return batches
+        batches.append(batch)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_read_batch_returns_every_byte_in_order(seed):
+    async def scenario():
+        pump = make_pump()
+        for chunk in split_randomly(TEXT.encode(), random.Random(seed)):
+            pump._dispatch(chunk)
+        pump.stop()
+        return await read_all(pump, 64)
+
+    assert b"".join(asyncio.run(scenario())) == TEXT.encode()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_decoder_carries_split_characters_between_batches(seed):
+    async def scenario():
+        pump = make_pump()
+        for chunk in split_randomly(TEXT.encode(), random.Random(seed)):
+            pump._dispatch(chunk)
+        pump.stop()
+        # Batches of 5 bytes cut through nearly every multi-byte character
+        return await read_all(pump, 5)
+
+    decoder = output_decoder()
+    text = "".join(decoder.decode(batch) for batch in asyncio.run(scenario())) + decoder.decode(b"", final=True)
+    assert text == TEXT
+    assert "�" not in text
+
+
+async def run_hub(chunks, binary=False, resume=None, scrollback=None, before=()):
+    """Feed ``before`` into the pump, attach one subscriber, feed ``chunks`` and wait for end of output"""
+    pump = make_pump(queueing=False)
+    if scrollback is not None:
+        pump.listeners.append(scrollback.write)
+    for chunk in before:
+        pump._dispatch(chunk)
+    hub = SessionHub(pump, scrollback, chunk_bytes=5, window=0)
+    websocket = FakeWebSocket()
+    subscriber = hub.subscribe(websocket, binary=binary, resume=resume)
+    for chunk in chunks:
+        pump._dispatch(chunk)
+        await asyncio.sleep(0)
+    pump.stop()
+    await asyncio.wait_for(subscriber.task, 5)
+    return websocket
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_hub_json_frames_decode_split_characters(seed):
+    chunks = split_randomly(TEXT.encode(), random.Random(seed))
+    websocket = asyncio.run(run_hub(chunks))
+    outputs = websocket.messages("output")
+    assert "".join(message["data"] for message in outputs) == TEXT
+    assert outputs[-1]["offset"] == len(TEXT.encode())
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_hub_binary_frames_carry_the_raw_bytes(seed):
+    chunks = split_randomly(TEXT.encode(), random.Random(seed))
+    websocket = asyncio.run(run_hub(chunks, binary=True))
+    assert b"".join(frame for frame in websocket.frames if isinstance(frame, bytes)).decode() == TEXT
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_replay_from_scrollback_decodes_split_characters(seed):
+    data = TEXT.encode()
+    chunks = split_randomly(data, random.Random(seed))
+    middle = len(chunks) // 2
+    # Half the output arrives while detached and is replayed in 5-byte slices; the rest arrives live
+    websocket = asyncio.run(run_hub(chunks[middle:], resume=0, scrollback=ScrollbackBuffer(len(data)),
+                                    before=chunks[:middle]))
+    attached = websocket.messages("attached")[0]
+    assert attached["resumed"] and attached["lost"] == 0
+    assert attached["replayed"] == sum(len(chunk) for chunk in chunks[:middle])
+    assert "".join(message["data"] for message in websocket.messages("output")) == TEXT
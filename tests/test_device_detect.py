@@ -0,0 +1,39 @@
+"""Tests for platform detection from the banner and first prompt"""
+
+import asyncio
+
+from device_detect import PlatformDetector, detect_platform
+
+
+def test_banner_names_the_platform():
+    detected = detect_platform("Cisco IOS Software, Version 15.2\r\n\r\nRouter>")
+    assert detected == {"platform": "cisco", "prompt": "Router>", "detected_by": "banner"}
+
+
+def test_prompt_shape_decides_without_a_banner():
+    assert detect_platform("Last login: Mon\r\n[admin@web01 ~]$ ")["platform"] == "linux"
+    assert detect_platform("\r\n<HUAWEI>")["platform"] == "huawei"
+    assert detect_platform("\r\nadmin@mx1> ")["platform"] == "juniper"
+
+
+def test_banner_line_cut_after_a_percent_sign_is_not_a_prompt():
+    async def scenario():
+        detector = PlatformDetector(quiet=5)
+        detector.feed(b"System load:\r\n  CPU 5%")
+        assert not detector.result.done()
+        detector.feed(b" busy\r\n<HUAWEI>")
+        return await detector.wait(1)
+
+    assert asyncio.run(scenario()) == {"platform": "huawei", "prompt": "<HUAWEI>", "detected_by": "prompt"}
+
+
+def test_unknown_prompt_shape_is_taken_once_output_goes_quiet():
+    async def scenario():
+        detector = PlatformDetector(quiet=0.05)
+        detector.feed(b"Welcome\r\nswitch-01 %")
+        assert not detector.result.done()
+        await asyncio.sleep(0.2)
+        assert detector.result.done()
+        return detector.result.result()
+
+    assert asyncio.run(scenario()) == {"platform": "unknown", "prompt": "switch-01 %", "detected_by": None}
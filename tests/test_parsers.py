@@ -0,0 +1,74 @@
+"""Tests for the streaming show-command parsers"""
+
+import pytest
+
+from parsers import find_template
+
+CISCO_ROUTES = (
+    "O        10.1.1.0/24 [110/2] via 192.168.1.2, 00:01:02, Gi0/1\r\n"
+    "O E2     172.16.100.0/24\r\n"
+    "           [110/20] via 192.168.1.3, 00:00:10, GigabitEthernet0/0/2\r\n"
+    "           [110/20] via 192.168.1.4, 00:00:10, GigabitEthernet0/0/3\r\n"
+    "C        192.168.1.0/24 is directly connected, Gi0/1\r\n"
+)
+
+CISCO_INTERFACES = (
+    "GigabitEthernet0/1 is up, line protocol is up\r\n"
+    "  Hardware is iGbE, address is 5254.0012.3456 (bia 5254.0012.3456)\r\n"
+    "  Description: uplink to core\r\n"
+    "  MTU 1500 bytes, BW 1000000 Kbit/sec, DLY 10 usec,\r\n"
+    " --More-- \x08\x08\x08\x08\x08\x08\x08\x08\x08\x08          \x08\x08\x08\x08\x08\x08\x08\x08\x08\x08"
+    "     1234 packets input, 56789 bytes, 0 no buffer\r\n"
+    "GigabitEthernet0/2 is administratively down, line protocol is down\r\n"
+    "  MTU 9000 bytes, BW 1000000 Kbit/sec, DLY 10 usec,\r\n"
+)
+
+
+def parse(platform, command, text, chunk=None):
+    parser = find_template(platform, command).parser()
+    records = []
+    step = chunk or len(text)
+    for start in range(0, len(text), step):
+        records.extend(parser.feed(text[start:start + step]))
+    return records + parser.close()
+
+
+def test_find_template_accepts_abbreviations():
+    assert find_template("cisco", "sh ip ro").name == "cisco_show_ip_route"
+    assert find_template("huawei", "dis ver").name == "huawei_display_version"
+    assert find_template("cisco", "show clock") is None
+    assert find_template(None, "show ip route") is None
+
+
+@pytest.mark.parametrize("chunk", [None, 1, 7])
+def test_records_do_not_depend_on_chunk_boundaries(chunk):
+    records = parse("cisco", "show interfaces", CISCO_INTERFACES, chunk)
+    assert records == [
+        {"interface": "GigabitEthernet0/1", "link_status": "up", "protocol_status": "up",
+         "hardware": "iGbE", "mac": "5254.0012.3456", "description": "uplink to core",
+         "mtu": 1500, "bandwidth": "1000000 Kbit/sec", "input_packets": 1234, "input_bytes": 56789},
+        {"interface": "GigabitEthernet0/2", "link_status": "administratively down", "protocol_status": "down",
+         "mtu": 9000, "bandwidth": "1000000 Kbit/sec"},
+    ]
+
+
+def test_cisco_route_equal_cost_next_hops_fill_down_the_prefix():
+    records = parse("cisco", "show ip route", (
+        "O        10.2.0.0/16 [110/3] via 192.168.1.2, 00:01:02, Gi0/1\r\n"
+        "                     [110/3] via 192.168.1.3, 00:01:02, Gi0/2\r\n"
+    ))
+    assert [(r["network"], r["next_hop"], r["interface"]) for r in records] == [
+        ("10.2.0.0/16", "192.168.1.2", "Gi0/1"),
+        ("10.2.0.0/16", "192.168.1.3", "Gi0/2"),
+    ]
+
+
+def test_cisco_route_wrapped_prefix_fills_down_to_its_next_hops():
+    records = parse("cisco", "show ip route", CISCO_ROUTES)
+    assert [(r["protocol"], r["network"], r.get("next_hop")) for r in records] == [
+        ("O", "10.1.1.0/24", "192.168.1.2"),
+        ("O E2", "172.16.100.0/24", "192.168.1.3"),
+        ("O E2", "172.16.100.0/24", "192.168.1.4"),
+        ("C", "192.168.1.0/24", None),
+    ]
+    assert records[1]["distance"] == 110 and records[1]["metric"] == 20
@@ -0,0 +1,43 @@
+"""Tests for the scrollback ring buffer"""
+
+from scrollback import ScrollbackBuffer
+
+
+def fill(buffer, data, step):
+    for start in range(0, len(data), step):
+        buffer.write(data[start:start + step])
+
+
+def test_read_within_capacity_returns_everything():
+    buffer = ScrollbackBuffer(64)
+    fill(buffer, b"hello world", 3)
+    assert buffer.read(0) == (b"hello world", 0)
+    assert buffer.read(6, 9) == (b"wor", 6)
+
+
+def test_wraparound_keeps_the_newest_bytes_in_order():
+    data = bytes(range(256)) * 3
+    buffer = ScrollbackBuffer(100)
+    fill(buffer, data, 37)
+    assert buffer.start == len(data) - 100
+    assert buffer.read(0) == (data[-100:], len(data) - 100)
+    # A range that straddles the physical end of the buffer
+    offset = len(data) - 60
+    assert buffer.read(offset, offset + 50) == (data[offset:offset + 50], offset)
+
+
+def test_chunk_larger_than_capacity_keeps_its_tail():
+    data = bytes(range(200))
+    buffer = ScrollbackBuffer(50)
+    buffer.write(b"abc")
+    buffer.write(data)
+    assert buffer.end == 203
+    assert buffer.read(0) == (data[-50:], 153)
+
+
+def test_offsets_start_where_recording_started():
+    buffer = ScrollbackBuffer(16, offset=1000)
+    buffer.write(b"0123456789")
+    assert buffer.read(0) == (b"0123456789", 1000)
+    assert buffer.read(1004, 2000) == (b"456789", 1004)
+    assert buffer.read(1010) == (b"", 1010)
@@ -0,0 +1,25 @@
+"""Tests for session activity tracking"""
+
+from session_reaper import SessionReaper
+
+
+async def close_session(session_id: str, reason: str):
+    pass
+
+
+def test_sessions_are_counted_by_attachment_and_activity():
+    reaper = SessionReaper(close_session, lambda session_id: True, idle_after=60)
+    for session_id in ("typing", "quiet", "batch", "orphan"):
+        reaper.track(session_id)
+    reaper.attach("typing")
+    reaper.attach("quiet")
+    reaper.sessions["quiet"].last_activity -= 120
+    reaper.begin_work("batch")
+    reaper.sessions["batch"].last_activity -= 120
+    reaper.sessions["orphan"].last_activity -= 120
+    assert reaper.count_by_activity() == {
+        ("attached", "active"): 1,
+        ("attached", "idle"): 1,
+        ("detached", "active"): 1,
+        ("detached", "idle"): 1
+    }
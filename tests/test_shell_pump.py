@@ -0,0 +1,130 @@
+"""Tests for the shell pump's queue bounds, stream offsets and holds"""
+
+import asyncio
+
+import pytest
+
+from tests.fakes import make_pump
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+def test_pause_policy_stops_reading_until_half_drained():
+    async def scenario():
+        pump = make_pump()
+        pump.set_limit(10, "pause")
+        pump._dispatch(b"abcdef")
+        pump._dispatch(b"ghijkl")
+        assert pump.paused and pump.queued_bytes == 12
+        assert await pump.read() == b"abcdef"
+        # 6 bytes left is still over half the limit
+        assert pump.paused and pump.read_offset == 6
+        assert await pump.read() == b"ghijkl"
+        assert not pump.paused and pump.read_offset == 12
+        assert pump.get_stats()["pauses"] == 1
+        assert pump.get_stats()["high_water"] == 12
+
+    run(scenario)
+
+
+def test_drop_policy_counts_dropped_bytes_into_one_marker():
+    async def scenario():
+        pump = make_pump()
+        pump.set_limit(10, "drop")
+        pump._dispatch(b"12345678")
+        pump._dispatch(b"abcdefgh")
+        pump._dispatch(b"ijkl")
+        assert not pump.paused and pump.queued_bytes == 10
+        assert await pump.read() == b"12345678"
+        assert await pump.read() == b"ab"
+        assert pump.read_offset == 10
+        assert await pump.read() == b"\r\n[output truncated: 10 bytes dropped]\r\n"
+        # The marker stands for the dropped output, so the reader is level with the device again
+        assert pump.read_offset == pump.bytes_read == 20
+        stats = pump.get_stats()
+        assert stats["dropped_bytes"] == 10 and stats["truncations"] == 1
+
+    run(scenario)
+
+
+def test_stop_flushes_a_pending_truncation_marker():
+    async def scenario():
+        pump = make_pump()
+        pump.set_limit(4, "drop")
+        pump._dispatch(b"abcdef")
+        pump.stop()
+        chunks = []
+        while True:
+            chunk = await pump.read()
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return chunks, pump.read_offset
+
+    chunks, offset = run(scenario)
+    assert chunks == [b"abcd", b"\r\n[output truncated: 2 bytes dropped]\r\n"]
+    assert offset == 6
+
+
+def test_without_queueing_output_only_reaches_listeners():
+    async def scenario():
+        pump = make_pump(queueing=False)
+        seen = []
+        pump.listeners.append(seen.append)
+        pump._dispatch(b"abc")
+        pump._dispatch(b"def")
+        assert seen == [b"abc", b"def"]
+        assert pump.queue.empty() and pump.read_offset == 6
+        pump.set_queueing(True)
+        pump._dispatch(b"ghi")
+        assert await pump.read() == b"ghi" and pump.read_offset == 9
+        pump.set_limit(2, "pause")
+        pump._dispatch(b"jkl")
+        assert pump.paused
+        pump.set_queueing(False)
+        assert not pump.paused and pump.queue.empty() and pump.max_queued is None
+
+    run(scenario)
+
+
+def test_hold_keeps_the_pump_paused_until_every_holder_releases():
+    async def scenario():
+        pump = make_pump()
+        pump.hold("batch")
+        pump.hold("fanout")
+        assert pump.paused and pump.get_stats()["holds"] == 2
+        pump._dispatch(b"abc")
+        assert await pump.read() == b"abc"
+        # An empty queue does not lift a hold
+        assert pump.paused
+        pump.release("batch")
+        assert pump.paused
+        pump.release("unknown")
+        pump.release("fanout")
+        assert not pump.paused
+
+    run(scenario)
+
+
+def test_release_leaves_a_full_queue_paused():
+    async def scenario():
+        pump = make_pump()
+        pump.set_limit(4, "pause")
+        pump.hold("batch")
+        pump._dispatch(b"abcdef")
+        pump.release("batch")
+        assert pump.paused
+        await pump.read()
+        assert not pump.paused
+
+    run(scenario)
+
+
+def test_unknown_overflow_policy_is_rejected():
+    async def scenario():
+        with pytest.raises(ValueError):
+            make_pump().set_limit(10, "block")
+
+    run(scenario)
@@ -0,0 +1,65 @@
+"""Tests for the authenticated transport pool"""
+
+from ssh_pool import TransportPool
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self) -> bool:
+        return self.active
+
+
+def test_pool_reuses_transports_until_the_device_refuses_a_channel():
+    pool = TransportPool()
+    key = pool.make_key("10.0.0.1", 22, "admin", "secret")
+    assert "secret" not in key
+    assert pool.acquire(key) is None
+    entry = pool.add(key, FakeTransport())
+    assert pool.acquire(key) is entry and entry.channels == 2
+    pool.refuse(entry)
+    assert entry.max_channels == 1 and not entry.available
+    assert pool.acquire(key) is None
+
+
+def test_reserve_counts_side_channels_against_the_cap():
+    pool = TransportPool()
+    entry = pool.add(pool.make_key("10.0.0.1", 22, "admin", "secret"), FakeTransport())
+    assert pool.reserve(entry) and entry.channels == 2
+    pool.refuse(entry)
+    assert not pool.reserve(entry)
+    pool.release(entry)
+    assert entry.channels == 0 and pool.reserve(entry)
+
+
+def test_pool_reaps_dead_and_expired_transports():
+    pool = TransportPool(idle_ttl=60)
+    dead = pool.add(pool.make_key("a", 22, "u", "p"), FakeTransport())
+    idle = pool.add(pool.make_key("b", 22, "u", "p"), FakeTransport())
+    busy = pool.add(pool.make_key("c", 22, "u", "p"), FakeTransport())
+    dead.transport.active = False
+    pool.release(idle)
+    idle.last_used -= 120
+    busy.last_used -= 120
+    assert pool.reap() == [idle.transport]
+    assert list(pool.lru.values()) == [busy]
+    assert pool.stats["expired"] == 1
+
+
+def test_pool_evicts_least_recently_used_idle_transports_over_capacity():
+    pool = TransportPool(max_size=2)
+    entries = [pool.add(pool.make_key(host, 22, "u", "p"), FakeTransport()) for host in "abc"]
+    for entry in entries[:2]:
+        pool.release(entry)
+    assert pool.reap() == [entries[0].transport]
+    assert pool.stats["evicted"] == 1 and len(pool.lru) == 2
+
+
+def test_transport_added_with_a_cap_is_never_shared():
+    pool = TransportPool()
+    key = pool.make_key("10.0.0.1", 22, "admin", "secret")
+    entry = pool.add(key, FakeTransport(), max_channels=1)
+    assert pool.acquire(key) is None and not pool.reserve(entry)
+    pool.release(entry)
+    assert pool.acquire(key) is entry
@@ -0,0 +1,69 @@
+"""Tests for the token verification cache"""
+
+import asyncio
+import time
+
+from token_cache import TokenCache
+
+
+def test_token_cache_evicts_least_recently_used():
+    cache = TokenCache("test", max_size=2)
+    cache.put("a", {"user_id": "1"})
+    cache.put("b", {"user_id": "2"})
+    assert cache.get("a") == {"user_id": "1"}
+    cache.put("c", {"user_id": "3"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats["evicted"] == 1
+
+
+def test_token_cache_entry_never_outlives_the_token():
+    cache = TokenCache("test")
+    cache.put("a", {"user_id": "1"}, expires_at=time.time() - 1)
+    assert cache.get("a") is None
+
+
+def test_revoked_token_stays_revoked():
+    cache = TokenCache("test")
+    cache.put("a", {"user_id": "1"})
+    cache.revoke("a")
+    assert cache.get("a") is None
+    assert cache.is_revoked("a")
+    assert not cache.is_revoked("b")
+
+
+def test_revoked_user_tokens_are_dated_by_iat():
+    cache = TokenCache("test")
+    issued = time.time() - 10
+    cache.put("old", {"user_id": "1", "iat": issued})
+    cache.revoke_user("1")
+    assert cache.get("old") is None
+    assert cache.is_revoked("old", {"user_id": "1", "iat": issued})
+    assert not cache.is_revoked("new", {"user_id": "1", "iat": time.time() + 10})
+
+
+def test_revoked_user_tokens_without_iat_go_back_to_the_issuer():
+    cache = TokenCache("test")
+    cache.put("undated", {"user_id": "1"})
+    cache.revoke_user("1")
+    # The token can't be dated, so it leaves the cache and the issuer decides on its next use
+    assert cache.get("undated") is None
+    assert not cache.is_revoked("undated", {"user_id": "1"})
+
+
+def test_concurrent_verifications_share_one_upstream_call():
+    async def scenario():
+        cache = TokenCache("test")
+        calls = []
+
+        async def verifier():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"user_id": "1"}, None
+
+        results = await asyncio.gather(*(cache.verify("token", verifier) for _ in range(5)))
+        return results, calls, cache.stats["coalesced"]
+
+    results, calls, coalesced = asyncio.run(scenario())
+    assert results == [{"user_id": "1"}] * 5
+    assert len(calls) == 1 and coalesced == 4
@@ -0,0 +1,75 @@
+"""Tests for transcript recording and random-access reading"""
+
+import asyncio
+import random
+
+import pytest
+
+from transcript import INDEX_RECORD, TranscriptReader, TranscriptWriter, stream_range, transcript_paths
+
+OUTPUT = b"".join(b"line %04d of output\r\n" % number for number in range(300))
+
+
+def record(directory, session_id="s1", block_bytes=256):
+    async def scenario():
+        writer = TranscriptWriter(str(directory), session_id, {"host": "10.0.0.1"}, block_bytes=block_bytes)
+        rng = random.Random(1)
+        position = 0
+        while position < len(OUTPUT):
+            size = rng.randint(1, 90)
+            writer.write(OUTPUT[position:position + size])
+            position += size
+        await writer.close()
+
+    asyncio.run(scenario())
+    return TranscriptReader(str(directory), session_id)
+
+
+def test_round_trip_returns_every_byte(tmp_path):
+    reader = record(tmp_path)
+    assert len(reader.blocks) > 1
+    assert reader.size == len(OUTPUT)
+    assert reader.read() == (0, OUTPUT)
+    info = reader.info()
+    assert info["host"] == "10.0.0.1" and info["output_bytes"] == len(OUTPUT)
+    assert info["recorded_bytes"] == len(OUTPUT)
+
+
+def test_byte_range_reads_only_overlapping_blocks(tmp_path):
+    reader = record(tmp_path)
+    start, end = 1000, 1500
+    assert reader.read(start=start, end=end) == (start, OUTPUT[start:end])
+    blocks = reader.blocks_in(start=start, end=end)
+    assert 0 < len(blocks) < len(reader.blocks)
+    assert blocks[0].start <= start and blocks[-1].end >= end
+
+
+def test_stream_range_matches_read(tmp_path):
+    reader = record(tmp_path)
+
+    async def collect():
+        return [part async for part in stream_range(reader, start=700, end=4000)]
+
+    parts = asyncio.run(collect())
+    assert parts[0][0] == 700
+    assert b"".join(data for _, data in parts) == OUTPUT[700:4000]
+    # Every part starts where the previous one ended
+    for (offset, data), (next_offset, _) in zip(parts, parts[1:]):
+        assert offset + len(data) == next_offset
+
+
+def test_index_record_cut_short_is_ignored(tmp_path):
+    reader = record(tmp_path)
+    _, index_path, _ = transcript_paths(str(tmp_path), "s1")
+    with open(index_path, "ab") as f:
+        f.write(b"\0" * (INDEX_RECORD.size - 1))
+    again = TranscriptReader(str(tmp_path), "s1")
+    assert len(again.blocks) == len(reader.blocks)
+    assert again.read() == (0, OUTPUT)
+
+
+def test_session_ids_cannot_name_other_paths(tmp_path):
+    with pytest.raises(ValueError):
+        transcript_paths(str(tmp_path), "../etc/passwd")
+    with pytest.raises(FileNotFoundError):
+        TranscriptReader(str(tmp_path), "missing")
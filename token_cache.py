@@ -0,0 +1,157 @@
+"""
+Token verification cache for Monetx NCM SSH Emulator
+Remembers verified tokens until they expire, tracks revocations and coalesces upstream checks
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+TOKEN_CACHE_LOOKUPS = metrics.REGISTRY.add(metrics.Counter(
+    "ncm_token_cache_lookups_total", "Token verification cache lookups by cache and result",
+    labelnames=("cache", "result")
+))
+
+
+class VerificationAbandoned(Exception):
+    """The request that started a shared verification went away before it finished"""
+
+
+def token_digest(token: str) -> str:
+    """Cache key; raw tokens are never kept"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenCache:
+    """LRU cache of verified token claims, each entry bounded by its expiry"""
+
+    def __init__(self, name: str, max_size: int = 10000, default_ttl: float = 300.0,
+                 token_lifetime: float = 3600.0):
+        self.name = name
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        # Longest a token can stay valid; user revocations are kept this long
+        self.token_lifetime = token_lifetime
+        self.entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # digest -> when the revocation can be forgotten (the token's own expiry)
+        self.revoked: Dict[str, float] = {}
+        # user_id -> tokens issued before this time are revoked
+        self.revoked_users: Dict[str, float] = {}
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evicted": 0, "revoked_hits": 0}
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        digest = token_digest(token)
+        entry = self.entries.get(digest)
+        if entry is not None and time.time() >= entry[1]:
+            del self.entries[digest]
+            entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            TOKEN_CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+            return None
+        self.stats["hits"] += 1
+        TOKEN_CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+        self.entries.move_to_end(digest)
+        return entry[0]
+
+    def put(self, token: str, claims: Dict[str, Any], expires_at: Optional[float] = None):
+        expires_at = min(expires_at or float("inf"), time.time() + self.default_ttl)
+        digest = token_digest(token)
+        self.entries[digest] = (claims, expires_at)
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def revoke(self, token: str, expires_at: Optional[float] = None):
+        digest = token_digest(token)
+        self.entries.pop(digest, None)
+        self.revoked[digest] = expires_at or time.time() + self.token_lifetime
+        self._purge_revocations()
+
+    def revoke_user(self, user_id: str):
+        """Revoke every token issued to this user so far
+
+        Tokens whose claims carry ``iat`` are checked against the cutoff.
+        Claims without it can't be dated, so they are only dropped from the
+        cache here and go back to the issuer on their next use.
+        """
+        self.revoked_users[user_id] = time.time()
+        self._purge_revocations()
+        for digest, (claims, _) in list(self.entries.items()):
+            if claims.get("user_id") == user_id:
+                del self.entries[digest]
+
+    def is_revoked(self, token: str, claims: Optional[Dict[str, Any]] = None) -> bool:
+        if token_digest(token) in self.revoked:
+            self.stats["revoked_hits"] += 1
+            return True
+        if claims is not None and claims.get("iat") is not None and claims.get("user_id") in self.revoked_users:
+            if claims["iat"] <= self.revoked_users[claims["user_id"]]:
+                self.stats["revoked_hits"] += 1
+                return True
+        return False
+
+    def _purge_revocations(self):
+        now = time.time()
+        for digest, forget_at in list(self.revoked.items()):
+            if forget_at <= now:
+                del self.revoked[digest]
+        for user_id, revoked_at in list(self.revoked_users.items()):
+            if revoked_at + self.token_lifetime <= now:
+                del self.revoked_users[user_id]
+
+    async def verify(self, token: str, verifier: Callable[[], Awaitable[Tuple[Dict[str, Any], Optional[float]]]]) -> Dict[str, Any]:
+        """Cached claims, or run ``verifier`` once no matter how many callers ask at the same time
+
+        ``verifier`` returns ``(claims, expires_at)``; its exceptions reach
+        every waiting caller and nothing is cached. Revocation is left to the
+        caller (``is_revoked``).
+        """
+        digest = token_digest(token)
+        while True:
+            claims = self.get(token)
+            if claims is not None:
+                return claims
+            pending = self.inflight.get(digest)
+            if pending is None:
+                break
+            self.stats["coalesced"] += 1
+            TOKEN_CACHE_LOOKUPS.inc(cache=self.name, result="coalesced")
+            try:
+                return await asyncio.shield(pending)
+            except VerificationAbandoned:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[digest] = future
+        try:
+            claims, expires_at = await verifier()
+            if not self.is_revoked(token, claims):
+                self.put(token, claims, expires_at)
+            future.set_result(claims)
+            return claims
+        except BaseException as e:
+            # Waiters share a real failure, but retry if the requester just went away
+            future.set_exception(e if isinstance(e, Exception) else VerificationAbandoned())
+            future.exception()  # don't warn about it when nobody was waiting
+            raise
+        finally:
+            del self.inflight[digest]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "revoked_tokens": len(self.revoked),
+            "revoked_users": len(self.revoked_users),
+            "inflight": len(self.inflight)
+        }
@@ -0,0 +1,304 @@
+"""
+Session transcripts for Monetx NCM SSH Emulator
+Records shell output to disk as independently compressed blocks with a time index
+"""
+
+import asyncio
+import codecs
+import gzip
+import json
+import logging
+import os
+import re
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Inside a block every output chunk is framed as (timestamp, length) + bytes
+FRAME_HEADER = struct.Struct("<dI")
+# One index record per block: file offset, compressed size, first output byte,
+# output byte count, first and last frame timestamps
+INDEX_RECORD = struct.Struct("<QIQIdd")
+
+SESSION_ID = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+# All transcript file I/O runs here, one job at a time, so blocks land in order
+_io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcript")
+
+
+class BlockInfo:
+    def __init__(self, offset: int, size: int, start: int, length: int, first_ts: float, last_ts: float):
+        self.offset = offset
+        self.size = size
+        self.start = start
+        self.length = length
+        self.first_ts = first_ts
+        self.last_ts = last_ts
+
+    @property
+    def end(self) -> int:
+        return self.start + self.length
+
+
+def transcript_paths(directory: str, session_id: str) -> Tuple[str, str, str]:
+    if not SESSION_ID.match(session_id):
+        raise ValueError(f"Invalid session id {session_id!r}")
+    base = os.path.join(directory, session_id)
+    return base + ".gz", base + ".idx", base + ".json"
+
+
+class TranscriptWriter:
+    """Append-only recorder for one session's output
+
+    Use ``write`` as a pump listener. Output is buffered into blocks of about
+    ``block_bytes`` (or ``flush_interval`` seconds, whichever comes first);
+    each block is one gzip member, so the data file is also a valid .gz and
+    any block can be decompressed on its own.
+    """
+
+    def __init__(self, directory: str, session_id: str, metadata: Dict[str, Any] = None,
+                 block_bytes: int = 65536, flush_interval: float = 2.0):
+        self.data_path, self.index_path, self.meta_path = transcript_paths(directory, session_id)
+        self.session_id = session_id
+        self.block_bytes = block_bytes
+        self.flush_interval = flush_interval
+        self.frames: List[bytes] = []
+        self.buffered = 0
+        self.block_start = 0  # output byte offset of the buffered block
+        self.first_ts = 0.0
+        self.last_ts = 0.0
+        self.total_bytes = 0
+        self.file_offset = 0
+        self.closed = False
+        self.loop = asyncio.get_running_loop()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        os.makedirs(directory, exist_ok=True)
+        self.metadata = {**(metadata or {}), "session_id": session_id, "started_at": time.time()}
+        self._submit(self._write_metadata, dict(self.metadata))
+
+    def _submit(self, func, *args):
+        future = self.loop.run_in_executor(_io, func, *args)
+        future.add_done_callback(self._report)
+        return future
+
+    def _report(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Transcript write failed for {self.session_id}: {future.exception()}")
+
+    def _write_metadata(self, metadata: Dict[str, Any]):
+        with open(self.meta_path, "w") as f:
+            json.dump(metadata, f)
+
+    def write(self, data: bytes):
+        """Pump listener: buffer one chunk of output"""
+        if self.closed or not data:
+            return
+        now = time.time()
+        if not self.frames:
+            self.first_ts = now
+            self._timer = self.loop.call_later(self.flush_interval, self.flush)
+        self.frames.append(FRAME_HEADER.pack(now, len(data)) + data)
+        self.last_ts = now
+        self.buffered += len(data)
+        self.total_bytes += len(data)
+        if self.buffered >= self.block_bytes:
+            self.flush()
+
+    def flush(self):
+        """Compress the buffered frames as one block; the file I/O happens off the loop"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.frames:
+            return
+        raw = b"".join(self.frames)
+        block = (self.block_start, self.buffered, self.first_ts, self.last_ts)
+        self.frames = []
+        self.block_start += self.buffered
+        self.buffered = 0
+        return self._submit(self._append_block, raw, block)
+
+    def _append_block(self, raw: bytes, block: Tuple[int, int, float, float]):
+        compressed = gzip.compress(raw, compresslevel=6)
+        with open(self.data_path, "ab") as f:
+            f.write(compressed)
+        with open(self.index_path, "ab") as f:
+            f.write(INDEX_RECORD.pack(self.file_offset, len(compressed), *block))
+        self.file_offset += len(compressed)
+
+    async def close(self):
+        """Write the last block and the final metadata"""
+        if self.closed:
+            return
+        self.closed = True
+        self.flush()
+        self.metadata.update(ended_at=time.time(), output_bytes=self.total_bytes)
+        await self._submit(self._write_metadata, dict(self.metadata))
+
+
+class TranscriptReader:
+    """Random access to a recorded transcript without decompressing all of it"""
+
+    def __init__(self, directory: str, session_id: str):
+        self.data_path, self.index_path, self.meta_path = transcript_paths(directory, session_id)
+        if not os.path.exists(self.meta_path):
+            raise FileNotFoundError(session_id)
+        with open(self.meta_path) as f:
+            self.metadata = json.load(f)
+        self.blocks: List[BlockInfo] = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                index = f.read()
+            # A record cut short by a crash mid-append is ignored
+            usable = len(index) - len(index) % INDEX_RECORD.size
+            self.blocks = [BlockInfo(*record) for record in INDEX_RECORD.iter_unpack(index[:usable])]
+
+    @property
+    def size(self) -> int:
+        return self.blocks[-1].end if self.blocks else 0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            **self.metadata,
+            "blocks": len(self.blocks),
+            "recorded_bytes": self.size,
+            "compressed_bytes": sum(block.size for block in self.blocks),
+            "first_ts": self.blocks[0].first_ts if self.blocks else None,
+            "last_ts": self.blocks[-1].last_ts if self.blocks else None
+        }
+
+    def _frames(self, block: BlockInfo, f) -> Iterator[Tuple[float, int, bytes]]:
+        """(timestamp, output offset, data) for every frame of one block"""
+        f.seek(block.offset)
+        raw = gzip.decompress(f.read(block.size))
+        position = 0
+        offset = block.start
+        while position < len(raw):
+            ts, length = FRAME_HEADER.unpack_from(raw, position)
+            position += FRAME_HEADER.size
+            yield ts, offset, raw[position:position + length]
+            position += length
+            offset += length
+
+    def read_block(self, block: BlockInfo) -> List[Tuple[float, int, bytes]]:
+        """Every frame of one block; the unit of lazy reading"""
+        with open(self.data_path, "rb") as f:
+            return list(self._frames(block, f))
+
+    def blocks_in(self, since: Optional[float] = None, until: Optional[float] = None,
+                  start: int = 0, end: Optional[int] = None) -> List[BlockInfo]:
+        """Blocks whose index entry overlaps the byte range [start, end) and time range [since, until)"""
+        end = self.size if end is None else min(end, self.size)
+        return [
+            block for block in self.blocks
+            if block.end > start and block.start < end
+            and not (since is not None and block.last_ts < since)
+            and not (until is not None and block.first_ts >= until)
+        ]
+
+    @staticmethod
+    def clip(frames: Iterable[Tuple[float, int, bytes]], since: Optional[float] = None, until: Optional[float] = None,
+             start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[float, int, bytes]]:
+        """The frames within both ranges, cut to the byte range"""
+        for ts, offset, data in frames:
+            if (since is not None and ts < since) or (until is not None and ts >= until):
+                continue
+            if offset + len(data) <= start or (end is not None and offset >= end):
+                continue
+            clip_start = max(start - offset, 0)
+            clip_end = len(data) if end is None else min(end - offset, len(data))
+            yield ts, offset + clip_start, data[clip_start:clip_end]
+
+    def frames(self, since: Optional[float] = None, until: Optional[float] = None,
+               start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[float, int, bytes]]:
+        """Frames overlapping the byte range [start, end) and time range [since, until)
+
+        Only blocks whose index entry overlaps both ranges are decompressed;
+        frames are clipped to the byte range.
+        """
+        end = self.size if end is None else min(end, self.size)
+        with open(self.data_path, "rb") as f:
+            for block in self.blocks_in(since, until, start, end):
+                yield from self.clip(self._frames(block, f), since, until, start, end)
+
+    def read(self, since: Optional[float] = None, until: Optional[float] = None,
+             start: int = 0, end: Optional[int] = None) -> Tuple[int, bytes]:
+        """(first output offset, bytes) of the output within both ranges"""
+        first = None
+        chunks = []
+        for _, offset, data in self.frames(since, until, start, end):
+            if first is None:
+                first = offset
+            chunks.append(data)
+        return (start if first is None else first), b"".join(chunks)
+
+
+async def stream_range(reader: TranscriptReader, since: Optional[float] = None, until: Optional[float] = None,
+                       start: int = 0, end: Optional[int] = None) -> AsyncIterator[Tuple[int, bytes]]:
+    """Yield (first output offset, bytes) of the output within both ranges, one block at a time
+
+    Only one decompressed block is held at once, so serving a range costs
+    the same memory however long the transcript is.
+    """
+    end = reader.size if end is None else min(end, reader.size)
+    for block in reader.blocks_in(since, until, start, end):
+        frames = list(reader.clip(await asyncio.to_thread(reader.read_block, block), since, until, start, end))
+        if frames:
+            yield frames[0][1], b"".join(data for _, _, data in frames)
+
+
+async def replay(reader: TranscriptReader, speed: float = 1.0, idle_limit: Optional[float] = None,
+                 since: Optional[float] = None) -> AsyncIterator[Tuple[float, bytes]]:
+    """Yield (replay time, output) with the recorded pacing
+
+    ``speed`` scales the clock (0 sends everything at once) and gaps longer
+    than ``idle_limit`` seconds are shortened to it. Blocks are read one at a
+    time, so memory use does not grow with the transcript.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    elapsed = 0.0
+    previous = None
+    for block in reader.blocks:
+        if since is not None and block.last_ts < since:
+            continue
+        for ts, _, data in await asyncio.to_thread(reader.read_block, block):
+            if since is not None and ts < since:
+                continue
+            if previous is not None:
+                gap = ts - previous
+                if idle_limit is not None:
+                    gap = min(gap, idle_limit)
+                elapsed += max(gap, 0.0)
+            previous = ts
+            if speed > 0:
+                delay = started + elapsed / speed - loop.time()
+                if delay > 0.001:
+                    await asyncio.sleep(delay)
+            yield elapsed, data
+
+
+async def asciicast(reader: TranscriptReader, width: int = 80, height: int = 24,
+                    idle_limit: Optional[float] = None) -> AsyncIterator[str]:
+    """The transcript as asciicast v2 lines, for asciinema players"""
+    header = {
+        "version": 2,
+        "width": width,
+        "height": height,
+        "timestamp": int(reader.metadata.get("started_at", 0)),
+        "title": f"{reader.metadata.get('ssh_user') or ''}@{reader.metadata.get('host') or ''}"
+    }
+    if idle_limit is not None:
+        header["idle_time_limit"] = idle_limit
+    yield json.dumps(header) + "\n"
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    first = None
+    for block in reader.blocks:
+        for ts, _, data in await asyncio.to_thread(reader.read_block, block):
+            first = ts if first is None else first
+            text = decoder.decode(data)
+            if text:
+                yield json.dumps([round(ts - first, 6), "o", text]) + "\n"